@@ -5,6 +5,9 @@ import hid
 import sys
 import os
 
+from hid_reader import HidReader
+from lockit_framer import LockitFramer
+
 # Add parent directory to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from config import HID_VENDOR_ID, HID_PRODUCT_ID, CONFIG_NOTE
@@ -19,12 +22,19 @@ try :
     device = hid.device(vid = VID, pid = PID)
     print("Device found")
     
-    while True:
-        data = device.read(64)
-        if data:
-            print(f"Data read from device: {data}")
-        else:
-            print("Cant read data")       
+    framer = LockitFramer()
+
+    def print_reports(reports):
+        for data in reports:
+            for message in framer.feed(data):
+                print(f"Data read from device: {message.text()}")
+
+    # Waits for reports instead of spinning on empty reads
+    reader = HidReader(device, print_reports)
+    try:
+        reader.run()
+    except KeyboardInterrupt:
+        print(f"Reader stats: {reader.stats()}")
 
 except Exception as e:
     print(f"Error: {e}")
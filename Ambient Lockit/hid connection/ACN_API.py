@@ -19,17 +19,33 @@
 
 # Script can now handle multiple response messages in a single read call 
 # while being accurate, just need to add in what response you want aswell as the tag.
-# When recieving the timecode, it seems like the values extracted are wrong or the conversion is wrong.
+# Reads go through LockitFramer (lockit_framer.py), which reassembles messages
+# split across reads and returns every message from a read that holds several.
+# LTC words are decoded by ltc.py. The old version read bin() of the word MSB
+# first, which is why the extracted timecode values were wrong.
 
 import hid
 import sys
 import os
+import time
+from collections import deque
+
+from hid_reader import READ_TIMEOUT_MS
+from lockit_framer import LockitFramer
 
 # Add parent directory to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from config import HID_VENDOR_ID, HID_PRODUCT_ID, CONFIG_NOTE
 
-def send_recv(h, msg, tag):
+# Shared timecode modules live in the Ambient Lockit folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ltc import parse_ltc_message, decode_ltc_word
+
+# Messages already framed but not yet asked for by send_recv
+framer = LockitFramer()
+unclaimed = deque()
+
+def send_recv(h, msg, tag, timeout=2.0):
     assert len(msg) <= 64
 
     # We always write 65 bytes using HID-API:
@@ -39,43 +55,24 @@ def send_recv(h, msg, tag):
     packet = bytes(1) + msg + bytes(pad_len)
     h.write(packet)
 
+    deadline = time.monotonic() + timeout
     while True:
-        res = h.read(64)
+        while unclaimed:
+            message = unclaimed.popleft()
+            if message.raw.startswith(tag):
+                return message.raw
+            # Notifications and other responses are not needed here
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"No {tag!r} response within {timeout} s")
+        # Sleep in the kernel until a report arrives instead of spinning on empty reads
+        res = h.read(64, READ_TIMEOUT_MS)
         if res:
-            res_end = 65
-            try:
-                res_end = res.index(0)
-            except:
-                pass
-            
-            response = bytes(res[0:res_end])
-            if response.startswith(tag):
-                return response
+            unclaimed.extend(framer.feed(res))
             
 def parse_ltc_response(msg):
-    msg_str = msg.decode()
-    raw_ltc = msg_str.split("*I0:")[1].split("*")[0]
-    fps = int(msg_str.split("*I1:")[1].split("*")[0])
-    
-    raw_ltc_bin = bin(int(raw_ltc, 16))[2:].zfill(64)   
-    
-    frames_units = int(raw_ltc_bin[0:4], 2)
-    frames_tens = int(raw_ltc_bin[8:10], 2)
-    frames = frames_units + (frames_tens * 10)
-    
-    seconds_units = int(raw_ltc_bin[16:20], 2)
-    seconds_tens = int(raw_ltc_bin[24:27], 2)
-    seconds = seconds_units + (seconds_tens * 10)
-    
-    minutes_units = int(raw_ltc_bin[32:36], 2)
-    minutes_tens = int(raw_ltc_bin[40:43], 2)
-    minutes = minutes_units + (minutes_tens * 10)
-    
-    hours_units = int(raw_ltc_bin[48:52], 2)
-    hours_tens = int(raw_ltc_bin[56:58], 2)
-    hours = hours_units + (hours_tens * 10)
-    
-    timecode = f"{hours:02}:{minutes:02}:{seconds:02}:{frames:02} @ {fps} fps"
+    word, fps = parse_ltc_message(msg)
+    fields = decode_ltc_word(word, fps=fps, strict=False)
+    timecode = f"{fields.timecode_string()} @ {fps} fps"
     return timecode
                 
 
@@ -0,0 +1,111 @@
+"""
+Throughput benchmark for LockitFramer over recorded HID report streams.
+
+A recording is a binary file of consecutive 64-byte HID reports, exactly as
+returned by h.read(64). Record one from a connected Lockit with --record, or
+run without a file to benchmark a synthetic stream where messages are split and
+merged across reports at random, like the device does.
+
+Usage:
+    python bench_framer.py                        # synthetic stream
+    python bench_framer.py recording.bin          # recorded stream
+    python bench_framer.py --record recording.bin --count 20000
+"""
+
+import argparse
+import random
+import sys
+import os
+import time
+
+from lockit_framer import LockitFramer, NOTIFICATION, RESPONSE
+
+REPORT_SIZE = 64
+
+
+def synthetic_reports(messages=200000, seed=1):
+    """Build a stream of zero-padded reports with messages split/merged at random."""
+    rng = random.Random(seed)
+    parts = []
+    for i in range(messages):
+        if i % 4:
+            ltc = rng.getrandbits(64)
+            parts.append(b"*C0*I0:%016X*I1:25*Z" % ltc)
+        else:
+            parts.append(rng.choice((b"*A0*I0:1.12.4*Z", b"*A64*I0:20240101120000*Z", b"*Q35*I0:3*I1:1*Z")))
+    stream = b"".join(parts)
+
+    reports = []
+    pos = 0
+    while pos < len(stream):
+        n = rng.randint(1, REPORT_SIZE)
+        chunk = stream[pos:pos + n]
+        reports.append(chunk + bytes(REPORT_SIZE - len(chunk)))
+        pos += n
+    return reports
+
+
+def load_reports(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return [data[i:i + REPORT_SIZE] for i in range(0, len(data), REPORT_SIZE)]
+
+
+def record_reports(path, count):
+    # Requires hidapi and a connected Lockit
+    import hid
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from config import HID_VENDOR_ID, HID_PRODUCT_ID
+
+    h = hid.device()
+    h.open(HID_VENDOR_ID, HID_PRODUCT_ID)
+    # Enable LTC callbacks so there is a steady stream of notifications
+    h.write(bytes(1) + b"*A6*I0:1*Z" + bytes(64 - 10))
+    recorded = 0
+    with open(path, "wb") as f:
+        while recorded < count:
+            res = h.read(REPORT_SIZE)
+            if res:
+                f.write(bytes(res).ljust(REPORT_SIZE, b"\x00"))
+                recorded += 1
+    h.close()
+    print(f"Recorded {recorded} reports to {path}")
+
+
+def bench(reports, repeat=3):
+    total_bytes = len(reports) * REPORT_SIZE
+    best = None
+    for _ in range(repeat):
+        framer = LockitFramer()
+        counts = {RESPONSE: 0, NOTIFICATION: 0}
+        start = time.perf_counter()
+        for report in reports:
+            for msg in framer.feed(report):
+                counts[msg.kind] = counts.get(msg.kind, 0) + 1
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, counts, framer.stats())
+
+    elapsed, counts, stats = best
+    print(f"Reports:       {len(reports)} ({total_bytes / 1e6:.1f} MB)")
+    print(f"Messages:      {stats['messages']} ({counts.get(RESPONSE, 0)} responses, "
+          f"{counts.get(NOTIFICATION, 0)} notifications)")
+    print(f"Discarded:     {stats['discarded']} bytes, {stats['overflows']} overflows")
+    print(f"Time:          {elapsed:.3f} s")
+    print(f"Throughput:    {len(reports) / elapsed:,.0f} reports/s, "
+          f"{stats['messages'] / elapsed:,.0f} messages/s, {total_bytes / elapsed / 1e6:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Lockit HID framer")
+    parser.add_argument("recording", nargs="?", help="file of 64-byte HID reports")
+    parser.add_argument("--record", metavar="PATH", help="record reports from a connected Lockit")
+    parser.add_argument("--count", type=int, default=10000, help="reports to record")
+    parser.add_argument("--messages", type=int, default=200000, help="messages in the synthetic stream")
+    args = parser.parse_args()
+
+    if args.record:
+        record_reports(args.record, args.count)
+    else:
+        reports = load_reports(args.recording) if args.recording else synthetic_reports(args.messages)
+        bench(reports)
@@ -0,0 +1,179 @@
+"""
+Event-driven HID read loop with CPU accounting.
+
+ACN-CL.py looped on device.read(64) and printed "Cant read data" on every empty
+read. send_recv in ACN_API.py spun on h.read(64) the same way, which keeps a
+core busy. HidReader waits for data instead, in one of two modes:
+
+- blocking (default): device.read(64, timeout_ms) sleeps in the kernel until
+  a report arrives or the timeout expires. The timeout only bounds how quickly
+  stop is noticed. Idle costs one wakeup per timeout.
+- nonblocking: hidapi's nonblocking mode, for backends where a timed read is
+  not available or not interruptible. Empty reads back off from MIN_SLEEP_MS
+  to max_sleep_ms. wake() (e.g. right after writing a command) cuts the sleep
+  short, so the response is picked up at once.
+
+Either way, once a report arrives the reports queued behind it are drained
+with nonblocking reads and handed to handler(reports) as one batch. (hidapi
+treats read(64, 0) as "no timeout", so a zero timeout would block.)
+
+stats() splits the reader thread's CPU time (time.thread_time_ns) into time
+spent waiting for data and time spent in the handler, next to the wall time.
+A healthy idle monitor shows idle_cpu_percent close to 0.
+
+Usage:
+    reader = HidReader(device, lambda reports: print(reports)).start()
+    print(reader.stats())
+    reader.stop()
+
+    python hid_reader.py                # Lockit monitor: LTC callbacks + reader stats
+    python hid_reader.py --nonblocking
+"""
+
+import threading
+import time
+
+REPORT_SIZE = 64
+
+# Longest a blocking read waits, which bounds how quickly stop is noticed
+READ_TIMEOUT_MS = 100
+
+# Nonblocking mode: first and longest sleep after an empty read
+MIN_SLEEP_MS = 0.5
+MAX_SLEEP_MS = 20
+
+# Reports drained after the first one before the batch is handed over
+MAX_BATCH = 64
+
+
+class HidReader:
+    """Reads HID reports without spinning and hands them to a handler in batches."""
+
+    def __init__(self, device, handler, timeout_ms=READ_TIMEOUT_MS, nonblocking=False, max_sleep_ms=MAX_SLEEP_MS,
+                 name="hid"):
+        self.device = device
+        self.handler = handler
+        self.timeout_ms = timeout_ms
+        self.nonblocking = nonblocking
+        self.max_sleep_ms = max_sleep_ms
+        self.name = name
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.reads = 0
+        self.empty_reads = 0
+        self.reports = 0
+        self.batches = 0
+        self.wakeups = 0
+        self.wait_ns = 0
+        self.wait_cpu_ns = 0
+        self.handle_ns = 0
+        self.handle_cpu_ns = 0
+
+    def start(self):
+        """Run the loop on its own thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name=f"{self.name}-reader", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None
+
+    def wake(self):
+        """Data is expected soon (nonblocking mode): end the current back-off sleep."""
+        if self.nonblocking:
+            self._wakeup.set()
+
+    def run(self, stop=None):
+        """Read until stop (or self.stop()) is set. Device errors propagate to the caller."""
+        stop = stop or self._stop
+        device = self.device
+        if self.nonblocking:
+            device.set_nonblocking(1)
+        sleep_ms = 0.0
+        while not stop.is_set() and not self._stop.is_set():
+            wall = time.monotonic_ns()
+            cpu = time.thread_time_ns()
+            if self.nonblocking:
+                data = device.read(REPORT_SIZE)
+                if not data:
+                    sleep_ms = min(max(sleep_ms * 2, MIN_SLEEP_MS), self.max_sleep_ms)
+                    if self._wakeup.wait(sleep_ms / 1000):
+                        self.wakeups += 1
+                        sleep_ms = 0.0
+                    self._wakeup.clear()
+            else:
+                data = device.read(REPORT_SIZE, self.timeout_ms)
+            self.reads += 1
+            self.wait_ns += time.monotonic_ns() - wall
+            self.wait_cpu_ns += time.thread_time_ns() - cpu
+            if not data:
+                self.empty_reads += 1
+                continue
+            sleep_ms = 0.0
+
+            wall = time.monotonic_ns()
+            cpu = time.thread_time_ns()
+            batch = [data]
+            if not self.nonblocking:
+                # hidapi treats a timeout of 0 as "no timeout", so drain in nonblocking mode
+                device.set_nonblocking(1)
+            try:
+                while len(batch) < MAX_BATCH:
+                    # Whatever is already queued comes back at once; an empty read means we are caught up
+                    more = device.read(REPORT_SIZE)
+                    self.reads += 1
+                    if not more:
+                        break
+                    batch.append(more)
+            finally:
+                if not self.nonblocking:
+                    device.set_nonblocking(0)
+            self.reports += len(batch)
+            self.batches += 1
+            try:
+                self.handler(batch)
+            finally:
+                self.handle_ns += time.monotonic_ns() - wall
+                self.handle_cpu_ns += time.thread_time_ns() - cpu
+
+    def stats(self):
+        wall = self.wait_ns + self.handle_ns
+        return {
+            "mode": "nonblocking" if self.nonblocking else "blocking",
+            "reads": self.reads,
+            "empty_reads": self.empty_reads,
+            "reports": self.reports,
+            "batches": self.batches,
+            "wakeups": self.wakeups,
+            "wall_s": round(wall / 1e9, 3),
+            "idle_cpu_ms": round(self.wait_cpu_ns / 1e6, 3),
+            "busy_cpu_ms": round(self.handle_cpu_ns / 1e6, 3),
+            "idle_cpu_percent": round(100 * self.wait_cpu_ns / self.wait_ns, 3) if self.wait_ns else 0.0,
+            "cpu_percent": round(100 * (self.wait_cpu_ns + self.handle_cpu_ns) / wall, 3) if wall else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    import sys
+
+    from lockit_client import LockitClient
+
+    nonblocking = "--nonblocking" in sys.argv
+    with LockitClient.open(nonblocking=nonblocking) as client:
+        print("Monitoring Lockit with S/N: %s" % client.serial_number())
+        latest = {}
+        client.subscribe(lambda msg: latest.update(ltc=msg.text()), tag=b"*C0*")
+        client.request(b"*A6*I0:1*")  # enable LTC callbacks
+        try:
+            while True:
+                time.sleep(10)
+                print(f"{latest.get('ltc', 'no LTC')}  {client.reader.stats()}")
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,407 @@
+"""
+asyncio API for Ambient ACN-CL ("Lockit") devices.
+
+Our production controller runs an asyncio event loop, so the Lockit needs an
+API that never blocks it:
+
+- Blocking hidapi calls (open, write, close) for every device run on one
+  shared HidIOThread, which sleeps until a job arrives. Each attached device
+  is read by a HidReader (hid_reader.py) thread that waits in timed reads, so
+  an idle rack costs no polling; reports reach the event loop in batches.
+- Framing, response matching and notification fan-out run on the event loop.
+- Commands are awaitable. Responses resolve in FIFO order and can be pipelined
+  up to max_in_flight. Responses are matched by the same WaiterQueue as
+  LockitClient (lockit_client.py). A command that is not answered by its
+  deadline fails with LockitTimeout, and its window slot is freed as soon as
+  its future is done.
+- Notifications (e.g. LTC callbacks) are delivered through async iterators.
+- The device is opened, closed and reconnected by an async context manager.
+  After a reconnect, reconnect_commands (e.g. enabling LTC callbacks) are sent
+  again.
+
+Usage:
+    async with AsyncLockit(reconnect_commands=[b"*A6*I0:1*"]) as lockit:
+        print((await lockit.request(b"*A0*")).text())
+        async for msg in lockit.notifications(tag=b"*C0*"):
+            print(msg.text())
+"""
+
+import asyncio
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future
+
+from hid_reader import HidReader
+from lockit_framer import LockitFramer, NOTIFICATION, RESPONSE, UNKNOWN
+from lockit_client import (
+    DEFAULT_MAX_IN_FLIGHT, DEFAULT_REQUEST_TIMEOUT,
+    LockitError, LockitTimeout, WaiterQueue, command_tag, encode_command,
+)
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import HID_VENDOR_ID, HID_PRODUCT_ID
+
+NOTIFICATION_QUEUE_SIZE = 256
+
+
+def open_hid_device(vendor_id=HID_VENDOR_ID, product_id=HID_PRODUCT_ID, path=None):
+    """Default opener, runs on the I/O thread."""
+    import hid
+
+    device = hid.device()
+    if path is not None:
+        device.open_path(path)
+    else:
+        device.open(vendor_id, product_id)
+    return device
+
+
+class _Attached:
+    __slots__ = ("handle", "loop", "on_reports", "on_error", "reader", "thread")
+
+    def __init__(self, handle, loop, on_reports, on_error):
+        self.handle = handle
+        self.loop = loop
+        self.on_reports = on_reports
+        self.on_error = on_error
+        self.reader = None
+        self.thread = None
+
+
+class HidIOThread:
+    """Single thread for the blocking hidapi calls of many devices, plus a reader thread per attached device."""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._jobs = queue.SimpleQueue()
+        self._devices = []
+        self._thread = threading.Thread(target=self._run, name="hid-io", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def call(self, func, *args):
+        """Run func(*args) on the I/O thread; returns a concurrent Future."""
+        future = Future()
+        self._jobs.put((future, func, args))
+        return future
+
+    async def run(self, func, *args):
+        return await asyncio.wrap_future(self.call(func, *args))
+
+    def attach(self, handle, loop, on_reports, on_error):
+        """Start reading handle; reports are passed to on_reports(list) on loop."""
+        return self.call(self._attach, _Attached(handle, loop, on_reports, on_error))
+
+    def detach(self, handle):
+        return self.call(self._detach, handle)
+
+    # The device list is only touched on the I/O thread
+
+    def _attach(self, dev):
+        def deliver(reports):
+            # One loop wakeup per batch rather than per report
+            dev.loop.call_soon_threadsafe(dev.on_reports, [bytes(data) for data in reports])
+
+        dev.reader = HidReader(dev.handle, deliver, name="hid-io")
+        dev.thread = threading.Thread(target=self._read, args=(dev,), name="hid-io-reader", daemon=True)
+        self._devices.append(dev)
+        dev.thread.start()
+
+    def _detach(self, handle):
+        for dev in [dev for dev in self._devices if dev.handle is handle]:
+            self._devices.remove(dev)
+            dev.reader.stop()
+            if dev.thread is not threading.current_thread():
+                dev.thread.join()
+
+    def _read(self, dev):
+        try:
+            dev.reader.run()
+        except Exception as e:
+            if dev in self._devices:
+                dev.loop.call_soon_threadsafe(dev.on_error, e)
+
+    def _run(self):
+        while True:
+            future, func, args = self._jobs.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+
+class NotificationStream:
+    """Async iterator over notifications; drops the oldest when the consumer falls behind."""
+
+    def __init__(self, owner, tag, maxsize):
+        self._owner = owner
+        self.tag = tag
+        self._queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def _put(self, message):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(message)
+
+    def close(self):
+        self._owner._streams.discard(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._queue.get()
+
+
+class AsyncLockit:
+    """One Lockit device driven from an asyncio event loop."""
+
+    def __init__(self, vendor_id=HID_VENDOR_ID, product_id=HID_PRODUCT_ID, path=None, opener=None,
+                 io=None, name=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, reconnect=True,
+                 reconnect_delay=0.5, max_reconnect_delay=10.0, reconnect_commands=()):
+        if opener is None:
+            def opener():
+                return open_hid_device(vendor_id, product_id, path)
+        self._opener = opener
+        self._io = io
+        self.name = name or (path.decode(errors="replace") if isinstance(path, bytes) else path) or "lockit"
+        self.max_in_flight = max_in_flight
+        self.reconnect = reconnect
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.reconnect_commands = list(reconnect_commands)
+
+        self._loop = None
+        self._handle = None
+        self._framer = LockitFramer()
+        self._waiters = WaiterQueue()
+        self._window = None
+        self._streams = set()
+        self._connected = None
+        self._closing = False
+        self._reconnect_task = None
+
+        self.reconnects = 0
+        self.responses = 0
+        self.notifications_received = 0
+        self.lost = 0
+        self.expired = 0
+
+    @property
+    def connected(self):
+        return self._handle is not None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        self._loop = asyncio.get_running_loop()
+        if self._io is None:
+            self._io = HidIOThread.shared()
+        self._connected = asyncio.Event()
+        if self.max_in_flight:
+            self._window = asyncio.Semaphore(self.max_in_flight)
+        self._closing = False
+        await self._connect()
+        for command in self.reconnect_commands:
+            await self.request(command)
+
+    async def _connect(self):
+        handle = await self._io.run(self._opener)
+        self._framer.reset()
+        self._handle = handle
+        await asyncio.wrap_future(self._io.attach(handle, self._loop, self._on_reports, self._on_error))
+        self._connected.set()
+
+    async def close(self):
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        handle, self._handle = self._handle, None
+        if self._connected is not None:
+            self._connected.clear()
+        self._fail_waiters(LockitError(f"{self.name} closed"))
+        if handle is not None:
+            self._io.detach(handle)
+            try:
+                await self._io.run(handle.close)
+            except Exception as e:
+                print(f"Error closing {self.name}: {e}")
+
+    async def serial_number(self):
+        return await self._io.run(self._handle.get_serial_number_string)
+
+    # Commands
+
+    async def request(self, command, timeout=DEFAULT_REQUEST_TIMEOUT):
+        """Send a command and await its response (a LockitMessage)."""
+        return await (await self.submit(command, timeout))
+
+    async def request_many(self, commands, timeout=DEFAULT_REQUEST_TIMEOUT):
+        """Pipeline commands and await all responses, in order."""
+        deadline = self._loop.time() + timeout
+        futures = [await self._submit(command, deadline) for command in commands]
+        return await asyncio.gather(*futures)
+
+    async def submit(self, command, timeout=DEFAULT_REQUEST_TIMEOUT):
+        """
+        Send a command once the device is connected and a window slot is free.
+        Returns an asyncio Future for the response, which fails with
+        LockitTimeout unless the response arrives within timeout seconds
+        (waiting to send included).
+        """
+        return await self._submit(command, self._loop.time() + timeout)
+
+    async def _submit(self, command, deadline):
+        command, packet = encode_command(command)
+        if self._closing:
+            raise LockitError(f"{self.name} closed")
+        try:
+            await asyncio.wait_for(self._connected.wait(), deadline - self._loop.time())
+            if self._window is not None:
+                await asyncio.wait_for(self._window.acquire(), deadline - self._loop.time())
+        except asyncio.TimeoutError:
+            raise LockitTimeout(f"{self.name} not ready to send {command!r} in time") from None
+
+        future = self._loop.create_future()
+        # The waiter is queued and the write enqueued without yielding in
+        # between, so writes and waiters stay in the same order
+        waiter = self._waiters.append(command_tag(command), future, deadline)
+        expiry = self._loop.call_at(deadline, self._expire, waiter)
+        future.add_done_callback(lambda _: self._waiter_done(expiry))
+        write = self._io.call(self._handle.write, packet)
+        write.add_done_callback(lambda f: self._loop.call_soon_threadsafe(self._write_done, f, future))
+        return future
+
+    def _expire(self, waiter):
+        # The waiter stays queued until a response arrives, so that response is not taken for the next one's
+        if not waiter.future.done():
+            waiter.future.set_exception(LockitTimeout(f"{self.name}: no response to {waiter.tag!r} in time"))
+
+    def _waiter_done(self, expiry):
+        # Answered, failed, timed out or cancelled: the window slot is free again
+        expiry.cancel()
+        if self._window is not None:
+            self._window.release()
+
+    def _write_done(self, write_future, future):
+        error = write_future.exception()
+        if error is not None:
+            self._on_error(error)
+
+    # Notifications
+
+    def notifications(self, tag=None, maxsize=NOTIFICATION_QUEUE_SIZE):
+        """Async iterator over notifications whose tag starts with tag (all if None)."""
+        stream = NotificationStream(self, tag, maxsize)
+        self._streams.add(stream)
+        return stream
+
+    # Called on the event loop by the I/O thread
+
+    def _on_reports(self, reports):
+        for report in reports:
+            for message in self._framer.feed(report):
+                if message.kind == RESPONSE:
+                    self._on_response(message)
+                elif message.kind in (NOTIFICATION, UNKNOWN):
+                    self.notifications_received += 1
+                    for stream in list(self._streams):
+                        if stream.tag is None or message.tag.startswith(stream.tag):
+                            stream._put(message)
+
+    def _on_response(self, message):
+        self.responses += 1
+        waiter, expired, lost = self._waiters.match(message.tag, self._loop.time())
+        for skipped in expired:
+            self.expired += 1
+            self._expire(skipped)
+        for skipped in lost:
+            self.lost += 1
+            if not skipped.future.done():
+                skipped.future.set_exception(LockitError(f"{self.name}: no response to {skipped.tag!r}"))
+        if waiter is None:
+            if len(self._waiters):
+                print(f"{self.name}: response {message.tag!r} does not match any request")
+            return
+        if not waiter.future.done():
+            waiter.future.set_result(message)
+
+    def _on_error(self, error):
+        if self._handle is None:
+            return
+        print(f"{self.name}: device error: {error}")
+        handle, self._handle = self._handle, None
+        self._io.detach(handle)
+        self._io.call(handle.close)
+        self._connected.clear()
+        self._fail_waiters(LockitError(f"{self.name} disconnected: {error}"))
+        if self.reconnect and not self._closing and self._reconnect_task is None:
+            self._reconnect_task = self._loop.create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self):
+        delay = self.reconnect_delay
+        try:
+            while not self._closing:
+                await asyncio.sleep(delay)
+                try:
+                    await self._connect()
+                except Exception as e:
+                    print(f"{self.name}: reconnect failed: {e}")
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    continue
+                self.reconnects += 1
+                print(f"{self.name}: reconnected")
+                self._reconnect_task = None
+                try:
+                    for command in self.reconnect_commands:
+                        await self.request(command)
+                except LockitError as e:
+                    print(f"{self.name}: reconnect command failed: {e}")
+                return
+        finally:
+            self._reconnect_task = None
+
+    def _fail_waiters(self, error):
+        for waiter in self._waiters.clear():
+            if not waiter.future.done():
+                waiter.future.set_exception(error)
+
+
+async def _main():
+    LTC_tag = b"*A6*I0:1*"  # Enable LTC Callback Tag
+
+    async with AsyncLockit(reconnect_commands=[LTC_tag]) as lockit:
+        print("Connected to Lockit with S/N: %s" % await lockit.serial_number())
+        firmware, rtc, tc = await lockit.request_many([b"*A0*", b"*A64*", b"*Q35*"])
+        print(f"Firmware response: {firmware.text()}")
+        print(f"Regular Timecode response: {rtc.text()}")
+        print(f"Timecode response: {tc.text()}")
+        async for message in lockit.notifications(tag=b"*C0*"):
+            print(f"LTC: {message.text()}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,481 @@
+"""
+Threaded client for the Ambient ACN-CL ("Lockit") HID protocol.
+
+send_recv in ACN_API.py spins on h.read(64) in the caller's thread, drops any
+notification that arrives meanwhile and allows only one command at a time.
+LockitClient instead runs one reader thread per device:
+
+- Every report is read by HidReader (hid_reader.py), which waits for data
+  instead of spinning, and is fed through LockitFramer.
+- Responses are handed to the waiting callers in request order (WaiterQueue).
+  Each waiter has a deadline; waiters at the head of the queue that expired
+  or were cancelled are dropped before a response is matched by its tag, so
+  a lost response to a repeated command (e.g. polling *Q35*) costs one
+  request instead of shifting every later response. The protocol guarantees
+  responses come back in the order the commands were sent, so when a
+  response matches a later command, the earlier ones were never answered:
+  they fail and free their window slots.
+- Notifications (e.g. LTC callbacks enabled with *A6*I0:1*) go to subscribers
+  on a separate dispatch thread, so a slow subscriber never stalls the reader
+  and no timecode is lost while a firmware or RTC query is outstanding.
+- Commands can be pipelined: submit() writes the command and returns a Future
+  straight away. Up to max_in_flight commands are outstanding at once, and
+  their futures resolve in FIFO order as the responses arrive. A command gives
+  its window slot back when it is answered, times out or is cancelled, so
+  commands the device never answers cannot fill the window for good.
+
+Usage:
+    client = LockitClient.open()
+    client.subscribe(lambda msg: print(msg.text()), tag=b"*C0*")
+    client.request(b"*A6*I0:1*")              # enable LTC callbacks
+    print(client.request(b"*A0*").text())     # firmware
+    firmware, rtc, tc = client.request_many([b"*A0*", b"*A64*", b"*Q35*"])
+    future = client.submit(b"*Q35*")
+    tc = client.result(future, timeout=0.5)   # LockitTimeout if no answer by then
+    client.close()
+
+    # Status of a whole rack in roughly one round trip
+    results = poll_all(clients, [b"*A0*", b"*A64*", b"*Q35*"])
+"""
+
+import itertools
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+
+from hid_reader import HidReader, READ_TIMEOUT_MS, REPORT_SIZE
+from lockit_framer import LockitFramer, NOTIFICATION, RESPONSE, UNKNOWN, END
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import HID_VENDOR_ID, HID_PRODUCT_ID
+
+DEFAULT_REQUEST_TIMEOUT = 2.0
+
+# Commands sent before the first response must come back
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+class LockitError(Exception):
+    """Raised for protocol errors and when the client is closed."""
+
+
+class LockitTimeout(LockitError, TimeoutError):
+    """Raised when a response does not arrive in time."""
+
+
+def command_tag(command):
+    """The leading field of a command, e.g. b"*A6*" for b"*A6*I0:1*Z"."""
+    end = command.find(b"*", 1)
+    return command[:end + 1] if end > 0 else command
+
+
+def encode_command(command):
+    """Complete a command with its "Z" terminator and pad it to one HID report."""
+    if isinstance(command, str):
+        command = command.encode()
+    if not command.endswith(END):
+        command = command + b"Z"
+    if len(command) > REPORT_SIZE:
+        raise LockitError(f"Command longer than {REPORT_SIZE} bytes: {command!r}")
+    # First byte is the report id (not part of the payload)
+    return command, bytes(1) + command + bytes(REPORT_SIZE - len(command))
+
+
+class _Waiter:
+    __slots__ = ("tag", "future", "deadline", "holds_slot")
+
+    def __init__(self, tag, future, deadline):
+        self.tag = tag
+        self.future = future
+        self.deadline = deadline
+        # Whether the waiter still holds a window slot
+        self.holds_slot = True
+
+
+class WaiterQueue:
+    """
+    Commands waiting for their responses, oldest first. Shared by LockitClient
+    and AsyncLockit, which serialise access to it. Futures are only handed
+    back, never resolved here, so each client settles them its own way.
+    """
+
+    def __init__(self):
+        self._waiters = deque()
+
+    def __len__(self):
+        return len(self._waiters)
+
+    def __iter__(self):
+        return iter(self._waiters)
+
+    def append(self, tag, future, deadline):
+        """Queue a waiter for the response to a command with tag, due by monotonic deadline (seconds)."""
+        waiter = _Waiter(tag, future, deadline)
+        self._waiters.append(waiter)
+        return waiter
+
+    def remove(self, waiter):
+        self._waiters.remove(waiter)
+
+    def match(self, tag, now):
+        """
+        Take the waiters a response with tag settles, as (waiter, expired, lost):
+        the waiter it answers (None if no waiter has the tag), the expired or
+        cancelled waiters dropped from the head, and the waiters before the
+        match that were never answered.
+        """
+        waiters = self._waiters
+        expired = []
+        # Their callers have given up; a late response for one of them is indistinguishable from the next one's
+        while waiters and (waiters[0].future.done() or waiters[0].deadline <= now):
+            expired.append(waiters.popleft())
+        index = next((i for i, waiter in enumerate(waiters) if waiter.tag == tag), None)
+        if index is None:
+            return None, expired, []
+        lost = [waiters.popleft() for _ in range(index)]
+        return waiters.popleft(), expired, lost
+
+    def clear(self):
+        """Remove and return every waiter."""
+        waiters = list(self._waiters)
+        self._waiters.clear()
+        return waiters
+
+
+class LockitClient:
+    """One Lockit device with a reader thread that demultiplexes responses and notifications."""
+
+    def __init__(self, device, read_timeout_ms=READ_TIMEOUT_MS, name=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 nonblocking=False):
+        self.device = device
+        self.read_timeout_ms = read_timeout_ms
+        self.name = name or "lockit"
+        self.framer = LockitFramer()
+        self.reader = HidReader(device, self._on_reports, read_timeout_ms, nonblocking, name=self.name)
+        # None means no limit on outstanding commands
+        self.max_in_flight = max_in_flight
+        self._window = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+        self._write_lock = threading.Lock()
+        # Held only around queue updates, so the reader never waits for a write
+        self._queue_lock = threading.Lock()
+        self._waiters = WaiterQueue()
+        self._subscribers = {}
+        self._tokens = itertools.count(1)
+        self._notifications = queue.SimpleQueue()
+
+        self._stop = threading.Event()
+        self._closed = False
+        self._reader = None
+        self._dispatcher = None
+
+        self.responses = 0
+        self.notifications = 0
+        self.unmatched = 0
+        self.lost = 0
+        self.expired = 0
+
+    @classmethod
+    def open(cls, vendor_id=HID_VENDOR_ID, product_id=HID_PRODUCT_ID, path=None, **kwargs):
+        """Open a Lockit by vendor/product id (or HID path) and start its reader."""
+        import hid
+
+        device = hid.device()
+        if path is not None:
+            device.open_path(path)
+        else:
+            device.open(vendor_id, product_id)
+        return cls(device, **kwargs).start()
+
+    def start(self):
+        if self._reader is None:
+            self._reader = threading.Thread(target=self._read_loop, name=f"{self.name}-reader", daemon=True)
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name=f"{self.name}-notify", daemon=True)
+            self._dispatcher.start()
+            self._reader.start()
+        return self
+
+    def close(self):
+        """Stop the reader, fail outstanding requests and close the device."""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        self.reader.wake()
+        if self._reader is not None and self._reader is not threading.current_thread():
+            self._reader.join()
+        self._notifications.put(None)
+        if self._dispatcher is not None and self._dispatcher is not threading.current_thread():
+            self._dispatcher.join()
+        self._fail_waiters(LockitError("Lockit client closed"))
+        try:
+            self.device.close()
+        except Exception as e:
+            print(f"Error closing {self.name}: {e}")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def serial_number(self):
+        return self.device.get_serial_number_string()
+
+    # Commands
+
+    def submit(self, command, timeout=None, response_timeout=DEFAULT_REQUEST_TIMEOUT):
+        """
+        Send a command without waiting and return a Future for its response.
+        Blocks (up to timeout seconds) while max_in_flight commands are outstanding.
+        The response is expected within response_timeout seconds; after that
+        the waiter is dropped when the next response arrives.
+        """
+        command, packet = encode_command(command)
+        tag = command_tag(command)
+        if not self._acquire_window(timeout):
+            raise LockitTimeout(f"{self.name}: {self.max_in_flight} commands still in flight")
+        try:
+            with self._write_lock:
+                if self._closed:
+                    raise LockitError("Lockit client closed")
+                # Queue the waiter before writing, so the response cannot overtake it
+                with self._queue_lock:
+                    waiter = self._waiters.append(tag, Future(), time.monotonic() + response_timeout)
+                try:
+                    self.device.write(packet)
+                except Exception:
+                    with self._queue_lock:
+                        self._waiters.remove(waiter)
+                    raise
+            # A response is on its way; don't let a nonblocking reader sleep through it
+            self.reader.wake()
+        except Exception:
+            self._release_window()
+            raise
+        waiter.future.add_done_callback(lambda _, waiter=waiter: self._on_waiter_done(waiter))
+        return waiter.future
+
+    def submit_many(self, commands, timeout=None, response_timeout=DEFAULT_REQUEST_TIMEOUT):
+        """Pipeline several commands; returns their futures in the same order."""
+        return [self.submit(command, timeout, response_timeout) for command in commands]
+
+    def request(self, command, timeout=DEFAULT_REQUEST_TIMEOUT):
+        """Send a command and wait for its response (a LockitMessage)."""
+        return self.result(self.submit(command, timeout, timeout), timeout, command)
+
+    def request_many(self, commands, timeout=DEFAULT_REQUEST_TIMEOUT):
+        """Pipeline several commands and wait for all responses, in order."""
+        futures = self.submit_many(commands, timeout, timeout)
+        return [self.result(future, timeout, command) for future, command in zip(futures, commands)]
+
+    def result(self, future, timeout=DEFAULT_REQUEST_TIMEOUT, command=None):
+        """
+        Wait up to timeout seconds for the response to a future from submit.
+        Raises LockitTimeout (naming command, if given) and gives the command
+        up, freeing its window slot, if no response came in time.
+        """
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # Cancelling frees the window slot; the waiter is dropped when the next response arrives
+            if future.cancel():
+                what = "" if command is None else f" to {command!r}"
+                raise LockitTimeout(f"No response{what} within {timeout} s") from None
+            return future.result()
+
+    def _acquire_window(self, timeout):
+        """Take a window slot within timeout seconds (None: no limit), expiring overdue waiters meanwhile."""
+        if self._window is None:
+            return True
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            # Wake up for the next waiter deadline, when its slot may be freed
+            wait = self._expire_waiters(now)
+            if end is not None:
+                wait = end - now if wait is None else min(wait, end - now)
+            if self._window.acquire(timeout=None if wait is None else max(wait, 0)):
+                return True
+            if end is not None and time.monotonic() >= end:
+                return False
+
+    def _expire_waiters(self, now):
+        """Fail waiters past their deadline that still hold a slot; seconds until the next deadline, or None."""
+        with self._queue_lock:
+            holding = [waiter for waiter in self._waiters if waiter.holds_slot]
+        next_deadline = None
+        for waiter in holding:
+            if waiter.deadline <= now:
+                self._fail(waiter, LockitTimeout(f"{self.name}: no response to {waiter.tag!r} in time"))
+            elif next_deadline is None or waiter.deadline < next_deadline:
+                next_deadline = waiter.deadline
+        return None if next_deadline is None else next_deadline - now
+
+    def _on_waiter_done(self, waiter):
+        # A cancelled request gives its slot back straight away
+        if waiter.future.cancelled():
+            self._release_slot(waiter)
+
+    def _release_slot(self, waiter):
+        with self._queue_lock:
+            if not waiter.holds_slot:
+                return
+            waiter.holds_slot = False
+        self._release_window()
+
+    def _release_window(self):
+        if self._window is not None:
+            self._window.release()
+
+    # Notifications
+
+    def subscribe(self, callback, tag=None):
+        """
+        Call callback(message) for every notification (or only those whose tag
+        starts with tag). Returns a token for unsubscribe().
+        """
+        token = next(self._tokens)
+        self._subscribers[token] = (tag, callback)
+        return token
+
+    def unsubscribe(self, token):
+        self._subscribers.pop(token, None)
+
+    # Reader side
+
+    def _read_loop(self):
+        try:
+            self.reader.run(self._stop)
+        except Exception as e:
+            if not self._stop.is_set():
+                print(f"Error reading from {self.name}: {e}")
+                self._fail_waiters(LockitError(f"Read failed: {e}"))
+
+    def _on_reports(self, reports):
+        for data in reports:
+            for message in self.framer.feed(data):
+                self._route(message)
+
+    def _route(self, message):
+        if message.kind == RESPONSE:
+            self.responses += 1
+            with self._queue_lock:
+                waiter, expired, lost = self._waiters.match(message.tag, time.monotonic())
+                waiting = len(self._waiters)
+            for skipped in expired:
+                self.expired += 1
+                self._fail(skipped, LockitTimeout(f"{self.name}: no response to {skipped.tag!r} in time"))
+            for skipped in lost:
+                self.lost += 1
+                self._fail(skipped, LockitError(f"{self.name}: no response to {skipped.tag!r}"))
+            if waiter is None:
+                self.unmatched += 1
+                if waiting:
+                    print(f"{self.name}: response {message.tag!r} does not match any request")
+                return
+            self._release_slot(waiter)
+            try:
+                waiter.future.set_result(message)
+            except InvalidStateError:
+                pass  # The caller timed out and cancelled
+        elif message.kind in (NOTIFICATION, UNKNOWN):
+            self.notifications += 1
+            self._notifications.put(message)
+
+    def _fail(self, waiter, error):
+        self._release_slot(waiter)
+        try:
+            waiter.future.set_exception(error)
+        except InvalidStateError:
+            pass  # Cancelled by its caller
+
+    def _dispatch_loop(self):
+        while True:
+            message = self._notifications.get()
+            if message is None:
+                return
+            for tag, callback in list(self._subscribers.values()):
+                if tag is not None and not message.tag.startswith(tag):
+                    continue
+                try:
+                    callback(message)
+                except Exception as e:
+                    print(f"Error in {self.name} notification callback: {e}")
+
+    def _fail_waiters(self, error):
+        with self._queue_lock:
+            waiters = self._waiters.clear()
+        for waiter in waiters:
+            self._fail(waiter, error)
+
+    def stats(self):
+        return {
+            "responses": self.responses,
+            "notifications": self.notifications,
+            "unmatched": self.unmatched,
+            "lost": self.lost,
+            "expired": self.expired,
+            "outstanding": len(self._waiters),
+            "framer": self.framer.stats(),
+            "reader": self.reader.stats(),
+        }
+
+
+def poll_all(clients, commands, timeout=DEFAULT_REQUEST_TIMEOUT):
+    """
+    Send commands to every client before waiting for any response, so polling
+    a rack of Lockits costs about one round trip instead of one per command.
+    Returns {client.name: [message or exception, ...]}.
+    """
+    pending = []
+    for client in clients:
+        futures = []
+        for command in commands:
+            try:
+                futures.append(client.submit(command, timeout))
+            except LockitError as e:
+                futures.append(e)
+        pending.append((client, futures))
+
+    results = {}
+    for client, futures in pending:
+        row = []
+        for future, command in zip(futures, commands):
+            if isinstance(future, Exception):
+                row.append(future)
+                continue
+            try:
+                row.append(client.result(future, timeout, command))
+            except LockitError as e:
+                row.append(e)
+        results[client.name] = row
+    return results
+
+
+if __name__ == "__main__":
+    firmware_tag = b"*A0*"  # Firmware Tag
+    LTC_tag = b"*A6*I0:1*"  # Enable LTC Callback Tag
+    RTC_tag = b"*A64*"  # RTC Tag
+    TC_tag = b"*Q35*"  # TC Tag
+
+    with LockitClient.open() as client:
+        print("Connecting to Lockit with S/N: %s" % client.serial_number())
+        client.subscribe(lambda msg: print(f"Notification: {msg.text()}"), tag=b"*C")
+
+        # All four commands go out back to back; responses arrive in order
+        ltc, firmware, rtc, tc = client.request_many([LTC_tag, firmware_tag, RTC_tag, TC_tag])
+        print(f"LTC response: {ltc.text()}")
+        print(f"Firmware response: {firmware.text()}")
+        print(f"Regular Timecode response: {rtc.text()}")
+        print(f"Timecode response: {tc.text()}")
+
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,265 @@
+"""
+Manage a rack of Lockits from one process.
+
+ACN_API.py, ACN-CL.py and test2.py open one device with
+h.open(HID_VENDOR_ID, HID_PRODUCT_ID), which takes whichever Lockit hidapi
+finds first. LockitFleet opens all of them:
+
+- hid.enumerate() lists every matching device. Each is opened by its path
+  and named by its serial number, so the same unit keeps its row however the
+  USB bus enumerates. Every device gets its own LockitClient and reader thread.
+- Each poll sends the status commands (firmware, RTC, timecode) to every
+  device before waiting for any answer, so a poll of the whole rack costs about
+  one round trip.
+- The round-trip time of every command is measured from write to response,
+  when the reader thread hands the response over. The last LATENCY_WINDOW
+  values per device give the p50/p95/max in the table.
+- A device that fails MAX_FAILED_POLLS polls in a row is closed. The bus is
+  enumerated again every RESCAN_INTERVAL seconds, so units that are plugged in
+  or come back are picked up.
+
+The table is redrawn in place with ANSI cursor movement when stdout is a
+terminal, and printed once per poll otherwise.
+
+Usage:
+    with LockitFleet() as fleet:
+        fleet.poll()
+        print(fleet.table())
+
+    python lockit_fleet.py [interval]      # live table, default 1 s
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from lockit_client import DEFAULT_REQUEST_TIMEOUT, LockitClient, LockitError
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import HID_VENDOR_ID, HID_PRODUCT_ID
+
+# Commands sent to every device on each poll, with their column titles
+STATUS_COMMANDS = ((b"*A0*", "Firmware"), (b"*A64*", "RTC"), (b"*Q35*", "Timecode"))
+
+# Round trips kept per device for the latency percentiles
+LATENCY_WINDOW = 200
+
+# Consecutive failed polls before a device is closed
+MAX_FAILED_POLLS = 3
+
+# Seconds between looking for new devices
+RESCAN_INTERVAL = 5.0
+
+
+def enumerate_lockits(vendor_id=HID_VENDOR_ID, product_id=HID_PRODUCT_ID):
+    """hid.enumerate entries for every matching device, one per path."""
+    import hid
+
+    devices = {}
+    for info in hid.enumerate(vendor_id, product_id):
+        devices.setdefault(info["path"], info)
+    return list(devices.values())
+
+
+def response_value(message):
+    """The field values of a response, e.g. "1.2.3" for b"*A0*I0:1.2.3*Z"."""
+    fields = message.fields()
+    return " ".join(fields.values()) if fields else message.text()
+
+
+class FleetDevice:
+    """One Lockit in the fleet: its client, last status and latency statistics."""
+
+    def __init__(self, info, client):
+        self.path = info["path"]
+        self.serial = info.get("serial_number") or client.name
+        self.client = client
+        self.status = {}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.polls = 0
+        self.errors = 0
+        self.failed_polls = 0
+        self.last_error = None
+        self.last_poll = None
+
+    def latency_stats(self):
+        """(last, p50, p95, max) round trip in ms over the window, or None before the first response."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+
+        def percentile(q):
+            return ordered[min(len(ordered) - 1, int(len(ordered) * q))] / 1e6
+
+        return self.latencies[-1] / 1e6, percentile(0.5), percentile(0.95), ordered[-1] / 1e6
+
+
+class LockitFleet:
+    """All matching Lockits, polled together."""
+
+    def __init__(self, vendor_id=HID_VENDOR_ID, product_id=HID_PRODUCT_ID, commands=STATUS_COMMANDS,
+                 timeout=DEFAULT_REQUEST_TIMEOUT, enumerate_devices=None, open_device=None):
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+        self.commands = commands
+        self.timeout = timeout
+        # Overridable for tests and simulated devices
+        self._enumerate = enumerate_devices or (lambda: enumerate_lockits(vendor_id, product_id))
+        self._open = open_device or (lambda info: LockitClient.open(path=info["path"],
+                                                                    name=info.get("serial_number") or None))
+        self.devices = {}
+        self._lock = threading.Lock()
+        self._last_scan = None
+        self.opened = 0
+        self.dropped = 0
+
+    def __enter__(self):
+        self.scan()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def scan(self):
+        """Open any matching device that is not open yet; returns the number opened."""
+        self._last_scan = time.monotonic()
+        opened = 0
+        for info in self._enumerate():
+            if info["path"] in self.devices:
+                continue
+            try:
+                client = self._open(info)
+            except (OSError, IOError, LockitError) as e:
+                print(f"Cannot open Lockit {info.get('serial_number') or info['path']!r}: {e}")
+                continue
+            with self._lock:
+                self.devices[info["path"]] = FleetDevice(info, client)
+            opened += 1
+        self.opened += opened
+        return opened
+
+    def _drop(self, device):
+        with self._lock:
+            self.devices.pop(device.path, None)
+        self.dropped += 1
+        print(f"Closing Lockit {device.serial}: {device.last_error}")
+        device.client.close()
+
+    def poll(self):
+        """Send the status commands to every device, wait for all responses and update the table."""
+        if self._last_scan is None or time.monotonic() - self._last_scan > RESCAN_INTERVAL:
+            self.scan()
+        with self._lock:
+            devices = list(self.devices.values())
+
+        # Write everything first; the futures record their own arrival time
+        pending = []
+        for device in devices:
+            requests = []
+            for command, title in self.commands:
+                sent = time.monotonic_ns()
+                try:
+                    # A full window means the device is still behind from the last poll; do not wait for it
+                    future = device.client.submit(command, timeout=0, response_timeout=self.timeout)
+                except (OSError, IOError, LockitError) as e:
+                    requests.append((command, title, e, sent, None))
+                    continue
+                arrived = []
+                future.add_done_callback(lambda _, arrived=arrived: arrived.append(time.monotonic_ns()))
+                requests.append((command, title, future, sent, arrived))
+            pending.append((device, requests))
+
+        # One deadline for the whole poll, so dead devices do not add up their timeouts
+        deadline = time.monotonic() + self.timeout
+        for device, requests in pending:
+            failed = False
+            for command, title, future, sent, arrived in requests:
+                if isinstance(future, Exception):
+                    error = future
+                else:
+                    try:
+                        message = device.client.result(future, max(0.0, deadline - time.monotonic()), command)
+                    except LockitError as e:
+                        error = e
+                    else:
+                        device.status[title] = response_value(message)
+                        # The done callback may still be running when the result is visible here
+                        device.latencies.append((arrived[0] if arrived else time.monotonic_ns()) - sent)
+                        continue
+                failed = True
+                device.errors += 1
+                device.last_error = error
+                device.status[title] = "-"
+            device.polls += 1
+            device.last_poll = time.monotonic()
+            device.failed_polls = device.failed_polls + 1 if failed else 0
+            if device.failed_polls >= MAX_FAILED_POLLS:
+                self._drop(device)
+
+    def table(self):
+        """The fleet as lines of text, one row per device sorted by serial number."""
+        titles = [title for _, title in self.commands]
+        header = ["Serial"] + titles + ["Last ms", "p50 ms", "p95 ms", "Max ms", "Errors"]
+        rows = []
+        with self._lock:
+            devices = sorted(self.devices.values(), key=lambda d: d.serial)
+        for device in devices:
+            latency = device.latency_stats()
+            timing = [f"{value:.2f}" for value in latency] if latency else ["-"] * 4
+            rows.append([device.serial] + [device.status.get(title, "") for title in titles] + timing
+                        + [str(device.errors)])
+        widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+        lines = ["  ".join(str(value).ljust(width) for value, width in zip(row, widths)) for row in [header] + rows]
+        lines.append(f"{len(devices)} device(s), {self.opened} opened, {self.dropped} dropped")
+        return lines
+
+    def stats(self):
+        with self._lock:
+            devices = list(self.devices.values())
+        return {
+            device.serial: {
+                "polls": device.polls,
+                "errors": device.errors,
+                "latency_ms": device.latency_stats(),
+                "client": device.client.stats(),
+            }
+            for device in devices
+        }
+
+    def close(self):
+        with self._lock:
+            devices = list(self.devices.values())
+            self.devices.clear()
+        for device in devices:
+            device.client.close()
+
+
+def run(interval=1.0, fleet=None):
+    """Poll every interval seconds and redraw the table in place."""
+    in_place = sys.stdout.isatty()
+    drawn = 0
+    with fleet or LockitFleet() as fleet:
+        try:
+            while True:
+                started = time.monotonic()
+                fleet.poll()
+                lines = fleet.table()
+                if in_place and drawn:
+                    # Back to the first line of the previous table, then overwrite it
+                    sys.stdout.write(f"\x1b[{drawn}F")
+                sys.stdout.write("".join(f"{line}\x1b[K\n" if in_place else f"{line}\n" for line in lines))
+                if in_place and drawn > len(lines):
+                    # Clear rows left over from devices that went away
+                    sys.stdout.write("\x1b[J")
+                sys.stdout.flush()
+                drawn = len(lines)
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    run(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
@@ -0,0 +1,225 @@
+"""
+Streaming message framer for the Ambient ACN-CL ("Lockit") HID protocol.
+
+Lockit messages look like b"*A0*I0:1.2.3*Z": they start with "*", fields are
+separated by "*" and the message ends with "*Z". HID reports are 64 bytes and
+zero padded, and as noted in ACN_API.py a single read can hold part of a
+message, one message or several.
+
+LockitFramer buffers report payloads in a fixed-size ring buffer, drops the
+zero padding and returns every complete message as soon as its "*Z" arrives.
+A message split across reads is put back together, and a read holding several
+messages returns all of them. Each message is classified as:
+
+    RESPONSE      - reply to a command ("*A..." / "*Q..."), in request order
+    NOTIFICATION  - sent by the device on its own ("*C...", e.g. LTC callbacks)
+    UNKNOWN       - anything else that still looked like a framed message
+
+Usage:
+    framer = LockitFramer()
+    for msg in framer.feed(h.read(64)):
+        if msg.kind == RESPONSE and msg.tag == b"*A0*":
+            print(msg.raw.decode())
+"""
+
+from collections import namedtuple
+
+RESPONSE = "response"
+NOTIFICATION = "notification"
+UNKNOWN = "unknown"
+
+START = b"*"
+END = b"*Z"
+
+# Big enough for many 64-byte reports worth of unread data
+DEFAULT_CAPACITY = 4096
+
+
+class LockitMessage(namedtuple("LockitMessage", ["kind", "tag", "raw"])):
+    """A complete framed message. tag is the leading field, e.g. b"*A0*"."""
+
+    __slots__ = ()
+
+    def fields(self):
+        """Return the "Ix:value" fields as a dict, e.g. {"I0": "1", "I1": "25"}."""
+        result = {}
+        for part in self.raw[len(self.tag):-len(END)].decode(errors="replace").split("*"):
+            name, sep, value = part.partition(":")
+            if sep:
+                result[name] = value
+        return result
+
+    def text(self):
+        return self.raw.decode(errors="replace")
+
+
+def classify(raw):
+    """Return (kind, tag) for a complete raw message."""
+    tag_end = raw.find(START, 1)
+    tag = raw[:tag_end + 1] if tag_end > 0 else raw
+    if tag.startswith(b"*A") or tag.startswith(b"*Q"):
+        return RESPONSE, tag
+    if tag.startswith(b"*C"):
+        return NOTIFICATION, tag
+    return UNKNOWN, tag
+
+
+class RingBuffer:
+    """Fixed-capacity byte ring buffer with substring search across the wrap point."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self._buf = bytearray(capacity)
+        self._capacity = capacity
+        self._start = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def free(self):
+        return self._capacity - self._len
+
+    def clear(self):
+        self._start = 0
+        self._len = 0
+
+    def write(self, data):
+        """Append data. Returns False (and writes nothing) if it does not fit."""
+        n = len(data)
+        if n > self.free():
+            return False
+        end = (self._start + self._len) % self._capacity
+        first = min(n, self._capacity - end)
+        self._buf[end:end + first] = data[:first]
+        if first < n:
+            self._buf[0:n - first] = data[first:]
+        self._len += n
+        return True
+
+    def _segments(self):
+        # The buffered bytes as at most two contiguous (start, stop) ranges
+        stop = self._start + self._len
+        if stop <= self._capacity:
+            return ((self._start, stop),)
+        return ((self._start, self._capacity), (0, stop - self._capacity))
+
+    def find(self, sub, offset=0):
+        """Index of sub relative to the read position, or -1."""
+        segments = self._segments()
+        first_start, first_stop = segments[0]
+        first_len = first_stop - first_start
+        if offset < first_len:
+            pos = self._buf.find(sub, first_start + offset, first_stop)
+            if pos >= 0:
+                return pos - first_start
+        if len(segments) == 1:
+            return -1
+
+        second_start, second_stop = segments[1]
+        # A match straddling the wrap point
+        k = len(sub)
+        if k > 1:
+            head = max(first_len - (k - 1), offset)
+            boundary = bytes(self.peek(first_len + min(k - 1, second_stop), head))
+            pos = boundary.find(sub)
+            if pos >= 0:
+                return head + pos
+        pos = self._buf.find(sub, second_start + max(offset - first_len, 0), second_stop)
+        if pos >= 0:
+            return first_len + pos
+        return -1
+
+    def peek(self, stop, start=0):
+        """Copy of the bytes in [start, stop) relative to the read position."""
+        stop = min(stop, self._len)
+        if start >= stop:
+            return b""
+        a = (self._start + start) % self._capacity
+        n = stop - start
+        if a + n <= self._capacity:
+            return bytes(self._buf[a:a + n])
+        return bytes(self._buf[a:]) + bytes(self._buf[:n - (self._capacity - a)])
+
+    def consume(self, n):
+        """Drop n bytes from the front."""
+        n = min(n, self._len)
+        self._start = (self._start + n) % self._capacity
+        self._len -= n
+        if not self._len:
+            self._start = 0
+
+
+class LockitFramer:
+    """Incremental framer turning HID report payloads into LockitMessages."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self._ring = RingBuffer(capacity)
+        self.messages = 0
+        self.bytes_in = 0
+        self.discarded = 0  # bytes dropped while resynchronising
+        self.overflows = 0
+
+    def buffered(self):
+        return len(self._ring)
+
+    def reset(self):
+        self.discarded += len(self._ring)
+        self._ring.clear()
+
+    def feed(self, report):
+        """Add one read's worth of data and return the complete messages it finished."""
+        data = bytes(report)
+        self.bytes_in += len(data)
+        # Reports are zero padded; zero bytes never occur inside a message
+        data = data.replace(b"\x00", b"")
+        messages = []
+        while data:
+            room = self._ring.free()
+            if room == 0:
+                # No terminator anywhere in a full buffer: drop it and resync
+                self.overflows += 1
+                self.reset()
+                room = self._ring.free()
+            self._ring.write(data[:room])
+            data = data[room:]
+            self._drain(messages)
+        return messages
+
+    def _drain(self, messages):
+        ring = self._ring
+        while len(ring):
+            start = ring.find(START)
+            if start < 0:
+                self.discarded += len(ring)
+                ring.clear()
+                return
+            if start > 0:
+                # Garbage before the next message
+                self.discarded += start
+                ring.consume(start)
+            if ring.peek(len(END)) == END:
+                # Terminator of a message whose start was lost
+                self.discarded += len(END)
+                ring.consume(len(END))
+                continue
+            end = ring.find(END, 1)
+            if end < 0:
+                return
+            raw = ring.peek(end + len(END))
+            ring.consume(end + len(END))
+            kind, tag = classify(raw)
+            messages.append(LockitMessage(kind, tag, raw))
+            self.messages += 1
+
+    def stats(self):
+        return {
+            "messages": self.messages,
+            "bytes_in": self.bytes_in,
+            "buffered": len(self._ring),
+            "discarded": self.discarded,
+            "overflows": self.overflows,
+        }
@@ -0,0 +1,304 @@
+"""
+Software Lockit for tests and protocol benchmarks.
+
+Nothing in this folder could run without an ACN-CL plugged in. SimulatedLockit
+has the parts of hid.device that the project uses (open/open_path, write,
+read with and without a timeout, set_nonblocking, get_serial_number_string,
+close), so LockitClient, HidReader, LockitFleet and the framer benchmarks run
+against it unchanged:
+
+- Commands are answered in order, in the same shapes as the device:
+    *A0*              firmware         b"*A0*I0:1.12.4*Z"
+    *A64*             RTC              b"*A64*I0:20240101120000*Z"
+    *Q35*             timecode status  b"*Q35*I0:<frame format>*I1:1*Z"
+    *A6*I0:1* / I0:0  LTC callbacks on/off, echoed back
+  Anything else is echoed with no fields.
+- While LTC callbacks are on, a thread sends b"*C0*I0:<LTC word>*I1:<fps>*Z"
+  at every frame boundary of rate, for the frame that just ended (the LTC word
+  is only complete once it has been sent). speed multiplies the notification
+  rate for stress tests; the timecode still steps one frame per notification.
+- Outgoing messages are packed into 64-byte zero-padded reports. With
+  fragment_rate a message is split across two reports. With merge_rate
+  messages waiting together share a report. Each report becomes readable
+  latency_ms (+- jitter_ms) after it was produced, in order.
+
+simulated_fleet() gives LockitFleet an enumerate/open pair for a rack of
+simulated units.
+
+Usage:
+    client = LockitClient(SimulatedLockit(fragment_rate=0.3, latency_ms=1)).start()
+    print(client.request(b"*A0*").text())
+
+    python lockit_sim.py                 # client benchmark at realistic and stress rates
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+from lockit_client import REPORT_SIZE
+
+# Shared timecode modules live in the Ambient Lockit folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ltc import encode_ltc_word
+from timecode import NS_PER_SECOND, FrameRate, Timecode
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import HID_VENDOR_ID, HID_PRODUCT_ID
+
+FIRMWARE = "1.12.4"
+
+# Frame format numbers of *A86* / *Q2* (frameIndex in draft.js)
+FRAME_FORMATS = {
+    FrameRate.FPS_24: 1,
+    FrameRate.FPS_25: 2,
+    FrameRate.FPS_2997_NDF: 3,
+    FrameRate.FPS_30: 4,
+    FrameRate.FPS_2997_DF: 5,
+}
+
+# Reports waiting to be read before the oldest are dropped, like a full USB buffer
+MAX_QUEUED_REPORTS = 4096
+
+
+class SimulatedLockit:
+    """Stand-in for hid.device that behaves like an ACN-CL Lockit."""
+
+    def __init__(self, serial="SIM0001", rate=FrameRate.FPS_25, start="10:00:00:00", speed=1.0,
+                 latency_ms=0.0, jitter_ms=0.0, fragment_rate=0.0, merge_rate=0.0, seed=None):
+        self.serial = serial
+        self.rate = rate
+        self.start_timecode = start if isinstance(start, Timecode) else Timecode.parse(start, rate)
+        self.speed = speed
+        self.latency_ns = int(latency_ms * 1e6)
+        self.jitter_ns = int(jitter_ms * 1e6)
+        self.fragment_rate = fragment_rate
+        self.merge_rate = merge_rate
+        self._rng = random.Random(seed)
+
+        self._reports = deque()          # (ready_ns, bytes)
+        self._ready = threading.Condition()
+        self._last_ready = 0
+        self._nonblocking = False
+        self._open = False
+        self._ltc_enabled = False
+        self._ltc_thread = None
+        self._stop = threading.Event()
+
+        self.commands = 0
+        self.notifications = 0
+        self.reports = 0
+        self.fragmented = 0
+        self.merged = 0
+        self.dropped = 0
+
+    # hid.device surface
+
+    def open(self, vendor_id=HID_VENDOR_ID, product_id=HID_PRODUCT_ID, serial_number=None):
+        self._open = True
+
+    def open_path(self, path):
+        self._open = True
+
+    def close(self):
+        self._stop.set()
+        if self._ltc_thread is not None and self._ltc_thread is not threading.current_thread():
+            self._ltc_thread.join()
+            self._ltc_thread = None
+        self._open = False
+        with self._ready:
+            self._ready.notify_all()
+
+    def get_serial_number_string(self):
+        return self.serial
+
+    def get_manufacturer_string(self):
+        return "Ambient Recording GmbH (simulated)"
+
+    def get_product_string(self):
+        return "ACN-CL"
+
+    def set_nonblocking(self, enable):
+        self._nonblocking = bool(enable)
+        return 0
+
+    def write(self, packet):
+        """Take one output report (report id + 64 bytes) and queue the response."""
+        payload = bytes(packet[1:]).rstrip(b"\x00")
+        if not payload.endswith(b"Z"):
+            payload += b"Z"
+        self.commands += 1
+        self._send([self._respond(payload)])
+        return len(packet)
+
+    def read(self, size, timeout_ms=None):
+        """
+        Next report (as a list of ints), or [] if none is ready within timeout_ms.
+        As in cython-hidapi, a positive timeout_ms is a timed read, and otherwise
+        the read waits without limit unless the device is nonblocking.
+        """
+        if timeout_ms is not None and timeout_ms > 0:
+            deadline = time.monotonic_ns() + timeout_ms * 1_000_000
+        else:
+            deadline = time.monotonic_ns() if self._nonblocking else None
+        with self._ready:
+            while True:
+                if not self._open:
+                    raise OSError("read from closed device")
+                now = time.monotonic_ns()
+                if self._reports and self._reports[0][0] <= now:
+                    return list(self._reports.popleft()[1][:size])
+                wait_until = self._reports[0][0] if self._reports else None
+                if deadline is not None:
+                    if now >= deadline:
+                        return []
+                    wait_until = deadline if wait_until is None else min(wait_until, deadline)
+                self._ready.wait(None if wait_until is None else (wait_until - now) / NS_PER_SECOND)
+
+    # Device behaviour
+
+    def _respond(self, command):
+        end = command.find(b"*", 1)
+        tag = command[:end + 1] if end > 0 else command
+        if tag == b"*A0*":
+            return b"*A0*I0:%s*Z" % FIRMWARE.encode()
+        if tag == b"*A64*":
+            return b"*A64*I0:%s*Z" % time.strftime("%Y%m%d%H%M%S").encode()
+        if tag == b"*Q35*":
+            return b"*Q35*I0:%d*I1:1*Z" % FRAME_FORMATS[self.rate]
+        if tag == b"*A6*":
+            enable = command.startswith(b"*A6*I0:1*")
+            self._set_ltc(enable)
+            return b"*A6*I0:%d*Z" % enable
+        return tag + b"Z"
+
+    def _set_ltc(self, enable):
+        self._ltc_enabled = enable
+        if enable and self._ltc_thread is None:
+            self._ltc_thread = threading.Thread(target=self._ltc_loop, name=f"{self.serial}-ltc", daemon=True)
+            self._ltc_thread.start()
+
+    def _ltc_loop(self):
+        rate = self.rate
+        fps = rate.nominal
+        # Frame period (ns) at the simulated speed
+        period = rate.denominator * NS_PER_SECOND / (rate.numerator * self.speed)
+        started = time.monotonic_ns()
+        frame = 0
+        while not self._stop.is_set():
+            frame += 1
+            due = started + int(frame * period)
+            delay = due - time.monotonic_ns()
+            if delay > 0 and self._stop.wait(delay / NS_PER_SECOND):
+                return
+            if not self._ltc_enabled:
+                continue
+            # The frame that has just been sent completely
+            hours, minutes, seconds, frames = (self.start_timecode + (frame - 1)).hmsf()
+            word = encode_ltc_word(hours, minutes, seconds, frames, drop_frame=rate.drop_frame, fps=fps)
+            self.notifications += 1
+            self._send([b"*C0*I0:%016X*I1:%d*Z" % (word, fps)])
+
+    def _send(self, messages):
+        """Pack messages into reports (splitting/merging as configured) and queue them."""
+        reports = []
+        current = b""
+        for message in messages:
+            if self.fragment_rate and len(message) > 1 and self._rng.random() < self.fragment_rate:
+                cut = self._rng.randint(1, len(message) - 1)
+                self.fragmented += 1
+                parts = (message[:cut], message[cut:])
+            else:
+                parts = (message,)
+            for part in parts:
+                if current and len(current) + len(part) <= REPORT_SIZE and self._rng.random() < self.merge_rate:
+                    current += part
+                    self.merged += 1
+                    continue
+                if current:
+                    reports.append(current)
+                current = part
+        if current:
+            reports.append(current)
+
+        with self._ready:
+            # Fold in what is still queued but not yet read, like the device does under load
+            if self.merge_rate and self._reports and reports:
+                ready_ns, last = self._reports[-1]
+                if len(last.rstrip(b"\x00")) + len(reports[0]) <= REPORT_SIZE and self._rng.random() < self.merge_rate:
+                    self._reports[-1] = (ready_ns, (last.rstrip(b"\x00") + reports.pop(0)).ljust(REPORT_SIZE, b"\x00"))
+                    self.merged += 1
+            now = time.monotonic_ns()
+            for report in reports:
+                ready = now + self.latency_ns
+                if self.jitter_ns:
+                    ready += int(self._rng.uniform(-self.jitter_ns, self.jitter_ns))
+                # Reports never overtake each other
+                ready = max(ready, self._last_ready)
+                self._last_ready = ready
+                self._reports.append((ready, report.ljust(REPORT_SIZE, b"\x00")))
+                self.reports += 1
+            while len(self._reports) > MAX_QUEUED_REPORTS:
+                self._reports.popleft()
+                self.dropped += 1
+            self._ready.notify_all()
+
+    def stats(self):
+        return {
+            "commands": self.commands,
+            "notifications": self.notifications,
+            "reports": self.reports,
+            "fragmented": self.fragmented,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "queued": len(self._reports),
+        }
+
+
+def simulated_fleet(count, **kwargs):
+    """(enumerate_devices, open_device) for LockitFleet backed by count SimulatedLockits."""
+    from lockit_client import LockitClient
+
+    infos = [{"path": b"sim:%d" % i, "serial_number": f"SIM{i + 1:04d}", "vendor_id": HID_VENDOR_ID,
+              "product_id": HID_PRODUCT_ID} for i in range(count)]
+
+    def open_device(info):
+        device = SimulatedLockit(serial=info["serial_number"], **kwargs)
+        device.open_path(info["path"])
+        return LockitClient(device, name=info["serial_number"]).start()
+
+    return (lambda: infos), open_device
+
+
+def benchmark(label, seconds=3.0, requests=500, nonblocking=False, **kwargs):
+    """Pipelined requests while LTC notifications stream in; prints client, framer and reader stats."""
+    from lockit_client import LockitClient
+
+    device = SimulatedLockit(seed=1, **kwargs)
+    device.open()
+    received = []
+    with LockitClient(device, name=label, nonblocking=nonblocking).start() as client:
+        client.subscribe(received.append, tag=b"*C0*")
+        client.request(b"*A6*I0:1*")
+        start = time.perf_counter()
+        for _ in range(requests // 4):
+            client.request_many([b"*A0*", b"*A64*", b"*Q35*", b"*A0*"])
+        rtt = (time.perf_counter() - start) / (requests // 4) * 1000
+        time.sleep(max(0.0, seconds - (time.perf_counter() - start)))
+        elapsed = time.perf_counter() - start
+        stats = client.stats()
+    print(f"{label}: {requests} requests (4 pipelined, {rtt:.2f} ms per batch), "
+          f"{len(received)} LTC notifications in {elapsed:.1f} s ({len(received) / elapsed:,.0f}/s)")
+    print(f"  device {device.stats()}")
+    print(f"  framer {stats['framer']}")
+    print(f"  reader {stats['reader']}")
+
+
+if __name__ == "__main__":
+    benchmark("realistic", latency_ms=1.0, jitter_ms=0.3, fragment_rate=0.05)
+    benchmark("stress", speed=40, fragment_rate=0.5, merge_rate=0.5)
+    benchmark("stress nonblocking", speed=40, fragment_rate=0.5, merge_rate=0.5, nonblocking=True)
@@ -0,0 +1,109 @@
+"""Tests for HidReader against a device with cython-hidapi read semantics."""
+
+import threading
+from collections import deque
+
+from hid_reader import REPORT_SIZE, HidReader
+from lockit_client import LockitClient
+
+
+class HidapiDevice:
+    """
+    Minimal hid.device stand-in. Like cython-hidapi, read(size, timeout_ms)
+    blocks without limit when timeout_ms <= 0 unless the device is nonblocking.
+    close() releases a blocked read with an empty result.
+    Writes are answered with one response report each.
+    """
+
+    def __init__(self):
+        self._reports = deque()
+        self._ready = threading.Condition()
+        self._nonblocking = False
+        self._open = True
+
+    def push(self, message):
+        with self._ready:
+            self._reports.append(list(message.ljust(REPORT_SIZE, b"\x00")))
+            self._ready.notify_all()
+
+    def set_nonblocking(self, enable):
+        self._nonblocking = bool(enable)
+        return 0
+
+    def read(self, size, timeout_ms=0):
+        with self._ready:
+            if not self._nonblocking:
+                timeout = timeout_ms / 1000 if timeout_ms > 0 else None
+                self._ready.wait_for(lambda: self._reports or not self._open, timeout)
+            # Closing ends blocking reads, so a reader stuck in one can still be stopped
+            return self._reports.popleft()[:size] if self._reports else []
+
+    def write(self, packet):
+        command = bytes(packet[1:]).rstrip(b"\x00")
+        self.push(command[:command.index(b"*", 1) + 1] + b"Z")
+        return len(packet)
+
+    def close(self):
+        with self._ready:
+            self._open = False
+            self._ready.notify_all()
+
+
+def test_single_report_is_handed_over_without_a_follow_up():
+    device = HidapiDevice()
+    batches = []
+    received = threading.Event()
+    reader = HidReader(device, lambda batch: (batches.append(batch), received.set())).start()
+    try:
+        device.push(b"*A0*I0:1.12.4*Z")
+        assert received.wait(1.0)
+        assert len(batches) == 1 and len(batches[0]) == 1
+        assert not device._nonblocking
+    finally:
+        device.close()
+        reader.stop()
+
+
+def test_queued_reports_come_in_one_batch():
+    device = HidapiDevice()
+    for i in range(5):
+        device.push(b"*C0*I0:%d*Z" % i)
+    batches = []
+    received = threading.Event()
+    reader = HidReader(device, lambda batch: (batches.append(batch), received.set())).start()
+    try:
+        assert received.wait(1.0)
+        assert [len(batch) for batch in batches] == [5]
+    finally:
+        device.close()
+        reader.stop()
+
+
+def test_client_request_without_notifications():
+    device = HidapiDevice()
+    client = LockitClient(device).start()
+    closed = threading.Event()
+    try:
+        assert client.request(b"*A0*", timeout=1.0).tag == b"*A0*"
+        assert client.request(b"*A64*", timeout=1.0).tag == b"*A64*"
+    finally:
+        closer = threading.Thread(target=lambda: (client.close(), closed.set()), daemon=True)
+        closer.start()
+        closer.join(2.0)
+    assert closed.is_set()
+
+
+def test_client_over_simulator_without_notifications():
+    from lockit_sim import SimulatedLockit
+
+    device = SimulatedLockit()
+    device.open()
+    client = LockitClient(device).start()
+    closed = threading.Event()
+    try:
+        assert client.request(b"*A0*", timeout=1.0).text() == "*A0*I0:1.12.4*Z"
+    finally:
+        closer = threading.Thread(target=lambda: (client.close(), closed.set()), daemon=True)
+        closer.start()
+        closer.join(2.0)
+    assert closed.is_set()
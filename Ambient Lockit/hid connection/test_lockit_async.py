@@ -0,0 +1,108 @@
+"""Tests for AsyncLockit against the simulated Lockit."""
+
+import asyncio
+
+import pytest
+
+from lockit_async import AsyncLockit, HidIOThread
+from lockit_client import LockitError, LockitTimeout
+from lockit_sim import SimulatedLockit
+
+
+class DroppingLockit(SimulatedLockit):
+    """A Lockit that never answers *A99*, and skips the answers to the first drop_q35 *Q35* commands."""
+
+    def __init__(self, drop_q35=0, **kwargs):
+        super().__init__(**kwargs)
+        self.drop_q35 = drop_q35
+
+    def write(self, packet):
+        command = bytes(packet[1:])
+        if command.startswith(b"*A99*"):
+            return len(packet)
+        if command.startswith(b"*Q35*") and self.drop_q35:
+            self.drop_q35 -= 1
+            return len(packet)
+        return super().write(packet)
+
+
+def open_lockit(device, **kwargs):
+    def opener():
+        device.open()
+        return device
+
+    return AsyncLockit(opener=opener, io=HidIOThread(), reconnect=False, **kwargs)
+
+
+def test_responses_after_a_lost_response():
+    async def main():
+        async with open_lockit(DroppingLockit(), max_in_flight=2) as lockit:
+            for _ in range(4):
+                with pytest.raises(LockitTimeout):
+                    await lockit.request(b"*A99*", timeout=0.1)
+                assert (await lockit.request(b"*A0*", timeout=1.0)).tag == b"*A0*"
+                assert (await lockit.request(b"*A64*", timeout=1.0)).tag == b"*A64*"
+            return lockit.expired
+
+    assert asyncio.run(main()) == 4
+
+
+def test_polling_one_command_after_a_lost_response():
+    async def main():
+        async with open_lockit(DroppingLockit(drop_q35=1)) as lockit:
+            with pytest.raises(LockitTimeout):
+                await lockit.request(b"*Q35*", timeout=0.1)
+            for _ in range(5):
+                assert (await lockit.request(b"*Q35*", timeout=1.0)).tag == b"*Q35*"
+
+    asyncio.run(main())
+
+
+def test_unanswered_commands_do_not_fill_the_window():
+    async def main():
+        async with open_lockit(DroppingLockit(), max_in_flight=2) as lockit:
+            # Submitted and never awaited: the slots come back at their deadline
+            lost = [await lockit.submit(b"*A99*", timeout=0.1) for _ in range(2)]
+            assert (await lockit.request(b"*A0*", timeout=1.0)).tag == b"*A0*"
+            for future in lost:
+                with pytest.raises(LockitTimeout):
+                    await future
+
+    asyncio.run(main())
+
+
+def test_request_timeout_is_applied_once():
+    async def main():
+        async with open_lockit(DroppingLockit()) as lockit:
+            started = asyncio.get_running_loop().time()
+            with pytest.raises(LockitTimeout):
+                await lockit.request_many([b"*A99*", b"*A99*"], timeout=0.2)
+            return asyncio.get_running_loop().time() - started
+
+    assert asyncio.run(main()) < 0.35
+
+
+def test_pipelined_lost_response_fails_its_future():
+    async def main():
+        async with open_lockit(DroppingLockit()) as lockit:
+            lost = await lockit.submit(b"*A99*")
+            answered = await lockit.submit(b"*Q35*")
+            assert (await asyncio.wait_for(answered, 1.0)).tag == b"*Q35*"
+            with pytest.raises(LockitError):
+                await lost
+
+    asyncio.run(main())
+
+
+def test_idle_device_is_not_polled():
+    async def main():
+        async with open_lockit(SimulatedLockit()) as lockit:
+            await lockit.request(b"*A0*")
+            reader = lockit._io._devices[0].reader
+            reads = reader.reads
+            await asyncio.sleep(0.5)
+            # Timed reads of READ_TIMEOUT_MS, not a 1 ms poll
+            return reader.reads - reads
+
+    assert asyncio.run(main()) <= 10
+
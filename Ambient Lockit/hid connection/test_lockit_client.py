@@ -0,0 +1,106 @@
+"""Tests for LockitClient against the simulated Lockit."""
+
+import time
+
+import pytest
+
+from lockit_client import LockitClient, LockitTimeout
+from lockit_sim import SimulatedLockit
+
+
+class DroppingLockit(SimulatedLockit):
+    """A Lockit that never answers *A99*, and skips the answers to the first drop_q35 *Q35* commands."""
+
+    def __init__(self, drop_q35=0, **kwargs):
+        super().__init__(**kwargs)
+        self.drop_q35 = drop_q35
+
+    def write(self, packet):
+        command = bytes(packet[1:])
+        if command.startswith(b"*A99*"):
+            return len(packet)
+        if command.startswith(b"*Q35*") and self.drop_q35:
+            self.drop_q35 -= 1
+            return len(packet)
+        return super().write(packet)
+
+
+@pytest.fixture
+def client():
+    device = DroppingLockit()
+    device.open()
+    client = LockitClient(device, max_in_flight=2).start()
+    yield client
+    client.close()
+
+
+def test_responses_after_a_lost_response(client):
+    for _ in range(4):
+        with pytest.raises(LockitTimeout):
+            client.request(b"*A99*", timeout=0.1)
+        # Each later request gets its own response, and the window is not used up
+        assert client.request(b"*A0*", timeout=1.0).tag == b"*A0*"
+        assert client.request(b"*A64*", timeout=1.0).tag == b"*A64*"
+    stats = client.stats()
+    # Timed out and cancelled, so dropped from the head when the next response came
+    assert stats["expired"] == 4
+    assert stats["outstanding"] == 0
+
+
+def test_polling_one_command_after_a_lost_response():
+    device = DroppingLockit(drop_q35=1)
+    device.open()
+    with LockitClient(device).start() as client:
+        with pytest.raises(LockitTimeout):
+            client.request(b"*Q35*", timeout=0.1)
+        # The next answer goes to the next request, not to the one that gave up
+        for _ in range(5):
+            assert client.request(b"*Q35*", timeout=1.0).tag == b"*Q35*"
+        assert client.stats()["outstanding"] == 0
+
+
+def test_expired_waiter_is_dropped_before_matching():
+    device = DroppingLockit(drop_q35=1)
+    device.open()
+    with LockitClient(device).start() as client:
+        # Never waited on: only the deadline tells the client to give up on it
+        lost = client.submit(b"*Q35*", response_timeout=0.05)
+        time.sleep(0.1)
+        assert client.request(b"*Q35*", timeout=1.0).tag == b"*Q35*"
+        assert isinstance(lost.exception(0), LockitTimeout)
+        assert client.stats()["expired"] == 1
+
+
+def test_pipelined_lost_response_fails_its_future(client):
+    lost, answered = client.submit_many([b"*A99*", b"*Q35*"])
+    assert answered.result(1.0).tag == b"*Q35*"
+    assert isinstance(lost.exception(1.0), Exception)
+
+
+def test_late_response_is_still_consumed_in_order(client):
+    responses = client.request_many([b"*A0*", b"*A64*"], timeout=1.0)
+    assert [r.tag for r in responses] == [b"*A0*", b"*A64*"]
+    assert client.stats()["lost"] == 0
+
+
+def test_unanswered_commands_do_not_fill_the_window(client):
+    # Two lost answers with max_in_flight=2: both slots come back when the requests time out
+    for _ in range(2):
+        with pytest.raises(LockitTimeout):
+            client.request(b"*A99*", timeout=0.1)
+    assert client.request(b"*A0*", timeout=1.0).tag == b"*A0*"
+
+
+def test_submit_waits_for_overdue_commands_to_expire(client):
+    lost = client.submit_many([b"*A99*", b"*A99*"], response_timeout=0.1)
+    # The window is full; submit (no timeout) gets a slot once those are overdue
+    answered = client.submit(b"*A0*")
+    assert answered.result(1.0).tag == b"*A0*"
+    assert all(isinstance(future.exception(0), LockitTimeout) for future in lost)
+    assert client.stats()["outstanding"] == 0
+
+
+def test_cancelled_request_frees_its_slot(client):
+    first, second = client.submit_many([b"*A99*", b"*A99*"], response_timeout=60)
+    assert first.cancel() and second.cancel()
+    assert client.request(b"*A64*", timeout=1.0).tag == b"*A64*"
@@ -0,0 +1,63 @@
+"""Tests for LockitFleet on a rack of simulated Lockits."""
+
+import time
+
+from lockit_fleet import MAX_FAILED_POLLS, LockitFleet
+from lockit_sim import simulated_fleet
+
+TIMEOUT = 0.3
+
+
+def dropping_fleet(count, dropping, serial="SIM0002"):
+    """LockitFleet over count simulated units; serial ignores every command while dropping is non-empty."""
+    enumerate_devices, open_simulated = simulated_fleet(count)
+
+    def open_device(info):
+        client = open_simulated(info)
+        if info["serial_number"] == serial:
+            write = client.device.write
+            client.device.write = lambda packet: len(packet) if dropping else write(packet)
+        return client
+
+    return LockitFleet(timeout=TIMEOUT, enumerate_devices=enumerate_devices, open_device=open_device)
+
+
+def statuses(fleet):
+    return {device.serial: dict(device.status) for device in fleet.devices.values()}
+
+
+def test_device_dropping_responses():
+    dropping = []
+    with dropping_fleet(3, dropping) as fleet:
+        fleet.poll()
+        assert all("-" not in status.values() for status in statuses(fleet).values())
+
+        dropping.append(True)
+        started = time.monotonic()
+        fleet.poll()
+        # One deadline for the whole poll, not one per unanswered command
+        assert time.monotonic() - started < 2 * TIMEOUT
+        status = statuses(fleet)
+        assert set(status["SIM0002"].values()) == {"-"}
+        assert all("-" not in status[serial].values() for serial in ("SIM0001", "SIM0003"))
+        device = next(device for device in fleet.devices.values() if device.serial == "SIM0002")
+        assert device.errors == len(fleet.commands)
+
+        # Answers again. The commands that timed out gave their window slots back (or this poll
+        # could not be sent), and each response goes to its own command, none to the ones given up
+        dropping.clear()
+        fleet.poll()
+        assert "-" not in statuses(fleet)["SIM0002"].values()
+        assert device.failed_polls == 0
+        stats = device.client.stats()
+        assert stats["expired"] == len(fleet.commands)
+        assert stats["outstanding"] == 0
+
+
+def test_device_that_keeps_dropping_is_closed():
+    dropping = [True]
+    with dropping_fleet(2, dropping) as fleet:
+        for _ in range(MAX_FAILED_POLLS):
+            fleet.poll()
+        assert sorted(device.serial for device in fleet.devices.values()) == ["SIM0001"]
+        assert fleet.dropped == 1
@@ -0,0 +1,98 @@
+"""Tests for RingBuffer and LockitFramer."""
+
+import pytest
+
+from lockit_framer import NOTIFICATION, RESPONSE, UNKNOWN, LockitFramer, RingBuffer
+
+REPORT_SIZE = 64
+
+MESSAGES = [b"*A0*I0:1.12.4*Z", b"*C0*I0:0102030405060203*I1:25*Z", b"*Q35*I0:10:00:00:00*Z", b"*A64*I0:1700000000*Z"]
+
+
+def report(data):
+    """One zero-padded HID report payload."""
+    assert len(data) <= REPORT_SIZE
+    return data + bytes(REPORT_SIZE - len(data))
+
+
+def wrapped_ring(capacity, start, data):
+    """RingBuffer of capacity whose read position is at start, holding data."""
+    ring = RingBuffer(capacity)
+    ring.write(bytes(start))
+    ring.consume(start)
+    assert ring.write(data)
+    return ring
+
+
+@pytest.mark.parametrize("start", range(16))
+def test_ring_buffer_find_and_peek_across_the_wrap(start):
+    data = b"*A0*Z*C0*Z**Z"
+    ring = wrapped_ring(16, start, data)
+    assert len(ring) == len(data) and ring.free() == 16 - len(data)
+    for sub in (b"*", b"*Z", b"**", b"*C0*", b"Z*", b"*Z*Z", b"A0*Z*C", b"x", data):
+        for offset in range(len(data) + 1):
+            assert ring.find(sub, offset) == data.find(sub, offset), (sub, offset)
+    for begin in range(len(data) + 1):
+        for stop in range(begin, len(data) + 3):
+            assert ring.peek(stop, begin) == data[begin:stop]
+
+
+def test_ring_buffer_write_consume_and_clear():
+    ring = wrapped_ring(8, 5, b"abcdef")
+    assert not ring.write(b"xyz")
+    assert ring.peek(8) == b"abcdef"
+    ring.consume(4)
+    assert ring.write(b"xyz")
+    assert ring.peek(8) == b"efxyz"
+    ring.consume(10)
+    assert len(ring) == 0 and ring.find(b"x") == -1
+    assert ring.write(b"12345678") and ring.free() == 0
+    ring.clear()
+    assert len(ring) == 0 and ring.peek(8) == b""
+
+
+def test_messages_merged_into_one_report():
+    framer = LockitFramer()
+    messages = framer.feed(report(MESSAGES[0] + MESSAGES[1]))
+    assert [message.raw for message in messages] == MESSAGES[:2]
+    assert [(message.kind, message.tag) for message in messages] == [(RESPONSE, b"*A0*"), (NOTIFICATION, b"*C0*")]
+    assert messages[1].fields() == {"I0": "0102030405060203", "I1": "25"}
+    assert framer.stats()["buffered"] == 0
+
+
+def test_message_split_at_every_point():
+    stream = MESSAGES[1] + MESSAGES[2]
+    for split in range(1, len(stream)):
+        framer = LockitFramer()
+        messages = framer.feed(report(stream[:split])) + framer.feed(report(stream[split:]))
+        assert [message.raw for message in messages] == MESSAGES[1:3], split
+        assert framer.stats()["discarded"] == 0
+
+
+@pytest.mark.parametrize("chunk", [1, 5, 17, 40])
+def test_stream_through_a_small_wrapping_buffer(chunk):
+    # Capacity smaller than the stream, so the ring wraps many times
+    framer = LockitFramer(capacity=48)
+    stream = b"".join(MESSAGES) * 20
+    messages = []
+    for i in range(0, len(stream), chunk):
+        messages += framer.feed(report(stream[i:i + chunk]))
+    assert [message.raw for message in messages] == MESSAGES * 20
+    stats = framer.stats()
+    assert stats["messages"] == len(MESSAGES) * 20
+    assert stats["discarded"] == stats["overflows"] == stats["buffered"] == 0
+
+
+def test_resync_after_garbage_and_a_lost_start():
+    framer = LockitFramer()
+    # Garbage, then the end of a message whose start was lost, then a whole one
+    messages = framer.feed(report(b"xx*Z" + MESSAGES[2] + b"*X1*Z"))
+    assert [(message.kind, message.raw) for message in messages] == [(RESPONSE, MESSAGES[2]), (UNKNOWN, b"*X1*Z")]
+    assert framer.stats()["discarded"] == 4
+
+
+def test_overflow_without_a_terminator():
+    framer = LockitFramer(capacity=32)
+    assert framer.feed(report(b"*A0*" + b"1" * 40)) == []
+    assert framer.stats()["overflows"] == 1
+    assert [message.raw for message in framer.feed(report(b"*Z" + MESSAGES[0]))] == [MESSAGES[0]]
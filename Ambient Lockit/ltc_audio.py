@@ -0,0 +1,619 @@
+"""
+LTC audio decoding for recorded WAV files, and LTC audio generation.
+
+The Lockit feeds LTC into the recorders, so every audio track with LTC on it
+carries its own timecode. ltc.py decodes the 64-bit data word; this module
+gets those words out of the audio. Everything after reading the file works on
+whole blocks of samples with NumPy; there is no per-sample Python loop:
+
+1. WavReader memory-maps the file and returns blocks of one channel as
+   float32, so only one block is in memory at a time.
+2. Edges: samples are classified high (> +threshold), low (< -threshold) or
+   undecided, and the last decided state is carried forward. This is
+   hysteresis without a loop. Each change of state is an edge, interpolated to
+   a fraction of a sample. The threshold is HYSTERESIS times the block's peak,
+   so the level does not matter.
+3. Bits (biphase mark): every bit starts with a transition, and a 1 has
+   another one half way. An interval of about one bit period is a 0, and two
+   half-period intervals in a row are a 1. Shorts are paired from the start of
+   each run of them. The bit period is tracked from block to block, and
+   intervals that fit neither length are marked invalid.
+4. Frames: the 16-bit sync word (bits 64-79) is searched with a sliding window.
+   The 64 bits before each match are packed into a uint64 and decoded with
+   ltc.decode_ltc_words.
+
+Edges, bits and frames that straddle a block boundary are carried over to the
+next block, so the result does not depend on the block size. Each block gives
+a dict of arrays: the decode_ltc_words fields plus "sample" (the sample
+position where the frame starts), "word", "count" (frames since 00:00:00:00)
+and "rate" (the FrameRate). If no rate is given, it is detected from the
+spacing of the sync words and the drop-frame flag. Sync words are collected
+across blocks until there are enough to tell, and the frames found meanwhile
+are returned with the block that settles the rate. Only forward play is
+decoded.
+
+LTCAudioGenerator goes the other way, for testing without a Lockit. It
+encodes a run of frames with ltc.encode_ltc_words and turns them into
+transition times. Each transition is a step that is spread over the sample
+it lands in, so edges keep their sub-sample timing. A box filter gives the
+edges their rise time. Optional Gaussian jitter on every transition and
+randomly silenced frames (dropouts) exercise the decoder. Blocks stream to a
+WAV file or to any consumer.
+
+Usage:
+    for block in decode_wav("A001_track3.wav", channel=2):
+        print(block["sample"][:1], format_timecodes(block["count"][:1], block["rate"]))
+
+    generator = LTCAudioGenerator(FrameRate.FPS_2997_DF, 48000, jitter_ns=2000)
+    generator.write_wav("ltc.wav", Timecode.parse("01:00:00;00", FrameRate.FPS_2997_DF), 30 * 60)
+
+    python ltc_audio.py A001_track3.wav [channel]
+    python ltc_audio.py --generate ltc.wav --fps 29.97 --drop-frame --seconds 600
+    python ltc_audio.py                          # benchmark: generate an hour, then decode it
+"""
+
+import mmap
+import struct
+import time
+import wave
+
+try:
+    import numpy as np
+except ImportError:  # decoding audio needs numpy; the rest of the project does not
+    np = None
+
+from ltc import POLARITY_BIT, POLARITY_BIT_25, decode_ltc_words, encode_ltc_words
+from timecode import FrameRate, frames_to_hmsf_array, hmsf_to_frames_array
+
+# Samples per block handed to the decoder
+BLOCK_FRAMES = 1 << 20
+
+# Hysteresis threshold as a fraction of the block's peak level
+HYSTERESIS = 0.2
+# Blocks quieter than this (full scale = 1.0) are treated as silence
+MIN_LEVEL = 0.01
+
+# Intervals between these fractions of a bit period are half bits...
+SHORT_MIN, SHORT_MAX = 0.25, 0.75
+# ...and between these, whole bits
+LONG_MAX = 1.5
+
+# Edges after the last whole bit are carried to the next block, up to this many
+MAX_CARRY_EDGES = 256
+# Intervals collected before the first bit period is guessed (about one frame)
+MIN_GUESS_INTERVALS = 64
+# Sync words collected before the rate is detected, when it is not given
+MIN_DETECT_SYNCS = 3
+
+# Frames per generated block
+GENERATOR_BLOCK_FRAMES = 250
+# 10-90% rise time of generated edges (SMPTE 12M: 25 +- 5 µs)
+RISE_TIME_US = 25
+
+BITS_PER_FRAME = 80
+# Bits 64-79 in the order they are sent
+SYNC_BITS = (0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 1)
+INVALID_BIT = 2
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+_NOMINAL_RATES = {24: FrameRate.FPS_24, 25: FrameRate.FPS_25, 30: FrameRate.FPS_30}
+
+
+def _require_numpy(name):
+    if np is None:
+        raise ImportError(f"{name} requires numpy")
+
+
+class WavReader:
+    """Memory-mapped PCM/float WAV file."""
+
+    def __init__(self, path):
+        _require_numpy("WavReader")
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is empty") from None
+        riff, _, wave = struct.unpack_from("<4sI4s", self._map, 0)
+        if riff != b"RIFF" or wave != b"WAVE":
+            self.close()
+            raise ValueError(f"{path} is not a RIFF/WAVE file")
+
+        fmt = None
+        self.data_offset = self.data_size = None
+        offset = 12
+        while offset + 8 <= len(self._map):
+            chunk, size = struct.unpack_from("<4sI", self._map, offset)
+            if chunk == b"fmt ":
+                fmt = struct.unpack_from("<HHIIHH", self._map, offset + 8)
+                if fmt[0] == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                    # The real format code is the first two bytes of the sub-format GUID
+                    fmt = struct.unpack_from("<H", self._map, offset + 32) + fmt[1:]
+            elif chunk == b"data":
+                self.data_offset = offset + 8
+                # Recorders that were stopped uncleanly leave the size at 0 or too large
+                self.data_size = min(size, len(self._map) - self.data_offset) or len(self._map) - self.data_offset
+                break
+            offset += 8 + size + (size & 1)
+        if fmt is None or self.data_offset is None:
+            self.close()
+            raise ValueError(f"{path} has no fmt or data chunk")
+
+        self.format, self.channels, self.sample_rate, _, self.block_align, self.bits = fmt
+        self.sample_width = self.bits // 8
+        if (self.format, self.sample_width) not in ((WAVE_FORMAT_PCM, 1), (WAVE_FORMAT_PCM, 2), (WAVE_FORMAT_PCM, 3),
+                                                    (WAVE_FORMAT_PCM, 4), (WAVE_FORMAT_IEEE_FLOAT, 4),
+                                                    (WAVE_FORMAT_IEEE_FLOAT, 8)):
+            self.close()
+            raise ValueError(f"{path}: unsupported WAV format {self.format} with {self.bits} bits")
+        self.frames = self.data_size // self.block_align
+
+    def channel(self, index, start=0, count=None):
+        """float32 samples of one channel, full scale = 1.0."""
+        if not 0 <= index < self.channels:
+            raise ValueError(f"{self.path} has {self.channels} channels, not {index + 1}")
+        count = self.frames - start if count is None else min(count, self.frames - start)
+        offset = self.data_offset + start * self.block_align + index * self.sample_width
+        width = self.sample_width
+        if width == 3:
+            # No 24-bit dtype: gather the three bytes of each sample into the top of an int32
+            raw = np.ndarray((count, 3), np.uint8, self._map, offset, (self.block_align, 1))
+            value = (raw[:, 0].astype(np.int32) << 8) | (raw[:, 1].astype(np.int32) << 16) | (
+                raw[:, 2].astype(np.int32) << 24)
+            return value.astype(np.float32) * np.float32(1 / 2 ** 31)
+        if self.format == WAVE_FORMAT_IEEE_FLOAT:
+            dtype = "<f4" if width == 4 else "<f8"
+            return np.ndarray((count,), dtype, self._map, offset, (self.block_align,)).astype(np.float32)
+        if width == 1:
+            # 8-bit WAV is unsigned
+            value = np.ndarray((count,), np.uint8, self._map, offset, (self.block_align,))
+            return (value.astype(np.float32) - 128) * np.float32(1 / 128)
+        dtype = "<i2" if width == 2 else "<i4"
+        value = np.ndarray((count,), dtype, self._map, offset, (self.block_align,))
+        return value.astype(np.float32) * np.float32(1 / 2 ** (8 * width - 1))
+
+    def blocks(self, index=0, block_frames=BLOCK_FRAMES):
+        """(start sample, float32 samples) for consecutive blocks of one channel."""
+        for start in range(0, self.frames, block_frames):
+            yield start, self.channel(index, start, block_frames)
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class LTCAudioDecoder:
+    """Streaming biphase-mark LTC decoder for blocks of audio samples."""
+
+    def __init__(self, sample_rate, rate=None, hysteresis=HYSTERESIS):
+        _require_numpy("LTCAudioDecoder")
+        self.sample_rate = sample_rate
+        self.rate = rate
+        self.hysteresis = hysteresis
+        # Bit period in samples; None until the first block with edges
+        self.bit_period = sample_rate / (BITS_PER_FRAME * rate.fps) if rate is not None else None
+
+        self._position = 0
+        self._state = 0
+        self._last_sample = 0.0
+        self._edges = np.zeros(0)
+        self._bits = np.zeros(0, dtype=np.int8)
+        self._bit_starts = np.zeros(0)
+        self._sync = np.array(SYNC_BITS, dtype=np.int8)
+        self._last_count = None
+        # Frames found while the rate is still unknown
+        self._pending_words = np.zeros(0, dtype=np.uint64)
+        self._pending_samples = np.zeros(0)
+
+        self.samples = 0
+        self.edges = 0
+        self.bits = 0
+        self.invalid_intervals = 0
+        self.syncs = 0
+        self.frames = 0
+        self.rejected = 0
+        self.discontinuities = 0
+
+    def feed(self, samples, start=None):
+        """Decode the next block; returns a dict of arrays (see module docstring) or None."""
+        x = np.asarray(samples, dtype=np.float32)
+        if start is None:
+            start = self._position
+        self._position = start + len(x)
+        self.samples += len(x)
+        if not len(x):
+            return None
+
+        edges = self._find_edges(x, start)
+        self.edges += len(edges)
+        bits, bit_starts = self._slice_bits(edges)
+        self.bits += len(bits)
+        return self._find_frames(bits, bit_starts)
+
+    def _find_edges(self, x, start):
+        peak = float(np.max(np.abs(x)))
+        previous = self._last_sample
+        self._last_sample = float(x[-1])
+        if peak < MIN_LEVEL:
+            return np.zeros(0)
+        threshold = np.float32(peak * self.hysteresis)
+
+        # +1 above the threshold, -1 below, 0 in between; 0 takes the last decided state
+        state = (x > threshold).astype(np.int8) - (x < -threshold).astype(np.int8)
+        index = np.arange(len(x))
+        last_decided = np.maximum.accumulate(np.where(state != 0, index, -1))
+        filled = np.where(last_decided >= 0, state[np.maximum(last_decided, 0)], self._state).astype(np.int8)
+        before = np.concatenate(([self._state], filled[:-1]))
+        changes = np.flatnonzero((filled != before) & (before != 0))
+        self._state = int(filled[-1])
+
+        # Where the signal crossed the threshold between the previous sample and this one
+        after_value = x[changes]
+        before_value = np.where(changes > 0, x[np.maximum(changes - 1, 0)], previous)
+        level = np.where(filled[changes] > 0, threshold, -threshold)
+        step = after_value - before_value
+        fraction = np.where(step != 0, (level - before_value) / np.where(step != 0, step, 1), 1.0)
+        return start + changes - 1 + np.clip(fraction, 0, 1)
+
+    def _slice_bits(self, new_edges):
+        edges = np.concatenate((self._edges, new_edges))
+        if len(edges) < 2:
+            self._edges = edges
+            return np.zeros(0, dtype=np.int8), np.zeros(0)
+        intervals = np.diff(edges)
+
+        if self.bit_period is None:
+            if len(intervals) < MIN_GUESS_INTERVALS:
+                # Too few to be sure there are whole bits among them
+                self._edges = edges
+                return np.zeros(0, dtype=np.int8), np.zeros(0)
+            # Whole bits are the longest intervals; half bits are about half as long
+            guess = np.percentile(intervals, 95)
+            long = intervals[(intervals > 0.75 * guess) & (intervals < 1.5 * guess)]
+            if not len(long):
+                self._edges = edges[-MAX_CARRY_EDGES:]
+                return np.zeros(0, dtype=np.int8), np.zeros(0)
+            self.bit_period = float(np.median(long))
+        period = self.bit_period
+
+        short = (intervals >= SHORT_MIN * period) & (intervals < SHORT_MAX * period)
+        long = (intervals >= SHORT_MAX * period) & (intervals <= LONG_MAX * period)
+        invalid = ~(short | long)
+        self.invalid_intervals += int(invalid.sum())
+
+        # Process up to the last whole bit or invalid interval; the shorts after it may be half a pair
+        breaks = np.flatnonzero(~short)
+        if len(breaks):
+            end = breaks[-1] + 1
+        elif len(edges) > MAX_CARRY_EDGES:
+            end = len(intervals)
+        else:
+            self._edges = edges
+            return np.zeros(0, dtype=np.int8), np.zeros(0)
+        self._edges = edges[end:]
+        short, long, invalid = short[:end], long[:end], invalid[:end]
+        index = np.arange(end)
+
+        # Pair the shorts of each run: the second of each pair ends a 1
+        run_start = np.maximum.accumulate(np.where(~short, index, -1))
+        second = short & ((index - run_start) % 2 == 0)
+        emit = long | invalid | second
+        at = np.flatnonzero(emit)
+        bits = np.where(long[at], 0, np.where(invalid[at], INVALID_BIT, 1)).astype(np.int8)
+        # A 1 started one edge earlier than its second half
+        starts = edges[np.where(second[at], at - 1, at)]
+
+        self._retune(intervals[:end], short, long)
+        return bits, starts
+
+    def _retune(self, intervals, short, long):
+        # Follow slow speed changes: average whole-bit length of this block's intervals
+        total = intervals[long].sum() + intervals[short].sum()
+        count = long.sum() + short.sum() / 2
+        if count >= 100:
+            self.bit_period = float(total / count)
+
+    def _find_frames(self, new_bits, new_starts):
+        carried = len(self._bits)
+        bits = np.concatenate((self._bits, new_bits))
+        starts = np.concatenate((self._bit_starts, new_starts))
+        # Keep the bits a sync word in the next block could still need
+        self._bits = bits[-(BITS_PER_FRAME - 1):]
+        self._bit_starts = starts[-(BITS_PER_FRAME - 1):]
+        if len(bits) < BITS_PER_FRAME:
+            return None
+
+        windows = np.lib.stride_tricks.sliding_window_view(bits, len(SYNC_BITS))
+        sync_end = np.flatnonzero((windows == self._sync).all(axis=1)) + len(SYNC_BITS) - 1
+        # Windows inside the carried bits were already searched last block
+        sync_end = sync_end[(sync_end >= carried) & (sync_end >= BITS_PER_FRAME - 1)]
+        self.syncs += len(sync_end)
+        if not len(sync_end):
+            return None
+
+        first_bit = sync_end - (BITS_PER_FRAME - 1)
+        data = bits[first_bit[:, None] + np.arange(64)]
+        clean = (data != INVALID_BIT).all(axis=1)
+        self.rejected += int((~clean).sum())
+        data, first_bit = data[clean], first_bit[clean]
+        if not len(data):
+            return None
+        words = np.packbits(data.astype(np.uint8), axis=1, bitorder="little").view("<u8").ravel()
+        sample = starts[first_bit]
+
+        rate = self.rate
+        if rate is None:
+            # Keep the frames until there are enough sync words to tell the rate
+            words = self._pending_words = np.concatenate((self._pending_words, words))
+            sample = self._pending_samples = np.concatenate((self._pending_samples, sample))
+            rate = self._detect_rate(words, sample)
+            if rate is None:
+                return None
+            self._pending_words = np.zeros(0, dtype=np.uint64)
+            self._pending_samples = np.zeros(0)
+        fields = decode_ltc_words(words, fps=rate.nominal)
+        valid = fields["valid"]
+        self.rejected += int((~valid).sum())
+        result = {name: value[valid] for name, value in fields.items()}
+        result["sample"] = sample[valid]
+        result["word"] = words[valid]
+        result["count"] = hmsf_to_frames_array(result["hours"], result["minutes"], result["seconds"],
+                                               result["frames"], rate)
+        result["rate"] = rate
+        self.frames += len(words[valid])
+        self._count_discontinuities(result["count"], rate)
+        return result
+
+    def _detect_rate(self, words, sample):
+        if len(sample) < MIN_DETECT_SYNCS:
+            return None
+        fps = self.sample_rate / float(np.median(np.diff(sample)))
+        nominal = min(_NOMINAL_RATES, key=lambda n: abs(n - fps))
+        if nominal == 30:
+            drop_frame = np.count_nonzero((words >> np.uint64(10)) & np.uint64(1)) * 2 > len(words)
+            if drop_frame:
+                self.rate = FrameRate.FPS_2997_DF
+            else:
+                # 29.97 and 30 differ by 0.1%: tell them apart by the frame spacing
+                self.rate = FrameRate.FPS_2997_NDF if fps < 29.985 else FrameRate.FPS_30
+        else:
+            self.rate = _NOMINAL_RATES[nominal]
+        return self.rate
+
+    def _count_discontinuities(self, count, rate):
+        if not len(count):
+            return
+        previous = np.concatenate(([count[0] - 1 if self._last_count is None else self._last_count], count[:-1]))
+        self.discontinuities += int(np.count_nonzero((count - previous) % rate.frames_per_day != 1))
+        self._last_count = int(count[-1])
+
+    def stats(self):
+        return {
+            "rate": str(self.rate) if self.rate else None,
+            "bit_period": round(self.bit_period, 4) if self.bit_period else None,
+            "samples": self.samples,
+            "edges": self.edges,
+            "bits": self.bits,
+            "invalid_intervals": self.invalid_intervals,
+            "syncs": self.syncs,
+            "frames": self.frames,
+            "rejected": self.rejected,
+            "discontinuities": self.discontinuities,
+        }
+
+
+class LTCAudioGenerator:
+    """Biphase-mark LTC audio for a run of timecode, built a block of frames at a time."""
+
+    def __init__(self, rate, sample_rate=48000, level=0.5, rise_time_us=RISE_TIME_US, jitter_ns=0,
+                 dropout_rate=0.0, seed=None):
+        _require_numpy("LTCAudioGenerator")
+        self.rate = rate
+        self.sample_rate = sample_rate
+        self.level = level
+        self.jitter_ns = jitter_ns
+        self.dropout_rate = dropout_rate
+        self._rng = np.random.default_rng(seed)
+        # Samples per bit, exactly: sample_rate / (80 * numerator / denominator)
+        self.bit_period = sample_rate * rate.denominator / (rate.numerator * BITS_PER_FRAME)
+        # A box filter of width w rises from 10% to 90% in 0.8 w
+        width = int(round(rise_time_us * 1e-6 * sample_rate / 0.8))
+        self._kernel = np.full(width, 1 / width, dtype=np.float32) if width > 1 else None
+        self._sync = np.array(SYNC_BITS, dtype=np.uint8)
+        self._polarity_bit = POLARITY_BIT_25 if rate.nominal == 25 else POLARITY_BIT
+
+        self.frames = 0
+        self.dropped = 0
+        self.samples = 0
+
+    def _frame_bits(self, counts):
+        hours, minutes, seconds, frames = frames_to_hmsf_array(counts, self.rate)
+        words = encode_ltc_words(hours, minutes, seconds, frames, drop_frame=self.rate.drop_frame)
+        bits = np.unpackbits(words.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+        # Polarity bit: make the number of 1s in each 80-bit frame even, so every frame starts on the same level
+        odd = (bits.sum(axis=1) + self._sync.sum()) % 2 == 1
+        bits[:, self._polarity_bit] ^= odd.astype(np.uint8)
+        return np.concatenate((bits, np.broadcast_to(self._sync, (len(bits), len(SYNC_BITS)))), axis=1)
+
+    def blocks(self, start, count, frames_per_block=GENERATOR_BLOCK_FRAMES):
+        """Yield float32 sample blocks for count frames starting at Timecode start."""
+        period = self.bit_period
+        sample_rate = self.sample_rate
+        jitter = self.jitter_ns * 1e-9 * sample_rate
+        level = -1.0           # level before the next transition
+        base = -1.0            # value of the last sample written
+        spill = np.zeros(0)    # step contributions that fall after the current block
+        tail = np.zeros(0, dtype=np.float32)
+        emitted = 0
+
+        for first in range(0, count, frames_per_block):
+            n = min(frames_per_block, count - first)
+            bits = self._frame_bits(start.frames + first + np.arange(n))
+            bit_index = (first * BITS_PER_FRAME + np.arange(n * BITS_PER_FRAME)).reshape(n, BITS_PER_FRAME)
+
+            # Every bit starts with a transition; 1s have a second one half way
+            times = np.concatenate((bit_index.ravel() * period,
+                                    (bit_index[bits == 1] + 0.5) * period))
+            if jitter:
+                times += self._rng.normal(0, jitter, len(times))
+            times.sort()
+
+            # Samples up to the start of the next block's first frame
+            end = int((first + n) * BITS_PER_FRAME * period) if first + n < count else int(
+                np.ceil(count * BITS_PER_FRAME * period))
+            size = end - emitted
+            # Each transition is a step of 2; the sample it lands in gets the fraction of the
+            # step after the transition, so edges keep their sub-sample timing
+            offset = np.maximum(times - emitted, 0)
+            index = offset.astype(np.int64)
+            fraction = offset - index
+            sign = np.where(np.arange(len(times)) % 2 == 0, 2.0, -2.0) * (-level)
+            steps = np.bincount(index, sign * (1 - fraction), size + 2) + np.bincount(index + 1, sign * fraction,
+                                                                                        size + 2)
+            steps[:len(spill)] += spill
+            spill = steps[size:]
+            if len(times) % 2:
+                level = -level
+            square = (np.cumsum(steps[:size]) + base).astype(np.float32)
+            if size:
+                base = float(square[-1])
+
+            if self.dropout_rate:
+                drop = self._rng.random(n) < self.dropout_rate
+                if drop.any():
+                    self.dropped += int(drop.sum())
+                    frame_start = ((first + np.arange(n + 1)) * BITS_PER_FRAME * period - emitted).astype(np.int64)
+                    mask = np.repeat(~drop, np.diff(np.clip(frame_start, 0, size)))
+                    square[:len(mask)] *= mask
+
+            if self._kernel is not None:
+                # Finite rise time; the filter runs on across block boundaries
+                padded = np.concatenate((tail, square)) if len(tail) else np.concatenate(
+                    (np.full(len(self._kernel) - 1, square[0], dtype=np.float32), square))
+                tail = padded[len(padded) - len(self._kernel) + 1:]
+                square = np.convolve(padded, self._kernel, mode="valid").astype(np.float32)
+
+            emitted = end
+            self.frames += n
+            self.samples += size
+            yield square * np.float32(self.level)
+
+    def write_wav(self, path, start, count, sample_width=2, frames_per_block=GENERATOR_BLOCK_FRAMES):
+        """Write count frames from Timecode start to a mono PCM WAV file."""
+        scale = 2 ** (8 * sample_width - 1) - 1
+        with wave.open(path, "wb") as out:
+            out.setnchannels(1)
+            out.setsampwidth(sample_width)
+            out.setframerate(self.sample_rate)
+            for block in self.blocks(start, count, frames_per_block):
+                value = np.round(np.clip(block, -1, 1) * scale).astype("<i4")
+                if sample_width == 2:
+                    data = value.astype("<i2").tobytes()
+                elif sample_width == 3:
+                    data = value.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+                else:
+                    data = value.tobytes()
+                out.writeframes(data)
+
+    def stats(self):
+        return {
+            "rate": str(self.rate),
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "samples": self.samples,
+        }
+
+
+def decode_wav(path, channel=0, rate=None, block_frames=BLOCK_FRAMES, decoder=None):
+    """Yield one result dict per block of the WAV file that contained frames."""
+    with WavReader(path) as wav:
+        if decoder is None:
+            decoder = LTCAudioDecoder(wav.sample_rate, rate)
+        for start, samples in wav.blocks(channel, block_frames):
+            result = decoder.feed(samples, start)
+            if result is not None:
+                yield result
+
+
+def read_wav_timecodes(path, channel=0, rate=None):
+    """All frames of a WAV file as (sample positions, frame counts, FrameRate)."""
+    samples, counts, found = [], [], rate
+    for block in decode_wav(path, channel, rate):
+        samples.append(block["sample"])
+        counts.append(block["count"])
+        found = block["rate"]
+    if not samples:
+        return np.zeros(0), np.zeros(0, dtype=np.int64), found
+    return np.concatenate(samples), np.concatenate(counts), found
+
+
+def benchmark_decode(path, channel=0):
+    from timecode import format_timecodes
+
+    with WavReader(path) as wav:
+        duration = wav.frames / wav.sample_rate
+        decoder = LTCAudioDecoder(wav.sample_rate)
+    start = time.perf_counter()
+    first = last = None
+    for block in decode_wav(path, channel, decoder=decoder):
+        first = first or (block["sample"][0], block["count"][0], block["rate"])
+        last = (block["sample"][-1], block["count"][-1], block["rate"])
+    elapsed = time.perf_counter() - start
+    print(f"Decoded {duration:,.1f} s of audio in {elapsed:.2f} s ({duration / elapsed:,.0f}x real time)")
+    for label, frame in (("First", first), ("Last", last)):
+        if frame:
+            print(f"{label}: {format_timecodes([frame[1]], frame[2])[0]} at sample {frame[0]:.1f}")
+    print(decoder.stats())
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import tempfile
+
+    from timecode import Timecode
+
+    parser = argparse.ArgumentParser(description="Decode or generate LTC audio")
+    parser.add_argument("path", nargs="?", help="WAV file to decode (or to write with --generate)")
+    parser.add_argument("channel", nargs="?", type=int, default=0, help="channel to decode")
+    parser.add_argument("--generate", action="store_true", help="write LTC to path instead of decoding it")
+    parser.add_argument("--start", default="10:00:00:00", help="first timecode")
+    parser.add_argument("--seconds", type=float, default=3600, help="length to generate")
+    parser.add_argument("--fps", type=float, default=25, help="24, 25, 29.97 or 30")
+    parser.add_argument("--drop-frame", action="store_true", help="29.97 drop frame")
+    parser.add_argument("--sample-rate", type=int, default=48000)
+    parser.add_argument("--level", type=float, default=0.5, help="peak level (full scale = 1)")
+    parser.add_argument("--rise-time", type=float, default=RISE_TIME_US, help="10-90%% rise time in µs")
+    parser.add_argument("--jitter", type=float, default=0, help="edge jitter (standard deviation) in ns")
+    parser.add_argument("--dropouts", type=float, default=0, help="fraction of frames replaced by silence")
+    args = parser.parse_args()
+
+    if args.path and not args.generate:
+        benchmark_decode(args.path, args.channel)
+    else:
+        # Generate (to path, or to a temporary file that is then decoded as a benchmark)
+        rate = FrameRate.from_fps(args.fps, args.drop_frame)
+        generator = LTCAudioGenerator(rate, args.sample_rate, args.level, args.rise_time, args.jitter, args.dropouts)
+        path = args.path or os.path.join(tempfile.gettempdir(), "ltc_benchmark.wav")
+        count = int(args.seconds * rate.fps)
+        start = time.perf_counter()
+        generator.write_wav(path, Timecode.parse(args.start, rate), count)
+        elapsed = time.perf_counter() - start
+        print(f"Generated {count / rate.fps:,.1f} s of {rate} fps LTC to {path} in {elapsed:.2f} s "
+              f"({count / rate.fps / elapsed:,.0f}x real time), {generator.dropped} frames dropped")
+        if not args.path:
+            benchmark_decode(path)
+            os.unlink(path)
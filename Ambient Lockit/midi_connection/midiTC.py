@@ -1,28 +1,47 @@
-import mido
+import os
+import sys
+import threading
+
+# Shared timecode modules live in the Ambient Lockit folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from timecode import FrameRate
+from tc_recorder import TimecodeRecorder, SOURCE_MTC, SOURCE_MTC_FULL_FRAME
+from mtc_decoder import MTCDecoder
+from midi_ingest import MidiIngest
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import TC_RECORD_DIR
 
 """
 This script reads MIDI messages from an input port and converts quarter frame messages to SMPTE timecode.
 Modules:
     mido: A library for working with MIDI messages and ports.
+    mtc_decoder: Assembles quarter frames and full-frame SysEx into latency-compensated timecode.
 Variables:
     timecode (dict): A dictionary to store the current SMPTE timecode values.
-    frame_rates (dict): A dictionary mapping frame type values to their corresponding frame rates.
+    frame_rates (dict): Maps the MTC rate bits to a FrameRate (2 is 29.97 drop-frame).
+    decoder (MTCDecoder): Quarter-frame state machine (dropouts, direction, full-frame locates).
 Functions:
     change_to_SMPTE(msg):
-        Converts a MIDI quarter frame message to SMPTE timecode and updates the global timecode dictionary.
+        Feeds a MIDI message to the decoder and updates the global timecode dictionary.
         Args:
             msg (mido.Message): The MIDI message to be converted.
         Returns:
-            None
-    display_timecode():
-        Prints the current SMPTE timecode in HH:MM:SS:FF format along with the frame rate.
+            MTCReading or None
+    display_timecode(reading):
+        Prints the current SMPTE timecode in HH:MM:SS:FF format along with the frame rate,
+        once per frame.
         Args:
-            None
+            reading (MTCReading): Output of the decoder.
         Returns:
             None
+    handle_batch(batch):
+        Decodes a batch of (captured_ns, message) pairs delivered by MidiIngest.
 Usage:
-    The script opens a MIDI input port named 'Ambient Device 0' and processes incoming messages.
-    For each message, it prints the message and converts quarter frame messages to SMPTE timecode.
+    The script opens the first MIDI input matching MIDI_INPUT_PATTERN (e.g. 'Ambient Device 0')
+    in callback mode. Messages are queued by the MIDI thread and decoded in batches, and the
+    timecode is printed every frame.
 """
 
 timecode = {
@@ -33,53 +52,47 @@ timecode = {
     'fps': 0
 }
 
-frame_rates = {
-    0: 24,
-    1: 25,
-    2: 29.97,
-    3: 30,
-}
+frame_rates = {code: FrameRate.from_mtc(code) for code in range(4)}
+
+decoder = MTCDecoder()
+
+# Binary log of every decoded frame (see tc_recorder.py), if TC_RECORD_DIR is set
+recorder = TimecodeRecorder(TC_RECORD_DIR, prefix="mtc") if TC_RECORD_DIR else None
+
+last_displayed = None
+
 
+def change_to_SMPTE(msg, captured_ns=None):
+    reading = decoder.feed(msg, captured_ns)
+    if reading is None:
+        return None
+    tc = reading.timecode
+    timecode['hours'], timecode['minutes'], timecode['seconds'], timecode['frames'] = tc.hmsf()
+    timecode['fps'] = tc.rate.mtc_code
+    display_timecode(reading)
+    return reading
 
-def change_to_SMPTE(msg):
-    if msg.type == "quarter_frame":
-        frame_type = msg.frame_type
-        frame_value = msg.frame_value
-        
-        if frame_type == 0:
-            timecode['frames'] = (timecode['frames'] & 0xF0) | frame_value
-            
-        elif frame_type == 1:
-            timecode['frames'] = (timecode['frames'] & 0x0F) | (frame_value << 4)
-            
-        elif frame_type == 2:
-            timecode['seconds'] = (timecode['seconds'] & 0xF0) | frame_value
-            
-        elif frame_type == 3:
-            timecode['seconds'] = (timecode['seconds'] & 0x0F) | (frame_value << 4)
-            
-        elif frame_type == 4:
-            timecode['minutes'] = (timecode['minutes'] & 0xF0) | frame_value
-            
-        elif frame_type == 5:
-            timecode['minutes'] = (timecode['minutes'] & 0x0F) | (frame_value << 4)
-            
-        elif frame_type == 6:
-            timecode['hours'] = (timecode['hours'] & 0xF0) | frame_value
-            
-        elif frame_type == 7:
-            timecode['hours'] = (timecode['hours'] & 0x0F) | ((frame_value & 0x01) << 4)
-            timecode['fps'] = (frame_value >> 1) & 0x03
-            
-        display_timecode(msg)
+def display_timecode(reading):
+    global last_displayed
+    tc = reading.timecode
+    # Readings arrive 4 times per frame; show and record each frame once
+    if tc == last_displayed and not reading.full_frame:
+        return
+    last_displayed = tc
+    if recorder is not None:
+        recorder.append_timecode(tc, SOURCE_MTC_FULL_FRAME if reading.full_frame else SOURCE_MTC,
+                                 reading.captured_ns)
+    direction = "" if reading.direction > 0 else " (reverse)"
+    print(f"Timecode in HH:MM:SS:FF format: {tc} @ {tc.rate} fps{direction}")
+    print("\n")
 
-def display_timecode(msg):
-    frame_rate = frame_rates.get(timecode['fps'], 'Unknown')
-    frame_type = msg.frame_type
-    if frame_type == 7:
-        print(f"Timecode in HH:MM:SS:FF format: {timecode['hours']:02}:{timecode['minutes']:02}:{timecode['seconds']:02}:{timecode['frames']:02} @ {frame_rate} fps")
-        print("\n")
+def handle_batch(batch):
+    for captured_ns, message in batch:
+        change_to_SMPTE(message, captured_ns)
 
-with mido.open_input('Ambient Device 0') as port:
-    for message in port:
-        change_to_SMPTE(message)
\ No newline at end of file
+with MidiIngest(handle_batch) as ingest:
+    print(f"Listening for MIDI timecode on {ingest.port_name}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
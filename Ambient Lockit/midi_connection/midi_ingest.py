@@ -0,0 +1,295 @@
+"""
+Non-blocking MIDI input with batched delivery.
+
+midiTC.py iterated "for message in port" on a port opened by its exact name
+and printed every message. At 30 fps that is 120 quarter frames a second, each
+waiting on console I/O. MidiIngest opens the port in callback mode instead:
+
+- The backend's callback only stamps the message with time.monotonic_ns() and
+  appends it to a deque. deque.append/popleft are atomic in CPython, so the
+  MIDI thread never takes a lock and never waits for the consumer.
+- One consumer thread drains everything that has arrived and calls
+  handler(batch) with a list of (captured_ns, message). The MTC decoder,
+  printing and logging all run there, off the MIDI thread.
+- The port is found by a regular expression (MIDI_INPUT_PATTERN) matched
+  against the input names, so "Ambient Device 0" and "Ambient Device 0 20:0"
+  both work.
+
+ReplayPort behaves like a mido input port but plays back a recording, either in
+real time or as fast as possible, for benchmarks without hardware. A recording
+is a text file with one "<seconds> <hex bytes>" line per message; make one with
+--record.
+
+Usage:
+    ingest = MidiIngest(handler=lambda batch: print(len(batch))).start()
+
+    python midi_ingest.py --list
+    python midi_ingest.py --record mtc.txt --seconds 30
+    python midi_ingest.py --replay mtc.txt           # benchmark; synthetic MTC without a file
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+import mido
+
+# Shared timecode modules live in the Ambient Lockit folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from timecode import FrameRate, Timecode
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import MIDI_INPUT_PATTERN
+
+# Longest the consumer sleeps before looking at the queue again
+IDLE_WAIT = 0.005
+
+
+def find_input_port(pattern=MIDI_INPUT_PATTERN, names=None):
+    """First MIDI input whose name matches pattern (case-insensitive regex)."""
+    if names is None:
+        names = mido.get_input_names()
+    regex = re.compile(pattern, re.IGNORECASE)
+    for name in names:
+        if regex.search(name):
+            return name
+    raise IOError(f"No MIDI input matching {pattern!r} (found: {', '.join(names) or 'none'})")
+
+
+class MidiIngest:
+    """Callback-driven MIDI input that hands batches of messages to one consumer thread."""
+
+    def __init__(self, handler, pattern=MIDI_INPUT_PATTERN, port=None):
+        self.handler = handler
+        self.pattern = pattern
+        self.port = port
+        self.port_name = getattr(port, "name", None)
+        self._queue = deque()
+        self._wakeup = threading.Event()
+        self._waiting = False
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.received = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.handler_errors = 0
+
+    def start(self):
+        if self.port is None:
+            self.port_name = find_input_port(self.pattern)
+            self.port = mido.open_input(self.port_name, callback=self._on_message)
+        else:
+            self.port.callback = self._on_message
+        self._thread = threading.Thread(target=self._run, name="midi-ingest", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.port is not None:
+            self.port.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _on_message(self, message):
+        # Runs on the MIDI backend's thread: stamp, queue, and only wake the consumer if it sleeps
+        self._queue.append((time.monotonic_ns(), message))
+        if self._waiting:
+            self._wakeup.set()
+
+    def _run(self):
+        queue = self._queue
+        while not self._stop.is_set():
+            if not queue:
+                self._waiting = True
+                # Re-check after announcing: a message may have arrived in between
+                if not queue:
+                    self._wakeup.wait(IDLE_WAIT)
+                self._waiting = False
+                self._wakeup.clear()
+                continue
+            batch = []
+            while queue:
+                batch.append(queue.popleft())
+            self.received += len(batch)
+            self.batches += 1
+            self.max_batch = max(self.max_batch, len(batch))
+            try:
+                self.handler(batch)
+            except Exception as e:
+                self.handler_errors += 1
+                print(f"Error in MIDI handler: {e}")
+
+    def stats(self):
+        return {
+            "port": self.port_name,
+            "received": self.received,
+            "batches": self.batches,
+            "avg_batch": round(self.received / self.batches, 2) if self.batches else 0,
+            "max_batch": self.max_batch,
+            "queued": len(self._queue),
+            "handler_errors": self.handler_errors,
+        }
+
+
+def decoder_handler(decoder, on_reading):
+    """Handler that feeds a batch to an MTCDecoder and calls on_reading(reading) for each result."""
+    def handle(batch):
+        for captured_ns, message in batch:
+            reading = decoder.feed(message, captured_ns)
+            if reading is not None:
+                on_reading(reading)
+    return handle
+
+
+class ReplayPort:
+    """Stand-in for a mido input port that replays (seconds, message) pairs."""
+
+    def __init__(self, events, speed=1.0, loop=False, name="replay"):
+        self.events = list(events)
+        self.speed = speed
+        self.loop = loop
+        self.name = name
+        self.closed = False
+        self.done = threading.Event()
+        self._callback = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def callback(self):
+        return self._callback
+
+    @callback.setter
+    def callback(self, callback):
+        # Start playing when a callback is installed, like a live port
+        self._callback = callback
+        if callback is not None and self._thread is None:
+            self._thread = threading.Thread(target=self._play, name=f"{self.name}-replay", daemon=True)
+            self._thread.start()
+
+    def _play(self):
+        while True:
+            start = time.monotonic()
+            for seconds, message in self.events:
+                if self._stop.is_set():
+                    return
+                if self.speed:
+                    delay = start + seconds / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                self._callback(message)
+            if not self.loop:
+                self.done.set()
+                return
+
+    def __iter__(self):
+        for _, message in self.events:
+            yield message
+
+    def close(self):
+        self._stop.set()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def load_recording(path):
+    """[(seconds, mido.Message)] from a "<seconds> <hex bytes>" text recording."""
+    events = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            seconds, hex_bytes = line.split(None, 1)
+            events.append((float(seconds), mido.Message.from_bytes(bytes.fromhex(hex_bytes))))
+    return events
+
+
+def record_port(path, seconds, pattern=MIDI_INPUT_PATTERN):
+    """Record seconds of MIDI input to path for ReplayPort."""
+    name = find_input_port(pattern)
+    lines = []
+    start = time.monotonic()
+    with mido.open_input(name) as port:
+        while time.monotonic() - start < seconds:
+            for message in port.iter_pending():
+                lines.append(f"{time.monotonic() - start:.6f} {message.hex()}\n")
+            time.sleep(0.0005)
+    with open(path, "w") as f:
+        f.write(f"# {name}\n")
+        f.writelines(lines)
+    print(f"Recorded {len(lines)} messages from {name} to {path}")
+
+
+def synthetic_mtc(start, frames, rate=FrameRate.FPS_30):
+    """[(seconds, message)] of forward quarter frames for frames frames starting at Timecode start."""
+    events = []
+    quarter = rate.denominator / rate.numerator / 4
+    for n in range(0, frames, 2):
+        hours, minutes, seconds, frame = (start + n).hmsf()
+        pieces = (frame & 0x0F, frame >> 4, seconds & 0x0F, seconds >> 4,
+                  minutes & 0x0F, minutes >> 4, hours & 0x0F, hours >> 4 | rate.mtc_code << 1)
+        for piece, value in enumerate(pieces):
+            events.append(((n * 4 + piece) * quarter,
+                           mido.Message("quarter_frame", frame_type=piece, frame_value=value)))
+    return events
+
+
+def benchmark(events, speed=0):
+    from mtc_decoder import MTCDecoder
+
+    decoder = MTCDecoder()
+    readings = []
+    port = ReplayPort(events, speed=speed)
+    start = time.perf_counter()
+    with MidiIngest(decoder_handler(decoder, readings.append), port=port) as ingest:
+        port.done.wait()
+        while ingest.stats()["queued"] or ingest.received < len(events):
+            time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    print(f"{len(events):,} messages in {elapsed:.3f} s ({len(events) / elapsed:,.0f} messages/s)")
+    print(f"Ingest: {ingest.stats()}")
+    print(f"Decoder: {decoder.stats()}, last {readings[-1].timecode if readings else None}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MIDI ingestion tools")
+    parser.add_argument("--list", action="store_true", help="list MIDI inputs")
+    parser.add_argument("--record", metavar="PATH", help="record the matching MIDI input")
+    parser.add_argument("--seconds", type=float, default=10, help="seconds to record")
+    parser.add_argument("--replay", metavar="PATH", nargs="?", const="", help="benchmark with a recording")
+    parser.add_argument("--speed", type=float, default=0, help="replay speed (0 = as fast as possible)")
+    args = parser.parse_args()
+
+    if args.list:
+        for name in mido.get_input_names():
+            print(name)
+    elif args.record:
+        record_port(args.record, args.seconds)
+    else:
+        if args.replay:
+            events = load_recording(args.replay)
+        else:
+            events = synthetic_mtc(Timecode.parse("10:00:00:00", FrameRate.FPS_30), 30 * 600)
+        benchmark(events, args.speed)
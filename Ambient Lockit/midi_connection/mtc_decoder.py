@@ -0,0 +1,235 @@
+"""
+MIDI timecode (MTC) decoder state machine.
+
+change_to_SMPTE in midiTC.py ORs every quarter frame into a global dict and
+prints on piece 7. It never checks that the pieces belong together, ignores
+full-frame SysEx locates and reverse play, and reports a timecode that is
+already two frames old. MTCDecoder keeps the same information in a small
+state machine:
+
+- The 8 quarter-frame pieces (frames LSN/MSN, seconds, minutes, hours + rate)
+  are collected with a bit mask. A timecode is only accepted when all 8 came
+  in order. A piece that does not follow the previous one is a dropout: the
+  last timecode is dropped and assembly restarts, and so does a gap longer
+  than timeout_ns (transport stopped).
+- Direction is taken from the piece order (0..7 forward, 7..0 in reverse).
+- A complete timecode describes the frame in which its first piece was sent,
+  so by the time it is assembled the sender is 7 quarter frames further on. The
+  decoder adds that offset, and for each piece of the next sequence the
+  offset that piece number stands for (2 frames + 1/4 frame per piece).
+  Latency_ns (MIDI interface and driver delay) is added on top. So every
+  quarter frame gives a frame-accurate position, 4 times per frame.
+- Consecutive timecodes must be 2 frames apart; anything else is counted as a
+  discontinuity (e.g. a locate while playing).
+- Full-frame SysEx (F0 7F <device> 01 01 hh mm ss ff F7) sets the position
+  immediately, as sent by a sequencer when it locates.
+
+Usage:
+    decoder = MTCDecoder(latency_ns=1_000_000)
+    for message in port:
+        reading = decoder.feed(message)
+        if reading:
+            print(reading.timecode, reading.direction)
+            clock.update(reading.position_ns, reading.captured_ns)   # tc_clock.py
+"""
+
+import os
+import sys
+import time
+from collections import namedtuple
+
+# Shared timecode modules live in the Ambient Lockit folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from timecode import NS_PER_SECOND, FrameRate, Timecode, hmsf_to_frames
+
+FORWARD = 1
+REVERSE = -1
+
+# A gap this long between quarter frames means the transport stopped
+DROPOUT_TIMEOUT_NS = 100_000_000
+
+# Quarter frames the sender has moved on by when a forward timecode completes
+FORWARD_COMPLETE_QUARTERS = 7
+# In reverse the last piece (0) arrives 1/4 frame after the encoded frame started
+REVERSE_COMPLETE_QUARTERS = 1
+
+ALL_PIECES = 0xFF
+
+MTCReading = namedtuple(
+    "MTCReading", ["timecode", "position_ns", "captured_ns", "direction", "full_frame"],
+)
+
+
+def parse_full_frame(data):
+    """
+    (hours, minutes, seconds, frames, rate_code) from a full-frame SysEx
+    message, or None if data is some other SysEx. data may include the F0/F7
+    bytes or not (mido leaves them out).
+    """
+    data = list(data)
+    if data and data[0] == 0xF0:
+        data = data[1:]
+    if data and data[-1] == 0xF7:
+        data = data[:-1]
+    if len(data) != 8 or data[0] != 0x7F or data[2] != 0x01 or data[3] != 0x01:
+        return None
+    hours_byte, minutes, seconds, frames = data[4:8]
+    return hours_byte & 0x1F, minutes, seconds, frames, (hours_byte >> 5) & 0x03
+
+
+class MTCDecoder:
+    """Assembles MTC quarter frames and full frames into latency-compensated readings."""
+
+    def __init__(self, latency_ns=0, timeout_ns=DROPOUT_TIMEOUT_NS, clock=time.monotonic_ns):
+        self.latency_ns = latency_ns
+        self.timeout_ns = timeout_ns
+        self._clock = clock
+
+        self._pieces = bytearray(8)
+        self._mask = 0
+        self._last_piece = None
+        self._last_time = None
+        self.direction = FORWARD
+        # Last complete timecode; cleared when a piece after it goes missing
+        self.base = None
+
+        self.quarter_frames = 0
+        self.frames = 0
+        self.full_frames = 0
+        self.dropouts = 0
+        self.direction_changes = 0
+        self.discontinuities = 0
+        self.invalid = 0
+
+    @property
+    def locked(self):
+        return self.base is not None
+
+    def reset(self):
+        self._mask = 0
+        self._last_piece = None
+        self.base = None
+
+    def feed(self, msg, captured_ns=None):
+        """Decode a mido message (quarter_frame or sysex); returns an MTCReading or None."""
+        if msg.type == "quarter_frame":
+            return self.quarter_frame(msg.frame_type, msg.frame_value, captured_ns)
+        if msg.type == "sysex":
+            return self.sysex(msg.data, captured_ns)
+        return None
+
+    def quarter_frame(self, piece, value, captured_ns=None):
+        t = self._clock() if captured_ns is None else captured_ns
+        self.quarter_frames += 1
+        if self._last_time is not None and t - self._last_time > self.timeout_ns:
+            # Transport stopped (or the cable was pulled); start again
+            if self.base is not None or self._mask:
+                self.dropouts += 1
+            self.reset()
+        self._last_time = t
+
+        last = self._last_piece
+        if last is not None:
+            if piece == (last + 1) & 7:
+                direction = FORWARD
+            elif piece == (last - 1) & 7:
+                direction = REVERSE
+            else:
+                direction = None
+            if direction is None:
+                self.dropouts += 1
+                self._mask = 0
+                # Pieces of the next sequence no longer tell how far on from the base they are
+                self.base = None
+            elif direction != self.direction:
+                if self.base is not None:
+                    self.direction_changes += 1
+                self.direction = direction
+                self._mask = 0
+                # The position is no longer moving the way the base assumes
+                self.base = None
+        self._last_piece = piece
+
+        # First piece of a sequence in the current direction
+        if piece == (0 if self.direction == FORWARD else 7):
+            self._mask = 0
+        self._pieces[piece] = value & 0x0F
+        self._mask |= 1 << piece
+
+        if piece == (7 if self.direction == FORWARD else 0):
+            if self._mask == ALL_PIECES:
+                self._complete()
+            self._mask = 0
+
+        if self.base is None:
+            return None
+        # Either the piece that just completed the base, or one of the sequence after it
+        if self.direction == FORWARD:
+            quarters = FORWARD_COMPLETE_QUARTERS if piece == 7 else 8 + piece
+        else:
+            quarters = REVERSE_COMPLETE_QUARTERS if piece == 0 else piece - 7
+        return self._reading(self.base, quarters, t, False)
+
+    def _complete(self):
+        p = self._pieces
+        frames = p[0] | (p[1] & 0x01) << 4
+        seconds = p[2] | (p[3] & 0x03) << 4
+        minutes = p[4] | (p[5] & 0x03) << 4
+        hours = p[6] | (p[7] & 0x01) << 4
+        rate = FrameRate.from_mtc(p[7] >> 1)
+        try:
+            tc = Timecode(hmsf_to_frames(hours, minutes, seconds, frames, rate), rate)
+        except ValueError:
+            self.invalid += 1
+            self.base = None
+            return
+        base = self.base
+        if base is not None:
+            step = (tc.frames - base.frames) % rate.frames_per_day
+            if base.rate is not rate or step != (2 * self.direction) % rate.frames_per_day:
+                self.discontinuities += 1
+        self.base = tc
+        self.frames += 1
+
+    def full_frame(self, hours, minutes, seconds, frames, rate_code, captured_ns=None):
+        """Locate to a full-frame timecode. Quarter frames re-lock from here."""
+        t = self._clock() if captured_ns is None else captured_ns
+        rate = FrameRate.from_mtc(rate_code)
+        try:
+            tc = Timecode.from_hmsf(hours, minutes, seconds, frames, rate)
+        except ValueError:
+            self.invalid += 1
+            return None
+        self.full_frames += 1
+        self.reset()
+        # A locate means the transport is parked on this frame; no latency to add
+        return MTCReading(tc, tc.nanoseconds(), t, self.direction, True)
+
+    def sysex(self, data, captured_ns=None):
+        fields = parse_full_frame(data)
+        if fields is None:
+            return None
+        return self.full_frame(*fields, captured_ns=captured_ns)
+
+    def _reading(self, base, quarters, captured_ns, full_frame):
+        rate = base.rate
+        # Exact position of base + quarters/4 frames, in ns
+        position = (base.frames * 4 + quarters) * rate.denominator * NS_PER_SECOND // (4 * rate.numerator)
+        position += self.latency_ns * self.direction
+        day_ns = rate.frames_per_day * rate.denominator * NS_PER_SECOND // rate.numerator
+        position %= day_ns
+        return MTCReading(Timecode.from_nanoseconds(position, rate), position, captured_ns, self.direction,
+                          full_frame)
+
+    def stats(self):
+        return {
+            "locked": self.locked,
+            "direction": "forward" if self.direction == FORWARD else "reverse",
+            "quarter_frames": self.quarter_frames,
+            "frames": self.frames,
+            "full_frames": self.full_frames,
+            "dropouts": self.dropouts,
+            "direction_changes": self.direction_changes,
+            "discontinuities": self.discontinuities,
+            "invalid": self.invalid,
+        }
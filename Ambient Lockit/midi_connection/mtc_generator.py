@@ -0,0 +1,238 @@
+"""
+MIDI timecode (MTC) output driven by the Lockit's timecode.
+
+midiTC.py only reads MTC. MTCGenerator re-emits the timecode of a clock, such as
+TimecodeClock (tc_clock.py) or the shared-memory TimecodeReader (tc_shm.py),
+as MTC for legacy gear:
+
+- Each 2-frame cycle is 8 quarter-frame messages. They encode the frame
+  whose start the first one is sent at, and go out 1/4 frame apart. The 8
+  messages of the next cycle are built while waiting for its first deadline, so
+  sending is just port.send().
+- Deadlines come from the clock: at the start of each cycle the clock is read
+  once, and piece k is due when the timecode reaches frame + k/4. The thread
+  sleeps until SPIN_NS before a deadline and busy-waits the rest with
+  time.monotonic_ns(), which keeps sends well inside a millisecond.
+- When the clock jumps (a locate, or the first cycle) a full-frame SysEx for
+  the cycle's first frame goes out as that frame starts, just before its first
+  quarter frame, so receivers locate at once instead of waiting for 8 pieces.
+- Send jitter (how late each message went out) is kept for the last
+  JITTER_WINDOW messages and reported by stats().
+
+Usage:
+    generator = MTCGenerator(clock, open_output_port()).start()
+    print(generator.stats())
+
+    python mtc_generator.py              # MTC from the tc_shm.py publisher
+    python mtc_generator.py --bench      # jitter benchmark without a MIDI port
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+import mido
+
+# Shared timecode modules live in the Ambient Lockit folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from timecode import NS_PER_SECOND, FrameRate, Timecode
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import MIDI_OUTPUT_PATTERN
+
+# Busy-wait this long before each deadline instead of sleeping
+SPIN_NS = 1_000_000
+
+# Send delays kept for stats()
+JITTER_WINDOW = 2400
+
+# A message sent later than this counts as late
+LATE_NS = 500_000
+
+# Device id for full-frame messages (0x7F = all devices)
+ALL_DEVICES = 0x7F
+
+
+def open_output_port(pattern=MIDI_OUTPUT_PATTERN):
+    """Open the first MIDI output whose name matches pattern (case-insensitive regex)."""
+    names = mido.get_output_names()
+    regex = re.compile(pattern, re.IGNORECASE)
+    for name in names:
+        if regex.search(name):
+            return mido.open_output(name)
+    raise IOError(f"No MIDI output matching {pattern!r} (found: {', '.join(names) or 'none'})")
+
+
+def quarter_frame_messages(tc):
+    """The 8 quarter-frame messages of the cycle that starts at Timecode tc."""
+    hours, minutes, seconds, frames = tc.hmsf()
+    values = (frames & 0x0F, frames >> 4, seconds & 0x0F, seconds >> 4,
+              minutes & 0x0F, minutes >> 4, hours & 0x0F, hours >> 4 | tc.rate.mtc_code << 1)
+    return [mido.Message("quarter_frame", frame_type=piece, frame_value=value)
+            for piece, value in enumerate(values)]
+
+
+def full_frame_message(tc, device_id=ALL_DEVICES):
+    """Full-frame SysEx (F0 7F <device> 01 01 hh mm ss ff F7) for Timecode tc."""
+    hours, minutes, seconds, frames = tc.hmsf()
+    return mido.Message("sysex", data=(0x7F, device_id, 0x01, 0x01, tc.rate.mtc_code << 5 | hours,
+                                       minutes, seconds, frames))
+
+
+class MTCGenerator:
+    """Sends MTC quarter frames on deadlines taken from a timecode clock."""
+
+    def __init__(self, clock, port, rate=FrameRate.FPS_25, spin_ns=SPIN_NS, device_id=ALL_DEVICES):
+        self.clock = clock
+        self.port = port
+        self.rate = getattr(clock, "rate", rate)
+        self.spin_ns = spin_ns
+        self.device_id = device_id
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.sent = 0
+        self.cycles = 0
+        self.locates = 0
+        self.late = 0
+        self.errors = 0
+        self._jitter = deque(maxlen=JITTER_WINDOW)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mtc-generator", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _position_ns(self, frames, quarters=0):
+        rate = self.rate
+        return (frames * 4 + quarters) * rate.denominator * NS_PER_SECOND // (4 * rate.numerator)
+
+    def _wait_until(self, deadline):
+        if self._stop.is_set():
+            return False
+        remaining = deadline - time.monotonic_ns()
+        if remaining > self.spin_ns:
+            # time.sleep wakes up more punctually than Event.wait
+            time.sleep((remaining - self.spin_ns) / NS_PER_SECOND)
+        while time.monotonic_ns() < deadline:
+            pass
+        return True
+
+    def _send(self, message, deadline):
+        try:
+            self.port.send(message)
+        except Exception as e:
+            self.errors += 1
+            if self.errors == 1:
+                print(f"Error sending MTC: {e}")
+            return
+        delay = time.monotonic_ns() - deadline
+        self.sent += 1
+        self._jitter.append(delay)
+        if delay > LATE_NS:
+            self.late += 1
+
+    def _run(self):
+        rate = self.rate
+        day = rate.frames_per_day
+        last_start = None
+        while not self._stop.is_set():
+            now = time.monotonic_ns()
+            position = self.clock.now_ns(now)
+            if position is None:
+                # No timecode yet
+                self._stop.wait(0.1)
+                continue
+
+            # Next even frame after the current position starts the next cycle
+            current = position * rate.numerator // (rate.denominator * NS_PER_SECOND)
+            start = current + 1 + (current + 1) % 2
+            tc = Timecode(start, rate)
+            messages = quarter_frame_messages(tc)
+            deadlines = [now + self._position_ns(start, k) - position for k in range(8)]
+
+            locate = last_start is None or (start - last_start) % day != 2
+            last_start = start % day
+            if locate:
+                # First cycle or a jump: locate receivers as the frame the full frame names starts
+                self.locates += 1
+                if not self._wait_until(deadlines[0]):
+                    return
+                self._send(full_frame_message(tc, self.device_id), deadlines[0])
+
+            for message, deadline in zip(messages, deadlines):
+                if not self._wait_until(deadline):
+                    return
+                self._send(message, deadline)
+            self.cycles += 1
+
+    def stats(self):
+        jitter = sorted(self._jitter)
+        if jitter:
+            mean = sum(jitter) / len(jitter)
+            p99 = jitter[min(len(jitter) - 1, int(len(jitter) * 0.99))]
+            worst = jitter[-1]
+        else:
+            mean = p99 = worst = 0
+        return {
+            "sent": self.sent,
+            "cycles": self.cycles,
+            "locates": self.locates,
+            "late": self.late,
+            "errors": self.errors,
+            "jitter_mean_us": round(mean / 1000, 1),
+            "jitter_p99_us": round(p99 / 1000, 1),
+            "jitter_max_us": round(worst / 1000, 1),
+        }
+
+
+class NullPort:
+    """Output port that discards messages (for benchmarks)."""
+
+    def __init__(self):
+        self.messages = 0
+
+    def send(self, message):
+        self.messages += 1
+
+    def close(self):
+        pass
+
+
+if __name__ == "__main__":
+    from tc_clock import TimecodeClock
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        rate = FrameRate.FPS_30
+        clock = TimecodeClock(rate)
+        clock.update_timecode(Timecode.parse("10:00:00:00", rate))
+        generator = MTCGenerator(clock, NullPort()).start()
+        time.sleep(10)
+        generator.stop()
+        print(generator.stats())
+    else:
+        from tc_shm import TimecodeReader
+
+        reader = TimecodeReader()
+        sample = reader.read()
+        port = open_output_port()
+        generator = MTCGenerator(reader, port, rate=sample.rate if sample else FrameRate.FPS_25).start()
+        print(f"Sending MTC to {port.name}")
+        try:
+            while True:
+                time.sleep(5)
+                print(generator.stats())
+        except KeyboardInterrupt:
+            generator.stop()
+            port.close()
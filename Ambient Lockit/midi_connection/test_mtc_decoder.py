@@ -0,0 +1,110 @@
+"""Tests for MTCDecoder on synthetic quarter-frame streams."""
+
+import mido
+import pytest
+
+from midi_ingest import synthetic_mtc
+from mtc_decoder import FORWARD, REVERSE, MTCDecoder
+from timecode import NS_PER_SECOND, FrameRate, Timecode
+
+RATE = FrameRate.FPS_30
+START = Timecode.parse("10:00:00:00", RATE)
+
+
+def reverse_mtc(start, frames, rate=RATE):
+    """[(seconds, message)] of reverse quarter frames (pieces 7..0) for frames frames back from Timecode start."""
+    events = []
+    quarter = rate.denominator / rate.numerator / 4
+    origin = int(start) * 4 + 8
+    for n in range(0, frames, 2):
+        hours, minutes, seconds, frame = (start - n).hmsf()
+        pieces = (frame & 0x0F, frame >> 4, seconds & 0x0F, seconds >> 4,
+                  minutes & 0x0F, minutes >> 4, hours & 0x0F, hours >> 4 | rate.mtc_code << 1)
+        for piece in range(7, -1, -1):
+            # Piece k of the sequence for frame F goes out at F + (k + 1) / 4
+            position = (int(start) - n) * 4 + piece + 1
+            events.append(((origin - position) * quarter,
+                           mido.Message("quarter_frame", frame_type=piece, frame_value=pieces[piece])))
+    return events
+
+
+def decode(decoder, events):
+    """[(seconds, reading)] for every reading decoder gives for events."""
+    readings = []
+    for seconds, message in events:
+        reading = decoder.feed(message, captured_ns=int(seconds * NS_PER_SECOND))
+        if reading is not None:
+            readings.append((seconds, reading))
+    return readings
+
+
+def assert_on_time(readings, origin_ns, direction):
+    for seconds, reading in readings:
+        expected = origin_ns + direction * seconds * NS_PER_SECOND
+        assert abs(reading.position_ns - expected) < 1000, (seconds, reading.timecode)
+        assert reading.direction == direction
+
+
+def test_forward_readings_are_quarter_frame_accurate():
+    decoder = MTCDecoder()
+    events = synthetic_mtc(START, 60, RATE)
+    readings = decode(decoder, events)
+    # Nothing until the first sequence is complete, then one reading per quarter frame
+    assert len(readings) == len(events) - 7
+    assert_on_time(readings, START.nanoseconds(), FORWARD)
+    stats = decoder.stats()
+    assert stats["frames"] == 30
+    assert stats["dropouts"] == stats["discontinuities"] == 0
+
+
+def test_reverse_readings_are_quarter_frame_accurate():
+    decoder = MTCDecoder()
+    events = reverse_mtc(START, 60)
+    readings = decode(decoder, events)
+    # The decoder starts out forward: the first sequence only shows the direction
+    assert len(readings) == len(events) - 15
+    assert_on_time(readings, (START + 2).nanoseconds(), REVERSE)
+    stats = decoder.stats()
+    assert stats["frames"] == 29
+    assert stats["discontinuities"] == 0
+
+
+@pytest.mark.parametrize("direction", [FORWARD, REVERSE])
+def test_readings_after_a_dropout_stay_on_time(direction):
+    if direction == FORWARD:
+        events, origin = synthetic_mtc(START, 60, RATE), START.nanoseconds()
+    else:
+        events, origin = reverse_mtc(START, 60), (START + 2).nanoseconds()
+    # Lose the fourth piece of the fifth sequence: nothing until the sixth is complete
+    dropped = events[4 * 8 + 3][0]
+    resumed = events[6 * 8 - 1][0]
+    del events[4 * 8 + 3]
+    decoder = MTCDecoder()
+    readings = decode(decoder, events)
+    assert_on_time(readings, origin, direction)
+    assert not [seconds for seconds, _ in readings if dropped <= seconds < resumed]
+    assert any(seconds == resumed for seconds, _ in readings)
+    stats = decoder.stats()
+    assert stats["dropouts"] == 1
+    assert stats["discontinuities"] == 0
+
+
+def test_full_frame_sysex_locates():
+    decoder = MTCDecoder(latency_ns=1_000_000)
+    decode(decoder, synthetic_mtc(START, 8, RATE))
+    assert decoder.locked
+
+    # Full frame at 01:02:03:04, 30 fps (rate code 3), with and without the F0/F7 bytes
+    for data in ([0x7F, 0x7F, 0x01, 0x01, 0x61, 2, 3, 4], [0xF0, 0x7F, 0x7F, 0x01, 0x01, 0x61, 2, 3, 4, 0xF7]):
+        reading = decoder.sysex(data, captured_ns=123)
+        assert reading.full_frame
+        assert reading.timecode == Timecode.parse("01:02:03:04", RATE)
+        # Parked on the frame: no latency added
+        assert reading.position_ns == Timecode.parse("01:02:03:04", RATE).nanoseconds()
+        assert reading.captured_ns == 123
+        assert not decoder.locked
+    assert decoder.stats()["full_frames"] == 2
+
+    # Other SysEx is ignored
+    assert decoder.feed(mido.Message("sysex", data=[0x7E, 0x7F, 0x06, 0x01])) is None
+    assert decoder.stats()["full_frames"] == 2
@@ -0,0 +1,43 @@
+"""Tests for MTCGenerator against a recording output port."""
+
+import threading
+
+from mtc_generator import MTCGenerator
+from tc_clock import TimecodeClock
+from timecode import NS_PER_SECOND, FrameRate, Timecode
+
+
+class RecordingPort:
+    """Output port that records each message with the clock position it went out at."""
+
+    def __init__(self, clock, count):
+        self.clock = clock
+        self.count = count
+        self.sent = []
+        self.done = threading.Event()
+
+    def send(self, message):
+        self.sent.append((message, self.clock.now_ns()))
+        if len(self.sent) >= self.count:
+            self.done.set()
+
+
+def test_full_frame_goes_out_when_its_frame_starts():
+    for rate in FrameRate:
+        clock = TimecodeClock(rate)
+        clock.update_timecode(Timecode.parse("10:00:00:00", rate))
+        port = RecordingPort(clock, 9)
+        generator = MTCGenerator(clock, port).start()
+        try:
+            assert port.done.wait(2.0)
+        finally:
+            generator.stop()
+
+        (full_frame, position), (first_quarter, _) = port.sent[:2]
+        assert full_frame.type == "sysex" and first_quarter.type == "quarter_frame"
+        hours, minutes, seconds, frames = full_frame.data[4] & 0x1F, *full_frame.data[5:8]
+        named = Timecode.parse(f"{hours:02d}:{minutes:02d}:{seconds:02d}:{frames:02d}", rate)
+        # The frame the full frame names is the one running when it is sent
+        current = position * rate.numerator // (rate.denominator * NS_PER_SECOND)
+        assert int(named) == current, rate
+        assert generator.stats()["locates"] == 1
@@ -0,0 +1,416 @@
+"""
+Drift and jitter analysis between two timecode sources.
+
+The HID LTC path and the MIDI path read the same Lockit, but nothing showed
+whether they agree: neither timestamped its samples. TimecodeAnalyzer takes
+timestamped samples from any number of sources and compares them:
+
+- Every sample is a timecode position (ns since 00:00:00:00) and the
+  time.monotonic_ns() it was captured at. That gives the host time at which the
+  frame started, and each source keeps the first one per frame for its last
+  ALIGN_WINDOW frames.
+- When two sources have seen the same absolute frame number, the difference
+  between their frame start times is one offset sample for that pair: how far
+  the second source (by name) is ahead of the first.
+- Per source, jitter is how far each sample lands from a line fitted through
+  (captured time, host time minus timecode). The slope of that line is the
+  drift of the source against the host clock (positive = source runs fast).
+  Per pair, the slope of the offsets is the drift between the two sources.
+- Everything is incremental: running mean/variance (Welford), fixed-bin
+  histograms and a least-squares fit with exponential forgetting. Memory stays
+  the same however long it runs.
+- report() summarises totals and the interval since the previous report.
+  When a pair's smoothed offset goes over alarm_ns an alarm is printed, and a
+  recovery message is printed when it comes back under 80% of the threshold.
+- add() is called from each source's own thread (HID callbacks, MIDI input)
+  and report() from the main loop, so they share a lock; a report and its
+  interval reset see every sample exactly once.
+
+Usage:
+    analyzer = TimecodeAnalyzer(alarm_ns=1_000_000)
+    analyzer.add("ltc", position_ns, captured_ns, FrameRate.FPS_25)
+    analyzer.add("mtc", reading.position_ns, reading.captured_ns, reading.timecode.rate)
+    print(analyzer.report())
+
+    python tc_analyzer.py        # HID LTC against MIDI MTC from the same Lockit
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from timecode import NS_PER_SECOND
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TC_OFFSET_ALARM_US, TC_REPORT_INTERVAL
+
+# Frames each source remembers for alignment
+ALIGN_WINDOW = 256
+
+# Histogram bins: 100 µs wide, +-5 ms (outside values go in the end bins)
+HISTOGRAM_BIN_NS = 100_000
+HISTOGRAM_BINS = 101
+
+# Weight of old samples in the drift fits (per sample); ~1000-sample memory
+FIT_FORGETTING = 0.999
+
+# Gain of the smoothed offset the alarm looks at
+ALARM_GAIN = 0.1
+# An alarm clears when the smoothed offset is back under this fraction of the threshold
+ALARM_CLEAR_FRACTION = 0.8
+
+
+class RunningStats:
+    """Count, mean, standard deviation, min and max without keeping samples (Welford)."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def stdev(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def summary(self, scale=1000):
+        """Dict in µs (scale=1000 for ns samples)."""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_us": round(self.mean / scale, 1),
+            "stdev_us": round(self.stdev / scale, 1),
+            "min_us": round(self.min / scale, 1),
+            "max_us": round(self.max / scale, 1),
+        }
+
+
+class Histogram:
+    """Fixed-bin histogram centred on zero."""
+
+    def __init__(self, bin_ns=HISTOGRAM_BIN_NS, bins=HISTOGRAM_BINS):
+        self.bin_ns = bin_ns
+        self.counts = [0] * bins
+        self.total = 0
+
+    def add(self, value):
+        half = len(self.counts) // 2
+        index = min(max(int(math.floor(value / self.bin_ns + 0.5)) + half, 0), len(self.counts) - 1)
+        self.counts[index] += 1
+        self.total += 1
+
+    def percentile(self, q):
+        """Centre of the bin holding the q-th percentile (0..100) of the samples."""
+        if not self.total:
+            return 0
+        target = self.total * q / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return (index - len(self.counts) // 2) * self.bin_ns
+        return (len(self.counts) // 2) * self.bin_ns
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.total = 0
+
+    def text(self, width=40):
+        """One line per non-empty bin: centre in µs and a bar."""
+        if not self.total:
+            return ""
+        peak = max(self.counts)
+        half = len(self.counts) // 2
+        lines = []
+        for index, count in enumerate(self.counts):
+            if count:
+                centre = (index - half) * self.bin_ns / 1000
+                lines.append(f"{centre:+8.0f} us {'#' * max(1, round(count * width / peak))} {count}")
+        return "\n".join(lines)
+
+
+class RunningFit:
+    """Least-squares line through (x, y) with exponential forgetting, kept as weighted means and co-moments."""
+
+    def __init__(self, forgetting=FIT_FORGETTING):
+        self.forgetting = forgetting
+        self.reset()
+
+    def reset(self):
+        self._w = 0.0
+        self._mx = self._my = 0.0
+        self._cxx = self._cxy = 0.0
+
+    def add(self, x, y):
+        f = self.forgetting
+        self._w = self._w * f + 1
+        dx = x - self._mx
+        dy = y - self._my
+        self._mx += dx / self._w
+        self._my += dy / self._w
+        # Centred updates; raw sums of x*x lose all precision at ns magnitudes
+        self._cxx = self._cxx * f + dx * (x - self._mx)
+        self._cxy = self._cxy * f + dx * (y - self._my)
+
+    @property
+    def slope(self):
+        return self._cxy / self._cxx if self._cxx > 0 else 0.0
+
+    def predict(self, x):
+        if not self._w:
+            return None
+        return self._my + self.slope * (x - self._mx)
+
+
+class _Source:
+    def __init__(self, name, rate):
+        self.name = name
+        self.rate = rate
+        self.samples = 0
+        self.rate_changes = 0
+        self.fit = RunningFit()
+        self.jitter = RunningStats()
+        self.interval_jitter = RunningStats()
+        self.histogram = Histogram()
+        # frame number -> host time the frame started, for the last ALIGN_WINDOW frames
+        self.frames = {}
+        self._order = deque()
+        self._offset_base = None
+
+
+class _Pair:
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+        self.offset = RunningStats()
+        self.interval_offset = RunningStats()
+        self.histogram = Histogram()
+        self.fit = RunningFit()
+        self.smoothed = None
+        self.alarm = False
+        self.alarms = 0
+        self.rate_mismatches = 0
+
+
+class TimecodeAnalyzer:
+    """Aligns timestamped samples from several sources by frame number and tracks offset, drift and jitter."""
+
+    def __init__(self, alarm_ns=TC_OFFSET_ALARM_US * 1000, on_alarm=print):
+        self.alarm_ns = alarm_ns
+        self.on_alarm = on_alarm
+        self.sources = {}
+        self.pairs = {}
+        self._interval_start = time.monotonic_ns()
+        self._lock = threading.Lock()
+
+    def add(self, source, position_ns, captured_ns, rate):
+        """One sample: source was at position_ns (ns since 00:00:00:00) at monotonic captured_ns."""
+        with self._lock:
+            alarms = self._add_locked(source, position_ns, captured_ns, rate)
+        # Outside the lock, so on_alarm may call stats()
+        for message in alarms:
+            self.on_alarm(message)
+
+    def _add_locked(self, source, position_ns, captured_ns, rate):
+        alarms = []
+        state = self.sources.get(source)
+        if state is None:
+            state = self.sources[source] = _Source(source, rate)
+        elif state.rate is not rate:
+            # A rate change invalidates frame numbers and fits
+            state.rate_changes += 1
+            self.sources[source] = state = _Source(source, rate)
+        state.samples += 1
+
+        day_ns = rate.frames_per_day * rate.denominator * NS_PER_SECOND // rate.numerator
+        host_offset = captured_ns - position_ns
+        if state._offset_base is None:
+            state._offset_base = host_offset
+        # Unwrap midnight: keep host_offset near where the source started
+        host_offset -= round((host_offset - state._offset_base) / day_ns) * day_ns
+
+        predicted = state.fit.predict(captured_ns)
+        if predicted is not None:
+            error = host_offset - predicted
+            state.jitter.add(error)
+            state.interval_jitter.add(error)
+            state.histogram.add(error)
+        state.fit.add(captured_ns, host_offset)
+
+        frame = position_ns * rate.numerator // (rate.denominator * NS_PER_SECOND)
+        if frame in state.frames:
+            return alarms
+        frame_start = captured_ns - (position_ns - frame * rate.denominator * NS_PER_SECOND // rate.numerator)
+        state.frames[frame] = frame_start
+        state._order.append(frame)
+        if len(state._order) > ALIGN_WINDOW:
+            del state.frames[state._order.popleft()]
+
+        for other in self.sources.values():
+            if other is state:
+                continue
+            other_start = other.frames.get(frame)
+            if other_start is None:
+                continue
+            if other.rate is not rate:
+                self._pair(source, other.name).rate_mismatches += 1
+                continue
+            pair = self._pair(source, other.name)
+            # How far the second source is ahead: its frame started that much earlier
+            if pair.first == source:
+                offset = frame_start - other_start
+            else:
+                offset = other_start - frame_start
+            message = self._add_offset(pair, offset, captured_ns)
+            if message:
+                alarms.append(message)
+        return alarms
+
+    def _pair(self, a, b):
+        key = (a, b) if a <= b else (b, a)
+        pair = self.pairs.get(key)
+        if pair is None:
+            pair = self.pairs[key] = _Pair(*key)
+        return pair
+
+    def _add_offset(self, pair, offset, captured_ns):
+        """Add one offset sample; returns an alarm or recovery message, or None."""
+        pair.offset.add(offset)
+        pair.interval_offset.add(offset)
+        pair.histogram.add(offset)
+        pair.fit.add(captured_ns, offset)
+        if pair.smoothed is None:
+            pair.smoothed = float(offset)
+        else:
+            pair.smoothed += ALARM_GAIN * (offset - pair.smoothed)
+
+        if not pair.alarm and abs(pair.smoothed) > self.alarm_ns:
+            pair.alarm = True
+            pair.alarms += 1
+            return (f"ALARM: {pair.second} - {pair.first} offset {pair.smoothed / 1000:+.0f} us "
+                    f"(threshold {self.alarm_ns / 1000:.0f} us)")
+        if pair.alarm and abs(pair.smoothed) < self.alarm_ns * ALARM_CLEAR_FRACTION:
+            pair.alarm = False
+            return f"Cleared: {pair.second} - {pair.first} offset {pair.smoothed / 1000:+.0f} us"
+        return None
+
+    def stats(self):
+        """Totals and interval statistics per source and per pair (times in µs, drift in ppm)."""
+        with self._lock:
+            return self._stats_locked()
+
+    def _stats_locked(self):
+        sources = {}
+        for name, state in self.sources.items():
+            sources[name] = {
+                "rate": str(state.rate),
+                "samples": state.samples,
+                "drift_ppm": round(-state.fit.slope * 1e6, 2),
+                "jitter": state.jitter.summary(),
+                "interval_jitter": state.interval_jitter.summary(),
+                "jitter_p99_us": state.histogram.percentile(99) / 1000,
+                "rate_changes": state.rate_changes,
+            }
+        pairs = {}
+        for (first, second), pair in self.pairs.items():
+            pairs[f"{second}-{first}"] = {
+                "offset": pair.offset.summary(),
+                "interval_offset": pair.interval_offset.summary(),
+                "offset_p50_us": pair.histogram.percentile(50) / 1000,
+                "drift_ppm": round(pair.fit.slope * 1e6, 2),
+                "alarm": pair.alarm,
+                "alarms": pair.alarms,
+                "rate_mismatches": pair.rate_mismatches,
+            }
+        return {"sources": sources, "pairs": pairs}
+
+    def report(self, histograms=False):
+        """Text report; starts a new interval."""
+        with self._lock:
+            now = time.monotonic_ns()
+            stats = self._stats_locked()
+            histogram_lines = []
+            if histograms:
+                for (first, second), pair in self.pairs.items():
+                    histogram_lines.append(f"{second}-{first} offset histogram:")
+                    histogram_lines.append(pair.histogram.text())
+
+            for state in self.sources.values():
+                state.interval_jitter.reset()
+            for pair in self.pairs.values():
+                pair.interval_offset.reset()
+            interval_start, self._interval_start = self._interval_start, now
+
+        lines = [f"--- timecode analysis, interval {(now - interval_start) / NS_PER_SECOND:.1f} s ---"]
+        for name, s in stats["sources"].items():
+            j = s["interval_jitter"]
+            lines.append(f"{name}: {s['rate']} fps, {s['samples']} samples, drift {s['drift_ppm']:+.2f} ppm, "
+                         f"jitter stdev {j.get('stdev_us', 0)} us max {j.get('max_us', 0)} us")
+        for name, p in stats["pairs"].items():
+            o = p["interval_offset"]
+            lines.append(f"{name}: offset mean {o.get('mean_us', 0)} us stdev {o.get('stdev_us', 0)} us "
+                         f"range {o.get('min_us', 0)}..{o.get('max_us', 0)} us, drift {p['drift_ppm']:+.2f} ppm"
+                         f"{' ALARM' if p['alarm'] else ''}")
+        lines.extend(histogram_lines)
+        return "\n".join(lines)
+
+
+def run_analyzer():
+    """Compare the Lockit's HID LTC callbacks with its MIDI timecode."""
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "hid connection"))
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "midi_connection"))
+    from ltc import decode_ltc_word, parse_ltc_message
+    from timecode import Timecode
+    from lockit_client import LockitClient
+    from midi_ingest import MidiIngest, decoder_handler
+    from mtc_decoder import MTCDecoder
+
+    analyzer = TimecodeAnalyzer()
+
+    def on_ltc(message):
+        captured = time.monotonic_ns()
+        try:
+            word, fps = parse_ltc_message(message.raw)
+            tc = Timecode.from_ltc(decode_ltc_word(word, fps=fps), fps)
+        except ValueError as e:
+            print(f"Bad LTC message {message.text()}: {e}")
+            return
+        # The LTC word is complete when the next frame starts
+        analyzer.add("ltc", (tc + 1).nanoseconds(), captured, tc.rate)
+
+    def on_mtc(reading):
+        if not reading.full_frame:
+            analyzer.add("mtc", reading.position_ns, reading.captured_ns, reading.timecode.rate)
+
+    with LockitClient.open() as client, MidiIngest(decoder_handler(MTCDecoder(), on_mtc)):
+        client.subscribe(on_ltc, tag=b"*C0*")
+        client.request(b"*A6*I0:1*")  # enable LTC callbacks
+        try:
+            while True:
+                time.sleep(TC_REPORT_INTERVAL)
+                print(analyzer.report(histograms=True))
+        except KeyboardInterrupt:
+            print(analyzer.report(histograms=True))
+
+
+if __name__ == "__main__":
+    run_analyzer()
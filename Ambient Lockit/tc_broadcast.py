@@ -0,0 +1,298 @@
+"""
+UDP timecode broadcast for machines on the stage network.
+
+Without this, every machine that needs timecode opens its own Lockit through
+ACN_API.py or its own MIDI port through midiTC.py. TimecodeBroadcaster sends one
+small binary packet per frame instead, or per TC_BROADCAST_DIVISOR frames. The
+packets go to TC_BROADCAST_IP:TC_BROADCAST_PORT, the same configuration style
+as UDP_IP/UDP_PORT.
+
+The target can be a multicast group (the default, 239.255.41.1). Then the
+network does the fan-out, and one sendto() per frame reaches any number of
+subscribers. Unicast targets (a comma-separated list) cost one sendto() each.
+The packet is packed into one preallocated buffer either way, so a frame costs
+the same no matter how long the show runs.
+
+Packet (little endian, 40 bytes):
+
+    0   4s   magic "LKTB"          16  i64  timecode position (ns since 00:00:00:00)
+    4   u8   version               24  i64  sent at (time.time_ns(), wall clock)
+    5   u8   rate (FrameRate)      32  u32  frame count since 00:00:00:00
+    6   u8   flags (1 = locked)    36  u32  frames per packet (divisor)
+    7   u8   reserved
+    8   u32  sequence
+    12  u32  reserved
+
+Receivers use the sequence number to count lost and reordered packets. The
+send timestamp gives the one-way latency when the hosts' clocks are synced
+(NTP/PTP).
+
+Usage:
+    python tc_broadcast.py                  # broadcast the timecode from tc_shm.py
+    python tc_broadcast.py listen           # print packets, loss and latency
+
+    broadcaster = TimecodeBroadcaster(clock, FrameRate.FPS_25).start()
+    receiver = TimecodeReceiver()
+    packet = receiver.receive()
+"""
+
+import socket
+import struct
+import sys
+import os
+import threading
+import time
+from collections import namedtuple
+
+from timecode import NS_PER_SECOND, FrameRate, Timecode
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TC_BROADCAST_IP, TC_BROADCAST_PORT, TC_BROADCAST_DIVISOR, TC_MULTICAST_TTL
+
+MAGIC = b"LKTB"
+PACKET_VERSION = 1
+PACKET = struct.Struct("<4sBBBBIIqqII")
+
+FLAG_LOCKED = 0x01
+
+_RATES = list(FrameRate)
+
+# Sequence numbers wrap at 32 bits
+SEQUENCE_MODULO = 1 << 32
+
+# How far before the frame boundary the sender stops sleeping and spins
+SPIN_NS = 200_000
+
+TimecodePacket = namedtuple(
+    "TimecodePacket", ["sequence", "rate", "locked", "position_ns", "sent_ns", "frames", "divisor"],
+)
+
+
+def parse_targets(targets):
+    """["239.255.41.1"] from "239.255.41.1", or a list of addresses from "10.0.0.2,10.0.0.3"."""
+    if isinstance(targets, str):
+        targets = targets.split(",")
+    return [target.strip() for target in targets if target.strip()]
+
+
+def is_multicast(address):
+    first = int(address.split(".")[0])
+    return 224 <= first <= 239
+
+
+def pack_packet(buffer, sequence, rate, locked, position_ns, sent_ns, frames, divisor):
+    PACKET.pack_into(buffer, 0, MAGIC, PACKET_VERSION, _RATES.index(rate), FLAG_LOCKED if locked else 0, 0,
+                     sequence % SEQUENCE_MODULO, 0, position_ns, sent_ns, frames, divisor)
+
+
+def unpack_packet(data):
+    """TimecodePacket from a datagram, or None if it is not a timecode packet."""
+    if len(data) < PACKET.size:
+        return None
+    magic, version, rate_index, flags, _, sequence, _, position_ns, sent_ns, frames, divisor = \
+        PACKET.unpack_from(data)
+    if magic != MAGIC or version != PACKET_VERSION or rate_index >= len(_RATES):
+        return None
+    return TimecodePacket(sequence, _RATES[rate_index], bool(flags & FLAG_LOCKED), position_ns, sent_ns,
+                          frames, divisor)
+
+
+class TimecodeBroadcaster:
+    """
+    Sends a packet on every divisor-th frame boundary of a timecode clock.
+    clock needs now_ns() and locked(), e.g. a TimecodeClock or a
+    TimecodeReader. Clocks without locked() are taken as always locked.
+    """
+
+    def __init__(self, clock, rate, targets=TC_BROADCAST_IP, port=TC_BROADCAST_PORT,
+                 divisor=TC_BROADCAST_DIVISOR, ttl=TC_MULTICAST_TTL, interface=None):
+        self.clock = clock
+        self.rate = rate
+        self.divisor = max(1, divisor)
+        self.destinations = [(address, port) for address in parse_targets(targets)]
+        self._frame_ns = rate.denominator * NS_PER_SECOND / rate.numerator
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if any(is_multicast(address) for address, _ in self.destinations):
+            self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+            if interface:
+                self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+        self._buffer = bytearray(PACKET.size)
+        self._sequence = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.sent = 0
+        self.errors = 0
+        self.late = 0
+        self.max_lateness_ns = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="tc-broadcast", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._socket.close()
+
+    def send(self, position_ns, locked=True, frames=None):
+        """Send one packet for the frame at position_ns."""
+        if frames is None:
+            frames = int(position_ns * self.rate.numerator // (self.rate.denominator * NS_PER_SECOND))
+        pack_packet(self._buffer, self._sequence, self.rate, locked, int(position_ns), time.time_ns(),
+                    frames, self.divisor)
+        self._sequence += 1
+        for destination in self.destinations:
+            try:
+                self._socket.sendto(self._buffer, destination)
+                self.sent += 1
+            except OSError as e:
+                self.errors += 1
+                if self.errors == 1:
+                    print(f"Error sending timecode to {destination}: {e}")
+
+    def _run(self):
+        interval = self._frame_ns * self.divisor
+        last = None
+        while not self._stop.is_set():
+            position = self.clock.now_ns()
+            if position is None:
+                # No timecode yet
+                self._stop.wait(0.1)
+                continue
+            # Sleep until the next divisor-th frame boundary, then spin the last bit
+            target = int(position // interval) + 1
+            if last is not None and last - 2 <= target <= last:
+                # The clock was corrected back a little; don't send a frame twice
+                target = last + 1
+            last = target
+            boundary = target * interval
+            deadline = time.monotonic_ns() + int(boundary - position)
+            remaining = deadline - time.monotonic_ns()
+            if remaining > SPIN_NS:
+                if self._stop.wait((remaining - SPIN_NS) / NS_PER_SECOND):
+                    return
+            while time.monotonic_ns() < deadline:
+                pass
+            lateness = time.monotonic_ns() - deadline
+            if lateness > self._frame_ns / 4:
+                self.late += 1
+            self.max_lateness_ns = max(self.max_lateness_ns, lateness)
+
+            locked = getattr(self.clock, "locked", None)
+            frames = target * self.divisor % self.rate.frames_per_day
+            self.send(round(boundary), locked() if callable(locked) else True, frames)
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "errors": self.errors,
+            "late": self.late,
+            "max_lateness_us": round(self.max_lateness_ns / 1000, 1),
+            "destinations": len(self.destinations),
+        }
+
+
+class TimecodeReceiver:
+    """Receives broadcast packets and tracks loss, reordering and latency."""
+
+    def __init__(self, port=TC_BROADCAST_PORT, group=None, interface="0.0.0.0", timeout=None):
+        if group is None:
+            targets = parse_targets(TC_BROADCAST_IP)
+            group = next((address for address in targets if is_multicast(address)), None)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("", port))
+        if group:
+            membership = socket.inet_aton(group) + socket.inet_aton(interface)
+            self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self._socket.settimeout(timeout)
+        self._buffer = bytearray(PACKET.size + 64)
+
+        self.last_sequence = None
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.invalid = 0
+        self.latency_min_ns = None
+        self.latency_max_ns = 0
+        self._latency_total_ns = 0
+
+    def receive(self):
+        """Block for the next valid packet (socket.timeout if a timeout was set)."""
+        while True:
+            size = self._socket.recv_into(self._buffer)
+            packet = unpack_packet(memoryview(self._buffer)[:size])
+            if packet is None:
+                self.invalid += 1
+                continue
+            self._account(packet, time.time_ns())
+            return packet
+
+    def _account(self, packet, received_ns):
+        self.received += 1
+        if self.last_sequence is not None:
+            gap = (packet.sequence - self.last_sequence) % SEQUENCE_MODULO
+            if gap == 0 or gap > SEQUENCE_MODULO // 2:
+                # Duplicate, or a late packet already counted as lost
+                self.reordered += 1
+                if gap and self.lost:
+                    self.lost -= 1
+                return
+            self.lost += gap - 1
+        self.last_sequence = packet.sequence
+
+        latency = received_ns - packet.sent_ns
+        self._latency_total_ns += latency
+        self.latency_max_ns = max(self.latency_max_ns, latency)
+        self.latency_min_ns = latency if self.latency_min_ns is None else min(self.latency_min_ns, latency)
+
+    def stats(self):
+        accepted = self.received - self.reordered
+        return {
+            "received": self.received,
+            "lost": self.lost,
+            "reordered": self.reordered,
+            "invalid": self.invalid,
+            "latency_avg_us": round(self._latency_total_ns / accepted / 1000, 1) if accepted else None,
+            "latency_min_us": round(self.latency_min_ns / 1000, 1) if self.latency_min_ns is not None else None,
+            "latency_max_us": round(self.latency_max_ns / 1000, 1),
+        }
+
+    def close(self):
+        self._socket.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "listen":
+        receiver = TimecodeReceiver()
+        print(f"Listening for timecode on port {TC_BROADCAST_PORT}")
+        try:
+            while True:
+                packet = receiver.receive()
+                tc = Timecode(packet.frames, packet.rate)
+                print(f"#{packet.sequence} {tc} locked={packet.locked} {receiver.stats()}", end="\r")
+        except KeyboardInterrupt:
+            print()
+    else:
+        # tc_shm.py's publisher owns the Lockit; broadcast what it publishes
+        from tc_shm import TimecodeReader
+
+        reader = TimecodeReader()
+        sample = reader.read()
+        rate = sample.rate if sample else FrameRate.FPS_25
+        broadcaster = TimecodeBroadcaster(reader, rate).start()
+        print(f"Broadcasting {rate} fps timecode to {broadcaster.destinations}")
+        try:
+            while True:
+                time.sleep(5)
+                print(broadcaster.stats())
+        except KeyboardInterrupt:
+            broadcaster.stop()
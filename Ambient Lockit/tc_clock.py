@@ -0,0 +1,270 @@
+"""
+Free-running timecode clock disciplined by Lockit and MTC readings.
+
+Getting the current timecode used to mean a HID round trip
+(send_recv(h, TC_tag + b"Z", TC_tag)) or waiting for the next MTC quarter
+frame. TimecodeClock is fed every reading that arrives (LTC callbacks, TC
+responses, MTC full frames) together with the time.monotonic_ns() at which it
+was captured, and extrapolates between readings:
+
+    position(t) = anchor_position + (t - anchor_time) * ratio
+
+Readings are frame-quantised and arrive with USB/MIDI jitter, so they are
+not taken as-is. The difference between a reading and the prediction moves
+the phase a fraction (PHASE_GAIN) towards the reading. The rate ratio, and so
+the drift of the source against the local clock, is a least-squares fit over
+one reading per second for the last DRIFT_WINDOW seconds, where the jitter
+averages out. Readings far outside the running jitter are rejected as
+outliers, and a large step (a locate, or timecode restarting) re-anchors the
+clock straight away.
+
+Queries never touch the device or take a lock: the model is one tuple that
+update() replaces, so any number of threads can call now_ns() thousands of
+times per second.
+
+Usage:
+    clock = TimecodeClock(FrameRate.FPS_25)
+    client.subscribe(lambda msg: clock.update_ltc_message(msg.raw), tag=b"*C0*")
+    print(clock.now(), clock.now_ns(), clock.stats())
+"""
+
+import threading
+import time
+from collections import deque
+
+from ltc import decode_ltc_word, parse_ltc_message
+from timecode import NS_PER_SECOND, FrameRate, Timecode
+
+# Fraction of each phase error applied to the clock
+PHASE_GAIN = 0.1
+
+# Drift is fitted over one reading per DRIFT_SAMPLE_NS for the last DRIFT_WINDOW samples
+DRIFT_SAMPLE_NS = NS_PER_SECOND
+DRIFT_WINDOW = 60
+
+# Largest drift accepted between source and local clock
+MAX_DRIFT_PPM = 500
+
+# Gain of the running average of absolute phase error (the jitter estimate)
+JITTER_GAIN = 0.05
+
+# Readings further off than this many jitters are outliers...
+OUTLIER_FACTOR = 4
+# ...but never reject anything within this much of the prediction
+MIN_OUTLIER_NS = 2_000_000
+
+# An error bigger than this is a jump in the source, not jitter
+RESYNC_FRAMES = 2
+
+# Re-anchor after this many outliers in a row
+MAX_CONSECUTIVE_OUTLIERS = 3
+
+# Without readings for this long the clock is free-running (not locked)
+FREEWHEEL_NS = 2 * NS_PER_SECOND
+
+
+class TimecodeClock:
+    """Local timecode clock extrapolated from time.monotonic_ns() between readings."""
+
+    def __init__(self, rate=FrameRate.FPS_25, freewheel_ns=FREEWHEEL_NS, clock=time.monotonic_ns):
+        self.rate = rate
+        self.freewheel_ns = freewheel_ns
+        self._clock = clock
+        self._day_ns = rate.frames_per_day * rate.denominator * NS_PER_SECOND // rate.numerator
+        self._frame_ns = rate.denominator * NS_PER_SECOND // rate.numerator
+        # (anchor_time, anchor_position, ratio, last_reading_time) or None before the first reading
+        self._model = None
+        self._lock = threading.Lock()
+        # (time, unwrapped position) samples for the drift fit
+        self._samples = deque(maxlen=DRIFT_WINDOW)
+        self._last_position = 0
+        self._unwrapped = 0
+
+        self.jitter_ns = 0.0
+        self.readings = 0
+        self.outliers = 0
+        self.resyncs = 0
+        self._consecutive_outliers = 0
+
+    # Queries (lock free)
+
+    def now_ns(self, at=None):
+        """Timecode position in nanoseconds since 00:00:00:00, or None before the first reading."""
+        model = self._model
+        if model is None:
+            return None
+        anchor_time, anchor_position, ratio, _ = model
+        t = self._clock() if at is None else at
+        return int(anchor_position + (t - anchor_time) * ratio) % self._day_ns
+
+    def now(self, at=None):
+        """Current Timecode, or None before the first reading."""
+        position = self.now_ns(at)
+        if position is None:
+            return None
+        return Timecode(position * self.rate.numerator // (self.rate.denominator * NS_PER_SECOND), self.rate)
+
+    def locked(self, at=None):
+        """True while readings keep arriving (within freewheel_ns)."""
+        model = self._model
+        if model is None:
+            return False
+        t = self._clock() if at is None else at
+        return t - model[3] <= self.freewheel_ns
+
+    def anchor(self):
+        """(anchor_time, anchor_position, ratio) of the current model, or None."""
+        model = self._model
+        return None if model is None else model[:3]
+
+    @property
+    def drift_ppm(self):
+        """How much faster the source runs than the local clock, in parts per million."""
+        model = self._model
+        return 0.0 if model is None else (model[2] - 1.0) * 1e6
+
+    # Readings
+
+    def update(self, position_ns, captured_ns=None):
+        """
+        Discipline the clock with a reading: the source was at position_ns
+        (nanoseconds since 00:00:00:00) at monotonic time captured_ns.
+        Returns the phase error in ns (0 for the first reading or a resync).
+        """
+        t = self._clock() if captured_ns is None else captured_ns
+        with self._lock:
+            self.readings += 1
+            model = self._model
+            if model is None:
+                self._resync(t, position_ns, 1.0)
+                return 0
+            anchor_time, anchor_position, ratio, _ = model
+
+            predicted = anchor_position + (t - anchor_time) * ratio
+            error = self._wrap(position_ns - predicted)
+            if abs(error) > RESYNC_FRAMES * self._frame_ns:
+                self._resync(t, position_ns, ratio)
+                return 0
+
+            threshold = max(OUTLIER_FACTOR * self.jitter_ns, MIN_OUTLIER_NS)
+            if abs(error) > threshold:
+                self.outliers += 1
+                self._consecutive_outliers += 1
+                if self._consecutive_outliers >= MAX_CONSECUTIVE_OUTLIERS:
+                    self._resync(t, position_ns, ratio)
+                return error
+            self._consecutive_outliers = 0
+            self.jitter_ns += (abs(error) - self.jitter_ns) * JITTER_GAIN
+
+            self._unwrapped += self._wrap(position_ns - self._last_position)
+            self._last_position = position_ns
+            if not self._samples or t - self._samples[-1][0] >= DRIFT_SAMPLE_NS:
+                self._samples.append((t, self._unwrapped))
+                ratio = self._fit_ratio(ratio)
+            self._model = (t, (predicted + PHASE_GAIN * error) % self._day_ns, ratio, t)
+            return error
+
+    def _fit_ratio(self, ratio):
+        # Least-squares slope of position over time
+        samples = self._samples
+        n = len(samples)
+        if n < 3:
+            return ratio
+        t0, p0 = samples[0]
+        mean_t = sum(t - t0 for t, _ in samples) / n
+        mean_p = sum(p - p0 for _, p in samples) / n
+        covariance = sum((t - t0 - mean_t) * (p - p0 - mean_p) for t, p in samples)
+        variance = sum((t - t0 - mean_t) ** 2 for t, _ in samples)
+        if variance <= 0:
+            return ratio
+        limit = MAX_DRIFT_PPM / 1e6
+        return min(max(covariance / variance, 1.0 - limit), 1.0 + limit)
+
+    def update_timecode(self, tc, captured_ns=None, latency_ns=0):
+        """Reading of a Timecode whose frame started latency_ns before captured_ns."""
+        if tc.rate is not self.rate:
+            tc = tc.to_rate(self.rate)
+        t = self._clock() if captured_ns is None else captured_ns
+        return self.update(tc.nanoseconds(), t - latency_ns)
+
+    def update_ltc_message(self, msg, captured_ns=None, latency_ns=0):
+        """
+        Reading from a Lockit LTC callback (b"*C0*I0:<word>*I1:<fps>*Z").
+        An LTC word is only complete once its frame has been sent, so the
+        frame it labels started one frame (plus latency_ns) before capture.
+        """
+        t = self._clock() if captured_ns is None else captured_ns
+        word, fps = parse_ltc_message(msg)
+        fields = decode_ltc_word(word, fps=fps)
+        tc = Timecode.from_ltc(fields, fps if fps is not None else self.rate.nominal)
+        return self.update_timecode(tc, t, self._frame_ns + latency_ns)
+
+    def update_mtc_full_frame(self, hours, minutes, seconds, frames, rate_code=None,
+                              captured_ns=None, latency_ns=0):
+        """Reading from an MTC full-frame message; the frame starts when it arrives."""
+        rate = self.rate if rate_code is None else FrameRate.from_mtc(rate_code)
+        tc = Timecode.from_hmsf(hours, minutes, seconds, frames, rate)
+        return self.update_timecode(tc, captured_ns, latency_ns)
+
+    def reset(self):
+        with self._lock:
+            self._model = None
+            self._samples.clear()
+            self.jitter_ns = 0.0
+            self._consecutive_outliers = 0
+
+    def _resync(self, t, position_ns, ratio):
+        if self._model is not None:
+            self.resyncs += 1
+        self._consecutive_outliers = 0
+        # The source jumped, so earlier samples say nothing about its rate
+        self._samples.clear()
+        self._last_position = self._unwrapped = position_ns
+        self._samples.append((t, position_ns))
+        self._model = (t, position_ns, ratio, t)
+
+    def _wrap(self, delta):
+        # Shortest signed distance around the 24 hour dial
+        half = self._day_ns / 2
+        if delta > half:
+            return delta - self._day_ns
+        if delta < -half:
+            return delta + self._day_ns
+        return delta
+
+    def stats(self):
+        return {
+            "locked": self.locked(),
+            "readings": self.readings,
+            "outliers": self.outliers,
+            "resyncs": self.resyncs,
+            "jitter_us": round(self.jitter_ns / 1000, 1),
+            "drift_ppm": round(self.drift_ppm, 2),
+        }
+
+
+if __name__ == "__main__":
+    import random
+
+    # Simulated 25 fps source running 40 ppm fast with 1 ms of read jitter
+    rate = FrameRate.FPS_25
+    clock = TimecodeClock(rate, clock=lambda: 0)
+    frame_ns = NS_PER_SECOND // 25
+    rng = random.Random(1)
+    start = Timecode.parse("10:00:00:00", rate)
+    worst = 0
+    for i in range(25 * 300):
+        captured = int(i * frame_ns / (1 + 40e-6)) + rng.randint(0, 1_000_000)
+        clock.update_timecode(start + i, captured_ns=captured)
+        if i > 25 * 120:
+            worst = max(worst, abs(clock.now_ns(captured) - (start + i).nanoseconds()))
+    print(f"After 5 minutes: {clock.stats()}, worst error {worst / 1e6:.2f} ms")
+
+    clock = TimecodeClock(rate)
+    clock.update_timecode(start)
+    count = 1_000_000
+    t0 = time.perf_counter()
+    for _ in range(count):
+        clock.now_ns()
+    elapsed = time.perf_counter() - t0
+    print(f"now_ns: {count / elapsed:,.0f} queries/s")
@@ -0,0 +1,416 @@
+"""
+Append-only binary log of timecode samples for post-production sync audits.
+
+midiTC.py and the HID scripts only print the timecode they receive.
+TimecodeRecorder stores every sample as a fixed 16-byte record in memory-mapped
+segment files:
+
+    captured_ns  i64  time.monotonic_ns() when the sample was captured
+    frames       u32  absolute frame count since 00:00:00:00 (see timecode.py)
+    rate         u8   FrameRate index
+    source       u8   SOURCE_LTC, SOURCE_HID_TC, SOURCE_MTC, ...
+    flags        u16  FLAG_VALID (set on every written record)
+
+A segment is a 4 KiB-aligned header plus index area, followed by the record
+array. The header holds the wall-clock/monotonic pair at the segment start, the
+committed record count and a "timecode is monotonic" flag. Every BLOCK_RECORDS
+records an index entry is written: first/last capture time and min/max frame
+of the block. Seeking by wall time is a binary search over the records.
+Seeking by timecode is a binary search over the index while the timecode only
+ran forwards. After a locate or a midnight wrap, only blocks whose frame range
+holds the target are searched.
+
+Crash safety: each record is written before the committed count is bumped, and
+every record carries FLAG_VALID. So a reader of a segment left behind by a
+crash also picks up records written after the last committed count. When a
+segment is full the recorder rolls over to a new file. The file is set up
+under a temporary name and renamed into place, so readers never see a
+half-written header. A day of 25 fps samples from several sources fills many
+segments; TimecodeLog reads them as one log.
+
+Usage:
+    recorder = TimecodeRecorder("logs")
+    recorder.append_timecode(tc, SOURCE_MTC)
+
+    log = TimecodeLog("logs")
+    segment, index = log.seek_wall(time.time_ns() - 60 * NS_PER_SECOND)
+    records = log.segments[0].records()      # zero-copy NumPy structured array
+"""
+
+import bisect
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from timecode import FrameRate, Timecode
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for records()/array views
+    np = None
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TC_RECORD_DIR
+
+MAGIC = b"LKTR"
+FORMAT_VERSION = 1
+PAGE_SIZE = 4096
+
+# Records per index entry, and per segment file (64 MiB of records)
+BLOCK_RECORDS = 4096
+SEGMENT_RECORDS = 4 * 1024 * 1024
+
+# Flush the mapping to disk after this many records
+FLUSH_RECORDS = 1024
+
+SOURCE_UNKNOWN = 0
+SOURCE_LTC = 1
+SOURCE_HID_TC = 2
+SOURCE_MTC = 3
+SOURCE_MTC_FULL_FRAME = 4
+SOURCE_NAMES = {
+    SOURCE_UNKNOWN: "unknown",
+    SOURCE_LTC: "ltc",
+    SOURCE_HID_TC: "hid_tc",
+    SOURCE_MTC: "mtc",
+    SOURCE_MTC_FULL_FRAME: "mtc_full_frame",
+}
+
+FLAG_VALID = 0x0001
+
+HEADER_FLAG_MONOTONIC = 0x01
+
+# magic, version, flags, record size, block records, segment records, reserved, wall ns, monotonic ns, count
+_HEADER = struct.Struct("<4sHHIIIIqqQ")
+_COUNT_OFFSET = _HEADER.size - 8
+_FLAGS_OFFSET = 6
+_INDEX_OFFSET = 64
+# first captured ns, last captured ns, min frame, max frame
+_INDEX = struct.Struct("<qqII")
+_RECORD = struct.Struct("<qIBBH")
+RECORD_SIZE = _RECORD.size
+
+RECORD_DTYPE = None if np is None else np.dtype([
+    ("captured_ns", "<i8"), ("frames", "<u4"), ("rate", "u1"), ("source", "u1"), ("flags", "<u2"),
+])
+
+_RATES = list(FrameRate)
+
+Record = namedtuple("Record", ["captured_ns", "frames", "rate", "source", "flags"])
+
+
+def _data_offset(segment_records, block_records):
+    index_size = -(-segment_records // block_records) * _INDEX.size
+    return -(-(_INDEX_OFFSET + index_size) // PAGE_SIZE) * PAGE_SIZE
+
+
+class TimecodeRecorder:
+    """Appends timecode samples to a rolling set of memory-mapped segment files."""
+
+    def __init__(self, directory=TC_RECORD_DIR, prefix="timecode", segment_records=SEGMENT_RECORDS,
+                 block_records=BLOCK_RECORDS):
+        if not directory:
+            raise ValueError("No recording directory (set TC_RECORD_DIR)")
+        self.directory = directory
+        self.prefix = prefix
+        self.segment_records = segment_records
+        self.block_records = block_records
+        self._data_offset = _data_offset(segment_records, block_records)
+        self._lock = threading.Lock()
+        self._map = None
+        self.path = None
+        self.segments = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open_segment()
+
+    def _open_segment(self):
+        self.segments += 1
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        name = f"{self.prefix}_{stamp}_{os.getpid()}_{self.segments:04}.tcr"
+        path = os.path.join(self.directory, name)
+        temp_path = path + ".tmp"
+        size = self._data_offset + self.segment_records * RECORD_SIZE
+
+        fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            mem = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        _HEADER.pack_into(mem, 0, MAGIC, FORMAT_VERSION, HEADER_FLAG_MONOTONIC, RECORD_SIZE, self.block_records,
+                          self.segment_records, 0, time.time_ns(), time.monotonic_ns(), 0)
+        mem.flush()
+        # Readers only ever see segments with a complete header
+        os.replace(temp_path, path)
+
+        self._map = mem
+        self.path = path
+        self._count = 0
+        self._unflushed = 0
+        self._monotonic = True
+        self._last_frames = None
+        self._block_first = self._block_last = None
+        self._block_min = self._block_max = None
+
+    def append(self, frames, rate, source=SOURCE_UNKNOWN, captured_ns=None):
+        """Record one sample: an absolute frame count at a FrameRate."""
+        captured_ns = time.monotonic_ns() if captured_ns is None else captured_ns
+        with self._lock:
+            if self._count >= self.segment_records:
+                self._close_segment()
+                self._open_segment()
+            mem = self._map
+            _RECORD.pack_into(mem, self._data_offset + self._count * RECORD_SIZE,
+                              captured_ns, frames, _RATES.index(rate), source, FLAG_VALID)
+
+            if self._monotonic and self._last_frames is not None and frames < self._last_frames:
+                self._monotonic = False
+                struct.pack_into("<H", mem, _FLAGS_OFFSET, 0)
+            self._last_frames = frames
+
+            if self._block_first is None:
+                self._block_first = captured_ns
+                self._block_min = self._block_max = frames
+            self._block_last = captured_ns
+            self._block_min = min(self._block_min, frames)
+            self._block_max = max(self._block_max, frames)
+            if (self._count + 1) % self.block_records == 0:
+                self._write_index(self._count // self.block_records)
+
+            # Commit once the record, flags and index are in place
+            self._count += 1
+            struct.pack_into("<Q", mem, _COUNT_OFFSET, self._count)
+
+            self._unflushed += 1
+            if self._unflushed >= FLUSH_RECORDS:
+                mem.flush()
+                self._unflushed = 0
+
+    def append_timecode(self, tc, source=SOURCE_UNKNOWN, captured_ns=None):
+        self.append(tc.frames, tc.rate, source, captured_ns)
+
+    def _write_index(self, block):
+        _INDEX.pack_into(self._map, _INDEX_OFFSET + block * _INDEX.size,
+                         self._block_first, self._block_last, self._block_min, self._block_max)
+        self._block_first = None
+
+    def _close_segment(self):
+        if self._block_first is not None:
+            self._write_index((self._count - 1) // self.block_records)
+        self._map.flush()
+        self._map.close()
+        self._map = None
+
+    def flush(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.flush()
+                self._unflushed = 0
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._close_segment()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class TimecodeSegment:
+    """Read-only view of one segment file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, record_size, self.block_records, self.segment_records, _,
+         self.start_wall_ns, self.start_monotonic_ns, _) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD_SIZE:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} timecode log")
+        self._data_offset = _data_offset(self.segment_records, self.block_records)
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the committed count (and recover records written after it)."""
+        count = struct.unpack_from("<Q", self._map, _COUNT_OFFSET)[0]
+        # Records past the committed count were written before a crash
+        while count < self.segment_records and self._flags(count) & FLAG_VALID:
+            count += 1
+        self.count = count
+        self.monotonic = bool(struct.unpack_from("<H", self._map, _FLAGS_OFFSET)[0] & HEADER_FLAG_MONOTONIC)
+        return count
+
+    def __len__(self):
+        return self.count
+
+    def _flags(self, i):
+        return struct.unpack_from("<H", self._map, self._data_offset + i * RECORD_SIZE + 14)[0]
+
+    def _captured(self, i):
+        return struct.unpack_from("<q", self._map, self._data_offset + i * RECORD_SIZE)[0]
+
+    def _frames(self, i):
+        return struct.unpack_from("<I", self._map, self._data_offset + i * RECORD_SIZE + 8)[0]
+
+    def record(self, i):
+        captured_ns, frames, rate, source, flags = _RECORD.unpack_from(self._map, self._data_offset + i * RECORD_SIZE)
+        return Record(captured_ns, frames, _RATES[rate], source, flags)
+
+    def timecode(self, i):
+        record = self.record(i)
+        return Timecode(record.frames, record.rate)
+
+    def wall_ns(self, captured_ns):
+        """Wall-clock time (time.time_ns()) of a capture timestamp in this segment."""
+        return self.start_wall_ns + captured_ns - self.start_monotonic_ns
+
+    def records(self):
+        """Zero-copy NumPy structured array over the records (RECORD_DTYPE)."""
+        if np is None:
+            raise ImportError("TimecodeSegment.records requires numpy")
+        return np.frombuffer(self._map, dtype=RECORD_DTYPE, count=self.count, offset=self._data_offset)
+
+    def index(self):
+        """Complete index entries as (first_ns, last_ns, min_frame, max_frame) tuples."""
+        blocks = self.count // self.block_records
+        return [_INDEX.unpack_from(self._map, _INDEX_OFFSET + b * _INDEX.size) for b in range(blocks)]
+
+    def seek_captured(self, captured_ns):
+        """Index of the first record captured at or after captured_ns (binary search)."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._captured(mid) < captured_ns:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def seek_frames(self, frames):
+        """
+        Index of the first record at or after frame count frames while the
+        timecode only ran forwards, otherwise of the first record at exactly
+        frames. None if there is none.
+        """
+        blocks = self.index()
+        if self.monotonic:
+            # Binary search over the block maxima, then inside one block
+            block = bisect.bisect_left([entry[3] for entry in blocks], frames)
+            candidates = [block]
+        else:
+            candidates = [b for b, entry in enumerate(blocks) if entry[2] <= frames <= entry[3]]
+            candidates.append(len(blocks))  # the partial block has no index entry yet
+        for block in candidates:
+            lo = block * self.block_records
+            hi = min(lo + self.block_records, self.count)
+            if lo >= hi:
+                continue
+            if self.monotonic:
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if self._frames(mid) < frames:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                if lo < self.count:
+                    return lo
+            else:
+                for i in range(lo, hi):
+                    if self._frames(i) == frames:
+                        return i
+        return None
+
+    def close(self):
+        self._map.close()
+
+
+class TimecodeLog:
+    """All segments of one recording directory, oldest first."""
+
+    def __init__(self, directory=TC_RECORD_DIR, prefix="timecode"):
+        self.directory = directory
+        names = sorted(name for name in os.listdir(directory)
+                       if name.startswith(prefix + "_") and name.endswith(".tcr"))
+        self.segments = [TimecodeSegment(os.path.join(directory, name)) for name in names]
+        self.segments.sort(key=lambda segment: segment.start_wall_ns)
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def refresh(self):
+        for segment in self.segments:
+            segment.refresh()
+
+    def seek_wall(self, wall_ns):
+        """(segment, index) of the first sample at or after wall-clock time wall_ns, or None."""
+        starts = [segment.start_wall_ns for segment in self.segments]
+        first = max(bisect.bisect_right(starts, wall_ns) - 1, 0)
+        for segment in self.segments[first:]:
+            captured = wall_ns - segment.start_wall_ns + segment.start_monotonic_ns
+            i = segment.seek_captured(captured)
+            if i < segment.count:
+                return segment, i
+        return None
+
+    def seek_timecode(self, tc):
+        """(segment, index) of the first sample at or after Timecode tc, or None."""
+        for segment in self.segments:
+            i = segment.seek_frames(tc.frames)
+            if i is not None:
+                return segment, i
+        return None
+
+    def array(self):
+        """All records in one NumPy array (a copy), plus a "wall_ns" column."""
+        if np is None:
+            raise ImportError("TimecodeLog.array requires numpy")
+        dtype = np.dtype(RECORD_DTYPE.descr + [("wall_ns", "<i8")])
+        result = np.empty(len(self), dtype=dtype)
+        pos = 0
+        for segment in self.segments:
+            records = segment.records()
+            part = result[pos:pos + len(records)]
+            for name in RECORD_DTYPE.names:
+                part[name] = records[name]
+            part["wall_ns"] = records["captured_ns"] + (segment.start_wall_ns - segment.start_monotonic_ns)
+            pos += len(records)
+        return result
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    # Write speed and seek over two hours of 25 fps LTC
+    rate = FrameRate.FPS_25
+    directory = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp(prefix="tc_log_")
+    count = 25 * 7200
+    start_ns = time.monotonic_ns()
+    with TimecodeRecorder(directory, segment_records=64 * 1024) as recorder:
+        t0 = time.perf_counter()
+        for i in range(count):
+            recorder.append(36000 * 25 + i, rate, SOURCE_LTC, start_ns + i * 40_000_000)
+        elapsed = time.perf_counter() - t0
+    print(f"Appended {count:,} records in {elapsed:.2f} s ({count / elapsed:,.0f}/s), "
+          f"{recorder.segments} segments in {directory}")
+
+    log = TimecodeLog(directory)
+    target = Timecode.parse("11:30:00:00", rate)
+    t0 = time.perf_counter()
+    segment, i = log.seek_timecode(target)
+    print(f"seek_timecode({target}) -> {segment.timecode(i)} in {(time.perf_counter() - t0) * 1e6:.0f} us")
+    if np is not None:
+        records = log.array()
+        print(f"{len(records):,} records, frame steps: {np.unique(np.diff(records['frames'].astype(np.int64)))}")
+    log.close()
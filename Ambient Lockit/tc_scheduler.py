@@ -0,0 +1,546 @@
+"""
+Cue lists: actions fired at timecodes with frame accuracy.
+
+Nothing tied the Lockit's timecode to anything else. CueScheduler follows a
+timecode clock (TimecodeClock from tc_clock.py, or the shared-memory
+TimecodeReader from tc_shm.py) and fires actions (UDP messages, Stream Deck
+key images, any callable) at the start of their frame:
+
+- Cues are kept in a hierarchical timer wheel indexed by absolute frame
+  number (frames since 00:00:00:00): WHEEL_LEVELS levels of 2**WHEEL_BITS
+  slots. A cue goes in the lowest level whose slot range still holds its
+  frame. Each frame the wheel advances by one slot; a level's slot is
+  cascaded into the levels below when the wheel enters it. Insert and fire
+  cost O(1) per cue, however many cues there are.
+- The wheel only holds the next FILL_FRAMES or so. All cues are also kept in
+  a list sorted by frame; the wheel is topped up from it (bisect) every
+  FILL_FRAMES // 2 frames, so a relocate or midnight only loads the cues
+  near the new position instead of every cue in the list.
+- The wheel runs one frame ahead of the timecode. Cues it hands out are armed
+  straight away (action.arm(), e.g. rendering a key image or packing a UDP
+  message) and fired at the next frame boundary, so firing is just the send.
+- The thread sleeps until SPIN_NS before each frame boundary and busy-waits
+  the rest. How far into its frame each cue actually fired (in timecode
+  time) is kept for the last JITTER_WINDOW cues and reported by stats().
+- Timecode jumps: if the clock moved forward by up to MAX_CATCHUP_FRAMES
+  (the thread woke late), the frames in between are fired late. A larger jump
+  is a relocate: the wheel is rebuilt around the new frame and the cues in
+  between are skipped. While timecode runs backwards (reverse play) nothing
+  fires and the wheel is rebuilt once, when it runs forward again. Without a
+  locked clock nothing fires either. Crossing midnight rebuilds the wheel.
+- Cues stay in the list after they fire, so playing a section again fires
+  them again. cancel() removes a cue.
+
+Usage:
+    scheduler = CueScheduler(clock).start()
+    scheduler.schedule("10:00:05:00", UDPMessage({"type": "cue", "value": 1}))
+    scheduler.schedule("10:00:06:12", KeyImage(writer, 3, lambda: render_key_image(...)))
+    print(scheduler.stats())
+
+    python tc_scheduler.py cues.csv     # "timecode,json message" lines, sent over UDP
+    python tc_scheduler.py --bench      # 50,000 cues on a simulated transport, with jumps
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import deque
+
+from timecode import NS_PER_SECOND, FrameRate, Timecode
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import UDP_IP, UDP_PORT
+
+# Timer wheel: 4 levels of 64 slots cover 2**24 frames, more than a day at 30 fps
+WHEEL_BITS = 6
+WHEEL_LEVELS = 4
+WHEEL_SLOTS = 1 << WHEEL_BITS
+WHEEL_MASK = WHEEL_SLOTS - 1
+
+# Frames of cues loaded into the wheel ahead of the timecode (the lowest two levels)
+FILL_FRAMES = WHEEL_SLOTS ** 2
+
+# Busy-wait this long before each frame boundary instead of sleeping
+SPIN_NS = 1_000_000
+
+# Firing delays kept for stats()
+JITTER_WINDOW = 10_000
+
+# A cue fired later than this into its frame counts as late
+LATE_NS = 1_000_000
+
+# Forward jumps up to this many frames are caught up (fired late) instead of skipped
+MAX_CATCHUP_FRAMES = 2
+
+
+class TimerWheel:
+    """Hierarchical timer wheel over absolute frame numbers; items come out when the wheel reaches their frame."""
+
+    def __init__(self, now=0):
+        self.slots = [[[] for _ in range(WHEEL_SLOTS)] for _ in range(WHEEL_LEVELS)]
+        self.now = now
+
+    def reset(self, now):
+        for level in self.slots:
+            for i, slot in enumerate(level):
+                if slot:
+                    level[i] = []
+        self.now = now
+
+    def add(self, frame, item):
+        """Queue item for frame, which must be after now and below 2**(WHEEL_BITS * WHEEL_LEVELS)."""
+        now = self.now
+        level = 0
+        # Lowest level whose current slot range (one slot of the level above) holds frame
+        while (frame >> (WHEEL_BITS * (level + 1))) != (now >> (WHEEL_BITS * (level + 1))):
+            level += 1
+        self.slots[level][(frame >> (WHEEL_BITS * level)) & WHEEL_MASK].append((frame, item))
+
+    def advance(self):
+        """Move on one frame; returns the (frame, item) pairs due at the new now."""
+        now = self.now = self.now + 1
+        if not now & WHEEL_MASK:
+            # Entered a new slot on one or more higher levels: spread those slots out, top first
+            top = 1
+            while top < WHEEL_LEVELS - 1 and not (now >> (WHEEL_BITS * top)) & WHEEL_MASK:
+                top += 1
+            for level in range(top, 0, -1):
+                slots = self.slots[level]
+                index = (now >> (WHEEL_BITS * level)) & WHEEL_MASK
+                entries = slots[index]
+                if entries:
+                    slots[index] = []
+                    for frame, item in entries:
+                        self.add(frame, item)
+        slots = self.slots[0]
+        due = slots[now & WHEEL_MASK]
+        if due:
+            slots[now & WHEEL_MASK] = []
+        return due
+
+
+class Cue:
+    """One action at one frame. arm (optional) is called one frame before action."""
+
+    __slots__ = ("id", "frame", "action", "arm", "name", "fired", "cancelled")
+
+    def __init__(self, cue_id, frame, action, arm=None, name=None):
+        self.id = cue_id
+        self.frame = frame
+        self.action = action
+        self.arm = arm
+        self.name = name
+        self.fired = 0
+        self.cancelled = False
+
+    def __repr__(self):
+        return f"Cue({self.id}, frame={self.frame}, name={self.name!r})"
+
+
+class UDPMessage:
+    """Cue action that sends data msgpack-encoded over UDP, like SendUDP.py. Packed when armed."""
+
+    _socket = None
+
+    def __init__(self, data, address=None):
+        self.data = data
+        self.address = address or (UDP_IP, UDP_PORT)
+        self._payload = None
+
+    def arm(self):
+        import msgpack
+
+        self._payload = msgpack.packb(self.data)
+
+    def __call__(self):
+        if self._payload is None:
+            self.arm()
+        if UDPMessage._socket is None:
+            UDPMessage._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        UDPMessage._socket.sendto(self._payload, self.address)
+
+
+class KeyImage:
+    """
+    Cue action that shows an image on a Stream Deck key. render() runs when
+    armed, one frame early. The write goes through the deck's DeviceWriter
+    (Streamdeck +/presets/device_writer.py), in the FEEDBACK lane by default.
+    """
+
+    def __init__(self, writer, key, render, priority=None):
+        self.writer = writer
+        self.key = key
+        self.render = render
+        self.priority = writer.FEEDBACK if priority is None else priority
+        self._image = None
+
+    def arm(self):
+        self._image = self.render()
+
+    def __call__(self):
+        if self._image is None:
+            self.arm()
+        self.writer.set_key_image(self.key, self._image, priority=self.priority)
+        # Render again next time the cue is played
+        self._image = None
+
+
+class CueScheduler:
+    """Fires cues at the start of their frame on the timecode of clock."""
+
+    def __init__(self, clock, rate=FrameRate.FPS_25, spin_ns=SPIN_NS, max_catchup=MAX_CATCHUP_FRAMES):
+        self.clock = clock
+        self.rate = getattr(clock, "rate", rate)
+        self.spin_ns = spin_ns
+        self.max_catchup = max_catchup
+        self._day = self.rate.frames_per_day
+        self._day_ns = self._frame_start_ns(self._day)
+        self._cues = {}
+        self._index = []             # (frame, id) of every cue, sorted
+        self._next_id = 1
+        self._wheel = TimerWheel()
+        self._horizon = 0            # cues before this frame are in the wheel
+        self._armed = []             # cues of the frame after self._frame, already armed
+        self._frame = None           # last frame fired; None until following a clock
+        self._reversed = False       # timecode went backwards since the wheel was built
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.fired = 0
+        self.armed = 0
+        self.frames = 0
+        self.caught_up = 0
+        self.relocates = 0
+        self.reverse_frames = 0
+        self.late = 0
+        self.errors = 0
+        self.rebuild_ns = 0
+        self._jitter = deque(maxlen=JITTER_WINDOW)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cue-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # Cue list
+
+    def frame_of(self, at):
+        """Absolute frame number of a Timecode, "HH:MM:SS:FF" string or frame number."""
+        if isinstance(at, str):
+            at = Timecode.parse(at, self.rate)
+        if isinstance(at, Timecode):
+            at = int(at.to_rate(self.rate)) if at.rate != self.rate else int(at)
+        return int(at) % self._day
+
+    def schedule(self, at, action, arm=None, name=None):
+        """Add a cue at timecode at; arm defaults to action.arm if the action has one. Returns the Cue."""
+        frame = self.frame_of(at)
+        with self._lock:
+            cue = Cue(self._next_id, frame, action, arm or getattr(action, "arm", None), name)
+            self._next_id += 1
+            self._cues[cue.id] = cue
+            insort(self._index, (frame, cue.id))
+            self._place(cue)
+        return cue
+
+    def cancel(self, cue):
+        """Remove a cue; it is dropped from the wheel when its slot comes up."""
+        with self._lock:
+            cue.cancelled = True
+            if self._cues.pop(cue.id, None) is not None:
+                del self._index[bisect_left(self._index, (cue.frame, cue.id))]
+
+    def clear(self):
+        with self._lock:
+            for cue in self._cues.values():
+                cue.cancelled = True
+            self._cues.clear()
+            self._index = []
+            self._armed = []
+
+    def __len__(self):
+        return len(self._cues)
+
+    def _place(self, cue):
+        """Put a new cue where the current position needs it (caller holds the lock)."""
+        if self._frame is None:
+            return
+        frame = cue.frame
+        if frame == self._wheel.now:
+            # Due at the next boundary: arm now
+            self._armed.append(cue)
+            self._arm(cue)
+        elif self._wheel.now < frame < self._horizon:
+            self._wheel.add(frame, cue)
+        # Later frames are loaded by _fill; earlier ones fire after the next
+        # relocate that puts them ahead again
+
+    def _rebuild(self, frame):
+        """Follow from frame (already passed): reload the wheel with the cues just after it."""
+        started = time.perf_counter_ns()
+        with self._lock:
+            self._frame = frame
+            self._reversed = False
+            upcoming = (frame + 1) % self._day
+            self._wheel.reset(upcoming)
+            self._horizon = upcoming
+            armed = self._armed = self._load(upcoming + 1)
+            self._fill(upcoming + FILL_FRAMES)
+        for cue in armed:
+            self._arm(cue)
+        self.rebuild_ns = time.perf_counter_ns() - started
+
+    def _load(self, end):
+        """Cues from the horizon up to end, from the index; moves the horizon (caller holds the lock)."""
+        index = self._index
+        end = min(end, self._day)
+        start = bisect_left(index, (self._horizon,))
+        stop = bisect_left(index, (end,), start)
+        self._horizon = end
+        cues = self._cues
+        return [cues[cue_id] for _, cue_id in index[start:stop]]
+
+    def _fill(self, end):
+        """Load the cues up to end into the wheel (caller holds the lock)."""
+        add = self._wheel.add
+        for cue in self._load(end):
+            add(cue.frame, cue)
+
+    # Firing
+
+    def _arm(self, cue):
+        if cue.arm is None:
+            return
+        try:
+            cue.arm()
+            self.armed += 1
+        except Exception as e:
+            self._error(cue, "arming", e)
+
+    def _error(self, cue, what, error):
+        self.errors += 1
+        if self.errors == 1:
+            print(f"Error {what} {cue}: {error}")
+
+    def _step(self, frame_start):
+        """Fire the armed cues (the frame after self._frame) and arm the frame after that."""
+        frame = (self._frame + 1) % self._day
+        with self._lock:
+            due, self._armed = self._armed, []
+        for cue in due:
+            if cue.cancelled:
+                continue
+            position = self.clock.now_ns()
+            late = 0
+            if position is not None:
+                # Wrapped, so a cue fired just after midnight is not a day late
+                half_day = self._day_ns // 2
+                late = (position - frame_start + half_day) % self._day_ns - half_day
+            try:
+                cue.action()
+            except Exception as e:
+                self._error(cue, "firing", e)
+                continue
+            cue.fired += 1
+            self.fired += 1
+            self._jitter.append(late)
+            if late > LATE_NS:
+                self.late += 1
+        self.frames += 1
+
+        if frame + 1 == self._day:
+            # Midnight: the wheel starts again from frame 0
+            self._rebuild(frame)
+            return
+        with self._lock:
+            self._frame = frame
+            armed = [cue for _, cue in self._wheel.advance() if not cue.cancelled]
+            self._armed.extend(armed)
+            if self._horizon - self._wheel.now <= FILL_FRAMES // 2:
+                self._fill(self._wheel.now + FILL_FRAMES)
+        for cue in armed:
+            self._arm(cue)
+
+    def _frame_start_ns(self, frame):
+        rate = self.rate
+        return -(-frame * rate.denominator * NS_PER_SECOND // rate.numerator)
+
+    def _follow(self, frame):
+        """Bring the scheduler to frame: fire, catch up, relocate or wait for forward play."""
+        if self._frame is None:
+            self.relocates += 1
+            self._rebuild(frame)
+            return
+        delta = (frame - self._frame) % self._day
+        if delta == 0:
+            return
+        if delta > self._day // 2:
+            # Reverse play or a locate backwards: fire nothing until it runs forward
+            self.reverse_frames += 1
+            self._frame = frame
+            self._reversed = True
+            return
+        if self._reversed or delta > self.max_catchup:
+            self.relocates += 1
+            self._rebuild(frame)
+            return
+        if delta > 1:
+            self.caught_up += delta - 1
+        for _ in range(delta):
+            self._step(self._frame_start_ns((self._frame + 1) % self._day))
+
+    def _locked(self, now):
+        locked = getattr(self.clock, "locked", None)
+        return locked(now) if callable(locked) else True
+
+    def _run(self):
+        rate = self.rate
+        while not self._stop.is_set():
+            now = time.monotonic_ns()
+            position = self.clock.now_ns(now)
+            if position is None or not self._locked(now):
+                # No timecode: start again from wherever it comes back
+                self._frame = None
+                self._stop.wait(0.1)
+                continue
+
+            self._follow(position * rate.numerator // (rate.denominator * NS_PER_SECOND))
+
+            # Sleep until the next frame boundary, then busy-wait onto it
+            frame = position * rate.numerator // (rate.denominator * NS_PER_SECOND)
+            deadline = now + self._frame_start_ns(frame + 1) - position
+            remaining = deadline - time.monotonic_ns()
+            if remaining > self.spin_ns:
+                # time.sleep wakes up more punctually than Event.wait
+                time.sleep((remaining - self.spin_ns) / NS_PER_SECOND)
+            while time.monotonic_ns() < deadline:
+                pass
+
+    def stats(self):
+        jitter = sorted(self._jitter)
+        if jitter:
+            mean = sum(jitter) / len(jitter)
+            p99 = jitter[min(len(jitter) - 1, int(len(jitter) * 0.99))]
+            worst = jitter[-1]
+        else:
+            mean = p99 = worst = 0
+        return {
+            "cues": len(self._cues),
+            "fired": self.fired,
+            "armed": self.armed,
+            "frames": self.frames,
+            "caught_up": self.caught_up,
+            "relocates": self.relocates,
+            "reverse_frames": self.reverse_frames,
+            "late": self.late,
+            "errors": self.errors,
+            "rebuild_ms": round(self.rebuild_ns / 1e6, 2),
+            "jitter_mean_us": round(mean / 1000, 1),
+            "jitter_p99_us": round(p99 / 1000, 1),
+            "jitter_max_us": round(worst / 1000, 1),
+        }
+
+
+def load_cue_list(scheduler, path):
+    """Schedule a UDPMessage for every "timecode,json message" line of path; returns the count."""
+    import json
+
+    count = 0
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            timecode, _, message = line.partition(",")
+            try:
+                scheduler.schedule(timecode, UDPMessage(json.loads(message)), name=f"{path}:{number}")
+            except ValueError as e:
+                print(f"Skipping {path}:{number}: {e}")
+                continue
+            count += 1
+    return count
+
+
+class Transport:
+    """Stand-in timecode clock for benchmarks: plays from a position at a speed (-1 = reverse)."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._model = None
+
+    def locate(self, tc, speed=1.0):
+        self._model = (time.monotonic_ns(), tc.nanoseconds(), speed)
+
+    def now_ns(self, at=None):
+        if self._model is None:
+            return None
+        anchor_time, anchor_position, speed = self._model
+        t = time.monotonic_ns() if at is None else at
+        day_ns = self.rate.frames_per_day * self.rate.denominator * NS_PER_SECOND // self.rate.numerator
+        return int(anchor_position + (t - anchor_time) * speed) % day_ns
+
+
+def benchmark(count=50_000, seconds=5.0):
+    """Insert count cues, play a section with one cue per frame, then relocate and play in reverse."""
+    import random
+
+    rate = FrameRate.FPS_30
+    start = Timecode.parse("10:00:00:00", rate)
+    transport = Transport(rate)
+    scheduler = CueScheduler(transport)
+    rng = random.Random(1)
+
+    began = time.perf_counter()
+    for frame in range(int(start) + 15, int(start) + 15 + int(seconds * rate.fps)):
+        scheduler.schedule(frame, lambda: None)
+    while len(scheduler) < count:
+        scheduler.schedule(rng.randrange(rate.frames_per_day), lambda: None)
+    elapsed = time.perf_counter() - began
+    print(f"Scheduled {count:,} cues in {elapsed * 1000:.0f} ms ({elapsed / count * 1e6:.1f} µs per cue)")
+
+    transport.locate(start)
+    scheduler.start()
+    time.sleep(seconds + 1)
+    print(f"Played {seconds + 1:.0f} s: {scheduler.stats()}")
+
+    transport.locate(Timecode.parse("15:00:00:00", rate))
+    time.sleep(1)
+    transport.locate(Timecode.parse("15:00:01:00", rate), speed=-1)
+    time.sleep(1)
+    transport.locate(Timecode.parse("10:00:02:00", rate))
+    time.sleep(1)
+    scheduler.stop()
+    print(f"After relocate, reverse and replay: {scheduler.stats()}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        benchmark()
+    elif len(sys.argv) > 1:
+        from tc_shm import TimecodeReader
+
+        reader = TimecodeReader()
+        sample = reader.read()
+        scheduler = CueScheduler(reader, rate=sample.rate if sample else FrameRate.FPS_25)
+        print(f"Loaded {load_cue_list(scheduler, sys.argv[1])} cues from {sys.argv[1]}")
+        scheduler.start()
+        try:
+            while True:
+                time.sleep(5)
+                print(scheduler.stats())
+        except KeyboardInterrupt:
+            scheduler.stop()
+    else:
+        print("Usage: python tc_scheduler.py cues.csv | --bench")
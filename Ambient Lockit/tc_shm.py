@@ -0,0 +1,317 @@
+"""
+Shared-memory timecode for other processes on the same host.
+
+Only one process can hold the Lockit's HID handle, but the Stream Deck
+front-ends, loggers and graphics all want its timecode. The process that owns
+the device runs a TimecodePublisher. It writes the latest timecode position,
+rate and capture time into a small memory-mapped file. Any number of processes
+open it with TimecodeReader and read it without IPC round trips or locks.
+
+The record is protected by a seqlock. The writer makes the sequence number
+odd, writes the record, then makes it even again. A reader copies the record
+between two reads of the sequence number and retries if they differ or are
+odd. Readers never block the writer, and the writer never waits for readers.
+
+Positions are nanoseconds since 00:00:00:00 and times are time.monotonic_ns(),
+which is the same clock in every process on the host. So a reader can
+extrapolate the current timecode itself, the same way TimecodeClock does.
+
+Layout (little endian, 64 bytes):
+
+    0   u32  magic "LKTC"         24  i64  anchor time (monotonic ns)
+    4   u16  layout version       32  i64  published at (monotonic ns)
+    6   u8   rate (FrameRate)     40  f64  rate ratio (1 + drift)
+    7   u8   flags (1 = locked)   48  u32  jitter (ns)
+    8   u64  sequence             52  u32  reserved
+    16  i64  anchor position (ns) 56  u64  records published
+
+run_publisher feeds the Lockit's LTC callbacks through LtcPublisher, whose
+clock runs at the rate of the LTC itself (fps and drop-frame flag), so readers
+get the source's rate rather than an assumed one.
+
+Usage:
+    publisher = TimecodePublisher()
+    publisher.publish_clock(clock)             # after every clock.update()
+
+    reader = TimecodeReader()
+    print(reader.now(), reader.locked())
+"""
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from ltc import decode_ltc_word, parse_ltc_message
+from tc_clock import TimecodeClock
+from tc_recorder import SOURCE_LTC
+from timecode import NS_PER_SECOND, FrameRate, Timecode
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TC_SHM_PATH
+
+MAGIC = b"LKTC"
+LAYOUT_VERSION = 1
+RECORD_SIZE = 64
+
+_HEADER = struct.Struct("<4sHBB")
+_SEQUENCE = struct.Struct("<Q")
+_PAYLOAD = struct.Struct("<qqqdIIQ")
+SEQUENCE_OFFSET = 8
+PAYLOAD_OFFSET = 16
+
+FLAG_LOCKED = 0x01
+
+_RATES = list(FrameRate)
+
+# Retries before a reader gives up on a record that is always being written
+MAX_READ_SPINS = 100000
+
+# A record not republished for this long is stale (run_publisher republishes every second)
+STALE_NS = 3 * NS_PER_SECOND
+
+
+class SharedTimecodeError(Exception):
+    """Raised for a missing or incompatible shared timecode file."""
+
+
+TimecodeSample = namedtuple(
+    "TimecodeSample",
+    ["rate", "locked", "anchor_position", "anchor_time", "published_ns", "ratio", "jitter_ns", "count"],
+)
+
+
+def default_path():
+    if TC_SHM_PATH:
+        return TC_SHM_PATH
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "lockit_timecode")
+
+
+class TimecodePublisher:
+    """
+    Writer of the shared timecode record. The seqlock allows one writer at a
+    time, so publish() takes a lock: run_publisher calls it from the LTC
+    callback thread and from its main loop.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, RECORD_SIZE)
+            self._map = mmap.mmap(fd, RECORD_SIZE)
+        finally:
+            os.close(fd)
+        self._sequence = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        # Start from an even sequence with no valid rate until the first publish
+        _SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, 0)
+        _HEADER.pack_into(self._map, 0, MAGIC, LAYOUT_VERSION, 0xFF, 0)
+
+    def publish(self, anchor_position, anchor_time, rate, locked=True, ratio=1.0, jitter_ns=0):
+        """Publish a timecode position (ns since 00:00:00:00) valid at monotonic anchor_time."""
+        rate_index = _RATES.index(rate)
+        with self._lock:
+            self._count += 1
+            mem = self._map
+            # Odd sequence: readers retry until the record is complete
+            self._sequence += 1
+            _SEQUENCE.pack_into(mem, SEQUENCE_OFFSET, self._sequence)
+            _HEADER.pack_into(mem, 0, MAGIC, LAYOUT_VERSION, rate_index, FLAG_LOCKED if locked else 0)
+            _PAYLOAD.pack_into(mem, PAYLOAD_OFFSET, int(anchor_position), int(anchor_time), time.monotonic_ns(),
+                               float(ratio), min(int(jitter_ns), 0xFFFFFFFF), 0, self._count)
+            self._sequence += 1
+            _SEQUENCE.pack_into(mem, SEQUENCE_OFFSET, self._sequence)
+
+    def publish_timecode(self, tc, captured_ns=None, locked=True):
+        """Publish a Timecode whose frame started at captured_ns."""
+        captured_ns = time.monotonic_ns() if captured_ns is None else captured_ns
+        self.publish(tc.nanoseconds(), captured_ns, tc.rate, locked)
+
+    def publish_clock(self, clock):
+        """Publish the current model of a TimecodeClock (tc_clock.py)."""
+        anchor = clock.anchor()
+        if anchor is None:
+            return
+        anchor_time, anchor_position, ratio = anchor
+        self.publish(anchor_position, anchor_time, clock.rate, clock.locked(), ratio, clock.jitter_ns)
+
+    def close(self, unlink=False):
+        self._map.close()
+        if unlink:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class TimecodeReader:
+    """Lock-free reader of the shared timecode record."""
+
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        try:
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), RECORD_SIZE, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError) as e:
+            raise SharedTimecodeError(f"No shared timecode at {self.path}: {e}") from None
+        magic, version, _, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            raise SharedTimecodeError(f"{self.path} is not a version {LAYOUT_VERSION} shared timecode file")
+        self.retries = 0
+
+    def read(self):
+        """Consistent copy of the record as a TimecodeSample, or None before the first publish."""
+        mem = self._map
+        for _ in range(MAX_READ_SPINS):
+            before = _SEQUENCE.unpack_from(mem, SEQUENCE_OFFSET)[0]
+            if before & 1:
+                self.retries += 1
+                continue
+            record = mem[:RECORD_SIZE]
+            if _SEQUENCE.unpack_from(mem, SEQUENCE_OFFSET)[0] == before:
+                break
+            self.retries += 1
+        else:
+            raise SharedTimecodeError(f"{self.path} is always being written; is the publisher stuck?")
+
+        _, _, rate_index, flags = _HEADER.unpack_from(record, 0)
+        if rate_index >= len(_RATES):
+            return None
+        anchor_position, anchor_time, published_ns, ratio, jitter_ns, _, count = _PAYLOAD.unpack_from(
+            record, PAYLOAD_OFFSET)
+        return TimecodeSample(_RATES[rate_index], bool(flags & FLAG_LOCKED), anchor_position, anchor_time,
+                              published_ns, ratio, jitter_ns, count)
+
+    def now_ns(self, at=None):
+        """Extrapolated timecode position in ns since 00:00:00:00, or None before the first publish."""
+        sample = self.read()
+        if sample is None:
+            return None
+        rate = sample.rate
+        day_ns = rate.frames_per_day * rate.denominator * NS_PER_SECOND // rate.numerator
+        t = time.monotonic_ns() if at is None else at
+        return int(sample.anchor_position + (t - sample.anchor_time) * sample.ratio) % day_ns
+
+    def locked(self, at=None):
+        """True while the publisher reports a locked clock and keeps republishing it."""
+        sample = self.read()
+        if sample is None or not sample.locked:
+            return False
+        t = time.monotonic_ns() if at is None else at
+        return t - sample.published_ns <= STALE_NS
+
+    def now(self, at=None):
+        """Current Timecode, or None before the first publish."""
+        sample = self.read()
+        if sample is None:
+            return None
+        rate = sample.rate
+        t = time.monotonic_ns() if at is None else at
+        position = int(sample.anchor_position + (t - sample.anchor_time) * sample.ratio)
+        return Timecode(position * rate.numerator // (rate.denominator * NS_PER_SECOND), rate)
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class LtcPublisher:
+    """
+    Feeds Lockit LTC callbacks to a TimecodeClock and publishes it. The clock
+    runs at the rate of the LTC and is replaced when that rate changes.
+    """
+
+    def __init__(self, publisher, recorder=None):
+        self.publisher = publisher
+        self.recorder = recorder
+        self.clock = None
+        self.rate_changes = 0
+
+    def on_ltc(self, message):
+        """Notification callback for b"*C0*" messages."""
+        captured = time.monotonic_ns()
+        clock = self.clock
+        try:
+            word, fps = parse_ltc_message(message.raw)
+            if fps is None:
+                fps = clock.rate.nominal if clock is not None else FrameRate.FPS_25.nominal
+            tc = Timecode.from_ltc(decode_ltc_word(word, fps=fps), fps)
+        except ValueError as e:
+            print(f"Bad LTC message {message.text()}: {e}")
+            return
+        if self.recorder is not None:
+            self.recorder.append_timecode(tc, SOURCE_LTC, captured)
+        if clock is None or clock.rate is not tc.rate:
+            if clock is not None:
+                self.rate_changes += 1
+                print(f"LTC rate changed from {clock.rate} to {tc.rate}")
+            clock = self.clock = TimecodeClock(tc.rate)
+        # The LTC word is complete when the next frame starts
+        clock.update_timecode(tc + 1, captured)
+        self.publisher.publish_clock(clock)
+
+    def republish(self):
+        """Publish the clock again, so the locked flag goes off when the LTC stops."""
+        clock = self.clock
+        if clock is not None:
+            self.publisher.publish_clock(clock)
+
+
+def run_publisher(path=None):
+    """Own the Lockit, feed its LTC callbacks to a TimecodeClock and publish it."""
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "hid connection"))
+    from lockit_client import LockitClient
+    from tc_recorder import TimecodeRecorder
+    from config import TC_RECORD_DIR
+
+    recorder = TimecodeRecorder(TC_RECORD_DIR, prefix="ltc") if TC_RECORD_DIR else None
+    with TimecodePublisher(path) as publisher, LockitClient.open() as client:
+        ltc = LtcPublisher(publisher, recorder)
+        client.subscribe(ltc.on_ltc, tag=b"*C0*")
+        client.request(b"*A6*I0:1*")  # enable LTC callbacks
+        print(f"Publishing timecode to {publisher.path}")
+        try:
+            while True:
+                time.sleep(1)
+                ltc.republish()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if recorder is not None:
+                recorder.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "read":
+        with TimecodeReader() as reader:
+            count = 200000
+            start = time.perf_counter()
+            for _ in range(count):
+                reader.now_ns()
+            elapsed = time.perf_counter() - start
+            print(f"{count / elapsed:,.0f} reads/s, {reader.retries} retries")
+            while True:
+                sample = reader.read()
+                print(f"{reader.now()} locked={sample.locked if sample else False}", end="\r")
+                time.sleep(0.04)
+    else:
+        run_publisher()
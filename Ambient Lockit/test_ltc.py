@@ -0,0 +1,106 @@
+"""Tests for the LTC data word decoder and encoder."""
+
+import numpy as np
+import pytest
+
+from ltc import (LTCDecodeError, LTCFields, decode_ltc_word, decode_ltc_words, encode_ltc_word, encode_ltc_words,
+                 parse_ltc_message, words_from_hex)
+
+FLAGS = ("polarity", "bgf0", "bgf1", "bgf2")
+
+# Bit of each flag in the 25 fps layout and in the layout of every other rate (SMPTE 12M)
+FLAG_BITS_25 = {"polarity": 59, "bgf0": 27, "bgf1": 58, "bgf2": 43}
+FLAG_BITS = {"polarity": 27, "bgf0": 43, "bgf1": 58, "bgf2": 59}
+
+
+def sample_fields(fps, count=500, seed=1):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        flags = rng.integers(0, 2, 6)
+        yield LTCFields(int(rng.integers(0, 24)), int(rng.integers(0, 60)), int(rng.integers(0, 60)),
+                        int(rng.integers(0, round(fps))), bool(flags[0]), bool(flags[1]),
+                        int(rng.integers(0, 1 << 32)), *(int(flag) for flag in flags[2:]))
+
+
+def test_known_word():
+    word = encode_ltc_word(12, 34, 56, 23)
+    assert word == 0x0102030405060203
+    assert decode_ltc_word(word, fps=24) == LTCFields(12, 34, 56, 23, False, False, 0, 0, 0, 0, 0)
+    assert decode_ltc_word(word).timecode_string() == "12:34:56:23"
+    assert decode_ltc_word(word | 1 << 10).timecode_string() == "12:34:56;23"
+
+
+@pytest.mark.parametrize("fps", [24, 25, 29.97, 30])
+def test_round_trip(fps):
+    for fields in sample_fields(fps):
+        word = encode_ltc_word(*fields, fps=fps)
+        assert decode_ltc_word(word, fps=fps) == fields
+
+
+def test_user_bit_groups():
+    # UB1 is the lowest nibble of user_bits and sits in bits 4-7; UB8 in bits 60-63
+    for group, shift in enumerate((4, 12, 20, 28, 36, 44, 52, 60)):
+        word = encode_ltc_word(0, 0, 0, 0, user_bits=0x9 << (4 * group))
+        assert word == 0x9 << shift
+        assert decode_ltc_word(word).user_bits == 0x9 << (4 * group)
+
+
+@pytest.mark.parametrize("fps, bits", [(25, FLAG_BITS_25), (24, FLAG_BITS), (30, FLAG_BITS), (None, FLAG_BITS)])
+def test_flag_bit_positions(fps, bits):
+    for flag in FLAGS:
+        word = encode_ltc_word(0, 0, 0, 0, fps=fps, **{flag: 1})
+        assert word == 1 << bits[flag], flag
+        fields = decode_ltc_word(word, fps=fps)
+        assert {name: getattr(fields, name) for name in FLAGS} == {name: int(name == flag) for name in FLAGS}
+    assert encode_ltc_word(0, 0, 0, 0, drop_frame=True, fps=fps) == 1 << 10
+    assert encode_ltc_word(0, 0, 0, 0, color_frame=True, fps=fps) == 1 << 11
+
+
+def test_invalid_digits():
+    for word in (0xA, 0xA << 16, 0x6 << 24, 0xA << 32, 0x6 << 40, 0xA << 48, 0x3 << 56):
+        with pytest.raises(LTCDecodeError):
+            decode_ltc_word(word)
+        decode_ltc_word(word, strict=False)
+    # Frame 25 is only valid above 25 fps
+    word = encode_ltc_word(0, 0, 0, 25)
+    with pytest.raises(LTCDecodeError):
+        decode_ltc_word(word, fps=25)
+    assert decode_ltc_word(word, fps=30).frames == 25
+
+
+def test_parse_ltc_message():
+    assert parse_ltc_message(b"*C0*I0:0102030405060203*I1:25*Z") == (0x0102030405060203, 25)
+    assert parse_ltc_message("*C0*I0:0102030405060203*Z") == (0x0102030405060203, None)
+
+
+@pytest.mark.parametrize("fps", [25, 30, None])
+def test_decode_ltc_words_matches_decode_ltc_word(fps):
+    rng = np.random.default_rng(2)
+    valid_words = [encode_ltc_word(*fields, fps=fps) for fields in sample_fields(fps or 30)]
+    # Random words are mostly invalid, with every flag bit set somewhere
+    random_words = [int(word) for word in rng.integers(0, 1 << 64, 500, dtype=np.uint64)]
+    words = valid_words + random_words
+
+    decoded = decode_ltc_words(np.array(words, dtype=np.uint64), fps=fps)
+    for i, word in enumerate(words):
+        fields = decode_ltc_word(word, fps=fps, strict=False)
+        assert {name: decoded[name][i].item() for name in LTCFields._fields} == fields._asdict(), hex(word)
+        try:
+            decode_ltc_word(word, fps=fps)
+        except LTCDecodeError:
+            assert not decoded["valid"][i]
+        else:
+            assert decoded["valid"][i]
+    assert decoded["valid"][:len(valid_words)].all()
+
+
+def test_encode_ltc_words_matches_encode_ltc_word():
+    hours, minutes, seconds, frames = np.array([[0, 0, 0, 0], [23, 59, 59, 29], [12, 34, 56, 23]]).T
+    user_bits = np.array([0, 0xFFFFFFFF, 0x12345678])
+    words = encode_ltc_words(hours, minutes, seconds, frames, drop_frame=True, user_bits=user_bits)
+    assert words.dtype == np.uint64
+    assert [int(word) for word in words] == [
+        encode_ltc_word(*(int(digit) for digit in digits), drop_frame=True, user_bits=int(ub))
+        for digits, ub in zip(zip(hours, minutes, seconds, frames), user_bits)
+    ]
+    assert list(words_from_hex([f"{int(word):016X}" for word in words])) == list(words)
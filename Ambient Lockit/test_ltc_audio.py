@@ -0,0 +1,63 @@
+"""Loopback tests: LTCAudioGenerator audio through LTCAudioDecoder."""
+
+import numpy as np
+import pytest
+
+from ltc_audio import LTCAudioDecoder, LTCAudioGenerator, read_wav_timecodes
+from timecode import FrameRate, Timecode
+
+SAMPLE_RATE = 48000
+FRAMES = 100
+
+
+def generate(rate, **kwargs):
+    generator = LTCAudioGenerator(rate, SAMPLE_RATE, seed=1, **kwargs)
+    start = Timecode.parse("10:00:00:00", rate)
+    return np.concatenate(list(generator.blocks(start, FRAMES))), start
+
+
+def decode(audio, block_size, rate=None):
+    decoder = LTCAudioDecoder(SAMPLE_RATE, rate)
+    samples, counts, rates = [], [], set()
+    for start in range(0, len(audio), block_size):
+        result = decoder.feed(audio[start:start + block_size])
+        if result is not None:
+            samples.append(result["sample"])
+            counts.append(result["count"])
+            rates.add(result["rate"])
+    return np.concatenate(samples), np.concatenate(counts), rates
+
+
+@pytest.mark.parametrize("rate", list(FrameRate), ids=str)
+def test_result_does_not_depend_on_block_size(rate):
+    audio, start = generate(rate)
+    reference_samples, reference_counts, _ = decode(audio, len(audio))
+    # Every frame but the first (its leading edge is at sample 0) and the last (its last bit never ends)
+    assert list(reference_counts) == list(range(start.frames + 1, start.frames + FRAMES - 1))
+    for block_size in (97, 480, 1000, 1921, 65536):
+        samples, counts, rates = decode(audio, block_size)
+        assert rates == {rate}
+        assert np.array_equal(counts, reference_counts), block_size
+        assert np.allclose(samples, reference_samples), block_size
+
+
+def test_frame_starts_are_on_the_bit_clock():
+    rate = FrameRate.FPS_25
+    audio, start = generate(rate)
+    samples, counts, _ = decode(audio, 480, rate)
+    expected = (counts - start.frames) * SAMPLE_RATE / rate.fps
+    assert np.abs(samples - expected).max() < 0.5
+
+
+def test_jitter_and_dropouts(tmp_path):
+    rate = FrameRate.FPS_2997_DF
+    generator = LTCAudioGenerator(rate, SAMPLE_RATE, jitter_ns=2000, dropout_rate=0.05, seed=3)
+    start = Timecode.parse("00:59:59;00", rate)
+    path = str(tmp_path / "ltc.wav")
+    generator.write_wav(path, start, 300)
+    samples, counts, found = read_wav_timecodes(path)
+    assert found is rate
+    # Dropped frames are missing, the rest decode to their own timecode across the minute boundary
+    assert len(counts) >= 300 - 2 * generator.dropped - 2
+    assert set(counts) <= set(range(start.frames, start.frames + 300))
+    assert np.all(np.diff(counts) > 0)
@@ -0,0 +1,68 @@
+"""Tests for TimecodeAnalyzer fed from several threads."""
+
+import sys
+import threading
+
+import pytest
+
+from tc_analyzer import ALIGN_WINDOW, TimecodeAnalyzer
+from timecode import NS_PER_SECOND, FrameRate
+
+RATE = FrameRate.FPS_25
+FRAME_NS = NS_PER_SECOND // 25
+
+
+@pytest.fixture
+def fast_thread_switching():
+    # Switch threads as often as possible, so unsynchronised updates would interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def test_sources_on_their_own_threads_while_reporting(fast_thread_switching):
+    analyzer = TimecodeAnalyzer(alarm_ns=10 * NS_PER_SECOND)
+    frames = 10_000
+    # Keep the sources within the alignment window of each other
+    step = ALIGN_WINDOW // 4
+    barrier = threading.Barrier(2)
+    errors = []
+
+    def feed(name, offset):
+        try:
+            for frame in range(frames):
+                if frame % step == 0:
+                    barrier.wait(5)
+                position = 36_000 * NS_PER_SECOND + frame * FRAME_NS
+                analyzer.add(name, position, position + offset + (frame % 7) * 1000, RATE)
+        except Exception as e:
+            errors.append(e)
+            barrier.abort()
+
+    threads = [threading.Thread(target=feed, args=(name, offset)) for name, offset in (("ltc", 0), ("mtc", 500_000))]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        analyzer.report(histograms=True)
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    stats = analyzer.stats()
+    for source in stats["sources"].values():
+        assert source["samples"] == frames
+        assert source["jitter"]["count"] == frames - 1
+    pair = stats["pairs"]["mtc-ltc"]
+    assert pair["offset"]["count"] == frames
+    assert pair["offset"]["mean_us"] == -500.0
+
+
+def test_alarm_callback_can_read_stats():
+    seen = []
+    analyzer = TimecodeAnalyzer(alarm_ns=100_000, on_alarm=lambda message: seen.append((message, analyzer.stats())))
+    for frame in range(3):
+        position = frame * FRAME_NS
+        analyzer.add("ltc", position, position, RATE)
+        analyzer.add("mtc", position, position + 1_000_000, RATE)
+    assert len(seen) == 1 and seen[0][0].startswith("ALARM")
@@ -0,0 +1,155 @@
+"""Tests for CueScheduler following the shared-memory timecode."""
+
+import threading
+import time
+
+from tc_scheduler import FILL_FRAMES, WHEEL_BITS, CueScheduler, KeyImage, TimerWheel
+from tc_shm import TimecodePublisher, TimecodeReader
+from timecode import FrameRate, Timecode
+
+RATE = FrameRate.FPS_25
+
+
+class RecordingWriter:
+    """DeviceWriter stand-in that records key writes."""
+
+    FEEDBACK, LAYER, BACKGROUND = 0, 1, 2
+
+    def __init__(self):
+        self.writes = []
+        self.written = threading.Event()
+
+    def set_key_image(self, key, image, priority=LAYER):
+        self.writes.append((key, image, priority))
+        self.written.set()
+
+
+class SteppedClock:
+    """Clock stand-in for driving CueScheduler._follow frame by frame."""
+
+    rate = RATE
+
+    def now_ns(self, at=None):
+        return None
+
+
+def stepped_scheduler(frames):
+    """Scheduler on a SteppedClock with a cue at each frame; returns it and the list fired frames go to."""
+    scheduler = CueScheduler(SteppedClock())
+    fired = []
+    for frame in frames:
+        scheduler.schedule(frame, lambda frame=frame: fired.append(frame))
+    return scheduler, fired
+
+
+def play(scheduler, start, stop):
+    for frame in range(start, stop):
+        scheduler._follow(frame)
+
+
+def publish(publisher, tc, locked):
+    publisher.publish(Timecode.parse(tc, RATE).nanoseconds(), time.monotonic_ns(), RATE, locked=locked)
+
+
+def test_nothing_fires_while_the_reader_is_unlocked(tmp_path):
+    path = str(tmp_path / "timecode")
+    with TimecodePublisher(path) as publisher, TimecodeReader(path) as reader:
+        publish(publisher, "10:00:00:00", locked=False)
+        scheduler = CueScheduler(reader, RATE).start()
+        try:
+            fired = threading.Event()
+            scheduler.schedule("10:00:00:03", fired.set)
+            assert not fired.wait(0.5)
+            assert scheduler.stats()["frames"] == 0
+        finally:
+            scheduler.stop()
+
+
+def test_key_image_goes_through_the_writer(tmp_path):
+    path = str(tmp_path / "timecode")
+    writer = RecordingWriter()
+    with TimecodePublisher(path) as publisher, TimecodeReader(path) as reader:
+        publish(publisher, "10:00:00:00", locked=True)
+        scheduler = CueScheduler(reader, RATE).start()
+        try:
+            scheduler.schedule("10:00:00:03", KeyImage(writer, 3, lambda: "image"))
+            scheduler.schedule("10:00:00:04", KeyImage(writer, 4, lambda: "layer", priority=writer.LAYER))
+            deadline = time.monotonic() + 2.0
+            while len(writer.writes) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert writer.writes == [(3, "image", writer.FEEDBACK), (4, "layer", writer.LAYER)]
+        finally:
+            scheduler.stop()
+
+
+def test_timer_wheel_cascades_every_level():
+    frames = [1, 63, 64, 65, 4095, 4096, 4097, 262143, 262144, 262144 + 4096 + 7]
+    wheel = TimerWheel(0)
+    for frame in reversed(frames):
+        wheel.add(frame, frame)
+    out = []
+    while wheel.now < frames[-1]:
+        out.extend((wheel.now, frame, item) for frame, item in wheel.advance())
+    assert out == [(frame, frame, frame) for frame in frames]
+
+
+def test_timer_wheel_from_an_unaligned_start():
+    start = (1 << (WHEEL_BITS * 2)) - 3
+    frames = [start + 1, start + 3, start + 4, start + 64, start + 5000]
+    wheel = TimerWheel(start)
+    for frame in frames:
+        wheel.add(frame, None)
+    out = []
+    for _ in range(5000):
+        out.extend(frame for frame, _ in wheel.advance())
+    assert out == frames
+
+
+def test_cues_far_beyond_the_fill_are_loaded_in_time():
+    frames = [1005, 1000 + FILL_FRAMES, 1000 + 3 * FILL_FRAMES + 1]
+    scheduler, fired = stepped_scheduler(frames)
+    play(scheduler, 1000, 1000 + 3 * FILL_FRAMES + 2)
+    assert fired == frames
+    assert scheduler.stats()["relocates"] == 1
+
+
+def test_relocate_skips_the_cues_in_between():
+    scheduler, fired = stepped_scheduler([1003, 1010, 5002, 5003])
+    play(scheduler, 1000, 1005)
+    play(scheduler, 5000, 5004)
+    assert fired == [1003, 5002, 5003]
+    assert scheduler.stats()["relocates"] == 2
+
+
+def test_reverse_fires_nothing_until_forward_again():
+    scheduler, fired = stepped_scheduler([1002, 1005, 1008])
+    play(scheduler, 1000, 1007)
+    for frame in range(1006, 1000, -1):
+        scheduler._follow(frame)
+    assert fired == [1002, 1005]
+    # The frame that shows forward play again is followed from, not fired
+    play(scheduler, 1001, 1009)
+    assert fired == [1002, 1005, 1005, 1008]
+    stats = scheduler.stats()
+    assert stats["reverse_frames"] == 5
+    assert stats["relocates"] == 2
+
+
+def test_cues_scheduled_and_cancelled_while_playing():
+    scheduler, fired = stepped_scheduler([1010])
+    play(scheduler, 1000, 1003)
+    scheduler.schedule(1004, lambda: fired.append(1004))
+    scheduler.schedule(1000 + FILL_FRAMES * 2, lambda: fired.append(1000 + FILL_FRAMES * 2))
+    scheduler.cancel(next(cue for cue in scheduler._cues.values() if cue.frame == 1010))
+    play(scheduler, 1003, 1001 + FILL_FRAMES * 2)
+    assert fired == [1004, 1000 + FILL_FRAMES * 2]
+    assert len(scheduler) == 2
+
+
+def test_midnight_starts_the_wheel_again():
+    day = RATE.frames_per_day
+    scheduler, fired = stepped_scheduler([day - 1, 0, 3])
+    play(scheduler, day - 4, day)
+    play(scheduler, 0, 5)
+    assert fired == [day - 1, 0, 3]
+    assert scheduler.stats()["relocates"] == 1
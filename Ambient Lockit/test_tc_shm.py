@@ -0,0 +1,103 @@
+"""Tests for the shared-memory timecode publisher and reader."""
+
+import sys
+import threading
+import time
+
+import pytest
+
+from ltc import encode_ltc_word
+from tc_shm import SEQUENCE_OFFSET, STALE_NS, LtcPublisher, TimecodePublisher, TimecodeReader, _SEQUENCE
+from timecode import FrameRate, Timecode
+
+
+@pytest.fixture
+def fast_thread_switching():
+    # Switch threads as often as possible, so unsynchronised writes would interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def test_publish_from_several_threads(tmp_path, fast_thread_switching):
+    path = str(tmp_path / "timecode")
+    publishes = 20_000
+    with TimecodePublisher(path) as publisher, TimecodeReader(path) as reader:
+        def writer(offset):
+            for i in range(publishes):
+                value = offset + i
+                publisher.publish(value, value, FrameRate.FPS_25)
+
+        threads = [threading.Thread(target=writer, args=(offset,)) for offset in (0, 1_000_000)]
+        for thread in threads:
+            thread.start()
+        torn = 0
+        while any(thread.is_alive() for thread in threads):
+            sample = reader.read()
+            if sample is not None and sample.anchor_position != sample.anchor_time:
+                torn += 1
+        for thread in threads:
+            thread.join()
+
+        assert torn == 0
+        assert _SEQUENCE.unpack_from(publisher._map, SEQUENCE_OFFSET)[0] == 2 * 2 * publishes
+        assert reader.read().count == 2 * publishes
+
+
+def test_reader_locked_follows_flag_and_staleness(tmp_path):
+    path = str(tmp_path / "timecode")
+    with TimecodePublisher(path) as publisher, TimecodeReader(path) as reader:
+        assert not reader.locked()
+        publisher.publish(0, 0, FrameRate.FPS_25, locked=True)
+        published = reader.read().published_ns
+        assert reader.locked()
+        assert reader.locked(at=published + STALE_NS)
+        assert not reader.locked(at=published + STALE_NS + 1)
+        publisher.publish(0, 0, FrameRate.FPS_25, locked=False)
+        assert not reader.locked()
+
+
+def test_broadcaster_flags_packets_from_an_unlocked_reader(tmp_path):
+    from tc_broadcast import TimecodeBroadcaster, TimecodeReceiver
+
+    path = str(tmp_path / "timecode")
+    with TimecodePublisher(path) as publisher, TimecodeReader(path) as reader:
+        receiver = TimecodeReceiver(port=0, group="", timeout=2.0)
+        port = receiver._socket.getsockname()[1]
+        broadcaster = TimecodeBroadcaster(reader, FrameRate.FPS_25, targets="127.0.0.1", port=port)
+        try:
+            publisher.publish(0, time.monotonic_ns(), FrameRate.FPS_25, locked=True)
+            broadcaster.start()
+            assert receiver.receive().locked
+            publisher.publish(0, time.monotonic_ns(), FrameRate.FPS_25, locked=False)
+            # Packets already in flight may still be flagged locked
+            assert any(not receiver.receive().locked for _ in range(5))
+        finally:
+            broadcaster.stop()
+            receiver.close()
+
+
+class LtcMessage:
+    """The parts of a LockitMessage LtcPublisher uses."""
+
+    def __init__(self, tc):
+        hours, minutes, seconds, frames = tc.hmsf()
+        word = encode_ltc_word(hours, minutes, seconds, frames, drop_frame=tc.rate.drop_frame, fps=tc.rate.nominal)
+        self.raw = b"*C0*I0:%016X*I1:%d*Z" % (word, tc.rate.nominal)
+
+    def text(self):
+        return self.raw.decode()
+
+
+def test_ltc_is_published_at_its_own_rate(tmp_path):
+    path = str(tmp_path / "timecode")
+    with TimecodePublisher(path) as publisher, TimecodeReader(path) as reader:
+        ltc = LtcPublisher(publisher)
+        for rate in (FrameRate.FPS_30, FrameRate.FPS_2997_DF, FrameRate.FPS_24, FrameRate.FPS_25):
+            tc = Timecode.parse("10:00:00:10", rate)
+            ltc.on_ltc(LtcMessage(tc))
+            assert reader.read().rate is rate
+            # The word is complete when the next frame starts
+            assert reader.now() == tc + 1
+        assert ltc.rate_changes == 3
@@ -0,0 +1,45 @@
+"""Round-trip tests for Timecode wall-clock conversions."""
+
+import pytest
+
+from tc_clock import TimecodeClock
+from timecode import FrameRate, Timecode, frames_to_nanoseconds_array, nanoseconds_to_frames_array
+
+RATES = list(FrameRate)
+
+
+def sample_frames(rate):
+    # Every frame of the first minutes plus a spread over the whole day
+    return list(range(0, 10_000)) + list(range(0, rate.frames_per_day, 997)) + [rate.frames_per_day - 1]
+
+
+@pytest.mark.parametrize("rate", RATES, ids=str)
+def test_nanoseconds_round_trip(rate):
+    for frames in sample_frames(rate):
+        tc = Timecode(frames, rate)
+        assert Timecode.from_nanoseconds(tc.nanoseconds(), rate) == tc
+
+
+@pytest.mark.parametrize("rate", RATES, ids=str)
+def test_nanoseconds_is_frame_start(rate):
+    for frames in sample_frames(rate)[:2000]:
+        tc = Timecode(frames, rate)
+        # One nanosecond earlier is still the previous frame
+        assert Timecode.from_nanoseconds(tc.nanoseconds() - 1, rate).frames == (frames - 1) % rate.frames_per_day
+
+
+@pytest.mark.parametrize("rate", RATES, ids=str)
+def test_array_round_trip(rate):
+    np = pytest.importorskip("numpy")
+    frames = np.array(sample_frames(rate), dtype=np.int64)
+    nanoseconds = frames_to_nanoseconds_array(frames, rate)
+    assert nanoseconds.tolist() == [Timecode(int(f), rate).nanoseconds() for f in frames]
+    assert (nanoseconds_to_frames_array(nanoseconds, rate) == frames).all()
+
+
+@pytest.mark.parametrize("rate", RATES, ids=str)
+def test_clock_reports_the_frame_it_was_given(rate):
+    tc = Timecode.parse("10:00:00:01", rate)
+    clock = TimecodeClock(rate)
+    clock.update_timecode(tc, 1_000_000_000)
+    assert clock.now(at=1_000_000_000) == tc
@@ -0,0 +1,328 @@
+"""
+Timecode value type shared by the HID, MIDI and LTC code.
+
+parse_ltc_response returns a string and midiTC.py keeps a dict of hours,
+minutes, seconds and frames, with 29.97 stored as a float fps and no drop-frame
+handling. Timecode stores one absolute frame count since 00:00:00:00 together
+with a FrameRate, so add, subtract and compare are plain integer operations.
+Hours, minutes, seconds and frames are only worked out when they are needed.
+
+Drop-frame (29.97 DF) skips frame numbers 00 and 01 at the start of every
+minute except each tenth minute, which keeps the label within a few frames of
+the wall clock. 29.97 NDF counts every frame and drifts 3.6 s per hour.
+Wall-clock conversion uses the exact rate (30000/1001 for 29.97), in integer
+nanoseconds.
+
+The *_array functions do the same conversions on NumPy arrays, e.g. for a
+recording of millions of frame counts.
+
+Usage:
+    tc = Timecode.parse("01:00:00;00", FrameRate.FPS_2997_DF)
+    print(tc + 1, tc.frames, tc.seconds())     # 01:00:00;01 107892 3599.9964
+    tc = Timecode.from_nanoseconds(time.monotonic_ns(), FrameRate.FPS_25)
+    hours, minutes, seconds, frames = frames_to_hmsf_array(counts, FrameRate.FPS_25)
+"""
+
+import re
+from enum import Enum
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for the *_array functions
+    np = None
+
+NS_PER_SECOND = 1_000_000_000
+
+# Drop-frame constants (29.97 DF)
+DF_FRAMES_PER_MINUTE = 60 * 30 - 2          # 1798, every minute except each tenth
+DF_FRAMES_PER_10_MINUTES = 10 * 60 * 30 - 18  # 17982
+
+_TIMECODE_RE = re.compile(r"^\s*(\d{1,2})[:;.](\d{1,2})[:;.](\d{1,2})([:;.])(\d{1,2})\s*$")
+
+
+class FrameRate(Enum):
+    """Timecode rates: (nominal fps, rate numerator, rate denominator, drop frame)."""
+
+    FPS_24 = (24, 24, 1, False)
+    FPS_25 = (25, 25, 1, False)
+    FPS_2997_DF = (30, 30000, 1001, True)
+    FPS_2997_NDF = (30, 30000, 1001, False)
+    FPS_30 = (30, 30, 1, False)
+
+    def __init__(self, nominal, numerator, denominator, drop_frame):
+        self.nominal = nominal
+        self.numerator = numerator
+        self.denominator = denominator
+        self.drop_frame = drop_frame
+        frames_per_hour = 6 * DF_FRAMES_PER_10_MINUTES if drop_frame else 3600 * nominal
+        self.frames_per_day = 24 * frames_per_hour
+
+    @property
+    def fps(self):
+        """Actual frames per second as a float (29.97002997 for 29.97)."""
+        return self.numerator / self.denominator
+
+    @property
+    def mtc_code(self):
+        """Rate bits used by MIDI timecode (0=24, 1=25, 2=29.97 DF, 3=30)."""
+        return _MTC_CODES[self]
+
+    @classmethod
+    def from_mtc(cls, code):
+        return _MTC_RATES[code & 0x03]
+
+    @classmethod
+    def from_fps(cls, fps, drop_frame=None):
+        """
+        Rate for a fps value such as 25, 29.97 or 30. Lockit and LTC report 29.97
+        as 29 or 30 with a drop-frame flag; pass drop_frame to choose between them.
+        """
+        fps = float(fps)
+        if abs(fps - 24) < 0.01 or abs(fps - 23.976) < 0.01:
+            return cls.FPS_24
+        if abs(fps - 25) < 0.01:
+            return cls.FPS_25
+        if abs(fps - 29.97) < 0.01 or int(fps) == 29:
+            return cls.FPS_2997_NDF if drop_frame is False else cls.FPS_2997_DF
+        if abs(fps - 30) < 0.01:
+            return cls.FPS_2997_DF if drop_frame else cls.FPS_30
+        raise ValueError(f"Unsupported frame rate: {fps}")
+
+    def __str__(self):
+        if self.denominator == 1:
+            return f"{self.nominal}"
+        return f"29.97 {'DF' if self.drop_frame else 'NDF'}"
+
+
+_MTC_CODES = {
+    FrameRate.FPS_24: 0,
+    FrameRate.FPS_25: 1,
+    FrameRate.FPS_2997_DF: 2,
+    FrameRate.FPS_2997_NDF: 2,
+    FrameRate.FPS_30: 3,
+}
+_MTC_RATES = (FrameRate.FPS_24, FrameRate.FPS_25, FrameRate.FPS_2997_DF, FrameRate.FPS_30)
+
+
+def hmsf_to_frames(hours, minutes, seconds, frames, rate):
+    """Absolute frame count for a timecode label."""
+    nominal = rate.nominal
+    if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60 and 0 <= frames < nominal):
+        raise ValueError(f"Invalid timecode {hours:02}:{minutes:02}:{seconds:02}:{frames:02} for {rate} fps")
+    count = ((hours * 60 + minutes) * 60 + seconds) * nominal + frames
+    if rate.drop_frame:
+        if frames < 2 and seconds == 0 and minutes % 10:
+            raise ValueError(f"{hours:02}:{minutes:02}:00;{frames:02} does not exist in drop-frame timecode")
+        total_minutes = hours * 60 + minutes
+        count -= 2 * (total_minutes - total_minutes // 10)
+    return count
+
+
+def frames_to_hmsf(count, rate):
+    """(hours, minutes, seconds, frames) for a frame count (wrapped to 24 hours)."""
+    count %= rate.frames_per_day
+    nominal = rate.nominal
+    if rate.drop_frame:
+        tens, rest = divmod(count, DF_FRAMES_PER_10_MINUTES)
+        # Add back the labels skipped so far, then count as 30 NDF
+        count += 18 * tens
+        if rest >= 2:
+            count += 2 * ((rest - 2) // DF_FRAMES_PER_MINUTE)
+    seconds, frames = divmod(count, nominal)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return hours, minutes, seconds, frames
+
+
+class Timecode:
+    """Immutable timecode: an absolute frame count since midnight and a FrameRate."""
+
+    __slots__ = ("frames", "rate")
+
+    def __init__(self, frames, rate):
+        object.__setattr__(self, "frames", frames % rate.frames_per_day)
+        object.__setattr__(self, "rate", rate)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Timecode is immutable")
+
+    def __reduce__(self):
+        return Timecode, (self.frames, self.rate)
+
+    # Construction
+
+    @classmethod
+    def from_hmsf(cls, hours, minutes, seconds, frames, rate):
+        return cls(hmsf_to_frames(hours, minutes, seconds, frames, rate), rate)
+
+    @classmethod
+    def parse(cls, text, rate):
+        """Parse "HH:MM:SS:FF" (";" before the frames is accepted for drop-frame)."""
+        match = _TIMECODE_RE.match(text)
+        if not match:
+            raise ValueError(f"Invalid timecode string: {text!r}")
+        hours, minutes, seconds, _, frames = match.groups()
+        return cls.from_hmsf(int(hours), int(minutes), int(seconds), int(frames), rate)
+
+    @classmethod
+    def from_ltc(cls, fields, fps):
+        """Timecode from decoded LTCFields (see ltc.py) and the fps the Lockit reported."""
+        rate = FrameRate.from_fps(fps, fields.drop_frame)
+        return cls.from_hmsf(fields.hours, fields.minutes, fields.seconds, fields.frames, rate)
+
+    @classmethod
+    def from_nanoseconds(cls, nanoseconds, rate):
+        """The frame running at nanoseconds since midnight (wall clock)."""
+        return cls(nanoseconds * rate.numerator // (rate.denominator * NS_PER_SECOND), rate)
+
+    @classmethod
+    def from_seconds(cls, seconds, rate):
+        return cls.from_nanoseconds(round(seconds * NS_PER_SECOND), rate)
+
+    # Conversion
+
+    def hmsf(self):
+        return frames_to_hmsf(self.frames, self.rate)
+
+    def nanoseconds(self):
+        """
+        Wall-clock time of the start of this frame, in nanoseconds since midnight.
+        Rounded up, so from_nanoseconds() of the result is this frame again.
+        """
+        return -(-self.frames * self.rate.denominator * NS_PER_SECOND // self.rate.numerator)
+
+    def seconds(self):
+        return self.frames * self.rate.denominator / self.rate.numerator
+
+    def to_rate(self, rate):
+        """The frame of another rate running at the same wall-clock time."""
+        if rate is self.rate:
+            return self
+        return Timecode(self.frames * rate.numerator * self.rate.denominator
+                        // (self.rate.numerator * rate.denominator), rate)
+
+    def __str__(self):
+        hours, minutes, seconds, frames = self.hmsf()
+        separator = ";" if self.rate.drop_frame else ":"
+        return f"{hours:02}:{minutes:02}:{seconds:02}{separator}{frames:02}"
+
+    def __repr__(self):
+        return f"Timecode('{self}', {self.rate.name})"
+
+    def __int__(self):
+        return self.frames
+
+    # Arithmetic (wraps at 24 hours like the device does)
+
+    def __add__(self, other):
+        if isinstance(other, int):
+            return Timecode(self.frames + other, self.rate)
+        if isinstance(other, Timecode):
+            self._check_rate(other)
+            return Timecode(self.frames + other.frames, self.rate)
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        """Timecode - int is a Timecode; Timecode - Timecode is a signed frame count."""
+        if isinstance(other, int):
+            return Timecode(self.frames - other, self.rate)
+        if isinstance(other, Timecode):
+            self._check_rate(other)
+            return self.frames - other.frames
+        return NotImplemented
+
+    def _check_rate(self, other):
+        if other.rate is not self.rate:
+            raise ValueError(f"Timecode rates differ: {self.rate} and {other.rate}")
+
+    def __eq__(self, other):
+        if isinstance(other, Timecode):
+            return self.frames == other.frames and self.rate is other.rate
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.frames, self.rate))
+
+    def __lt__(self, other):
+        if not isinstance(other, Timecode):
+            return NotImplemented
+        self._check_rate(other)
+        return self.frames < other.frames
+
+    def __le__(self, other):
+        if not isinstance(other, Timecode):
+            return NotImplemented
+        self._check_rate(other)
+        return self.frames <= other.frames
+
+    def __gt__(self, other):
+        if not isinstance(other, Timecode):
+            return NotImplemented
+        self._check_rate(other)
+        return self.frames > other.frames
+
+    def __ge__(self, other):
+        if not isinstance(other, Timecode):
+            return NotImplemented
+        self._check_rate(other)
+        return self.frames >= other.frames
+
+
+# Bulk conversion (NumPy)
+
+def _require_numpy(name):
+    if np is None:
+        raise ImportError(f"{name} requires numpy")
+
+
+def frames_to_hmsf_array(counts, rate):
+    """Vectorized frames_to_hmsf; returns four int64 arrays."""
+    _require_numpy("frames_to_hmsf_array")
+    count = np.asarray(counts, dtype=np.int64) % rate.frames_per_day
+    nominal = rate.nominal
+    if rate.drop_frame:
+        tens, rest = np.divmod(count, DF_FRAMES_PER_10_MINUTES)
+        count = count + 18 * tens + 2 * (np.maximum(rest - 2, 0) // DF_FRAMES_PER_MINUTE)
+    seconds, frames = np.divmod(count, nominal)
+    minutes, seconds = np.divmod(seconds, 60)
+    hours, minutes = np.divmod(minutes, 60)
+    return hours, minutes, seconds, frames
+
+
+def hmsf_to_frames_array(hours, minutes, seconds, frames, rate):
+    """Vectorized hmsf_to_frames (no range checks); returns an int64 array."""
+    _require_numpy("hmsf_to_frames_array")
+    hours, minutes, seconds, frames = (np.asarray(a, dtype=np.int64) for a in (hours, minutes, seconds, frames))
+    count = ((hours * 60 + minutes) * 60 + seconds) * rate.nominal + frames
+    if rate.drop_frame:
+        total_minutes = hours * 60 + minutes
+        count -= 2 * (total_minutes - total_minutes // 10)
+    return count
+
+
+def nanoseconds_to_frames_array(nanoseconds, rate):
+    """Vectorized Timecode.from_nanoseconds(...).frames for int64 nanoseconds."""
+    _require_numpy("nanoseconds_to_frames_array")
+    ns = np.asarray(nanoseconds, dtype=np.int64)
+    # Split off whole seconds so ns * numerator cannot overflow int64
+    whole, rest = np.divmod(ns, NS_PER_SECOND)
+    quotient, remainder = np.divmod(whole * rate.numerator, rate.denominator)
+    count = quotient + (remainder * NS_PER_SECOND + rest * rate.numerator) // (rate.denominator * NS_PER_SECOND)
+    return count % rate.frames_per_day
+
+
+def frames_to_nanoseconds_array(counts, rate):
+    """Vectorized Timecode.nanoseconds() for an array of frame counts."""
+    _require_numpy("frames_to_nanoseconds_array")
+    count = np.asarray(counts, dtype=np.int64)
+    # Rounded up like Timecode.nanoseconds()
+    return -(-count * (rate.denominator * NS_PER_SECOND) // rate.numerator)
+
+
+def format_timecodes(counts, rate):
+    """List of "HH:MM:SS:FF" strings for an array of frame counts."""
+    separator = ";" if rate.drop_frame else ":"
+    return [f"{h:02}:{m:02}:{s:02}{separator}{f:02}"
+            for h, m, s, f in zip(*(a.tolist() for a in frames_to_hmsf_array(counts, rate)))]
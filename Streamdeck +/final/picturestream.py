@@ -13,6 +13,10 @@ from StreamDeck.Devices.StreamDeck import DialEventType, TouchscreenEventType
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from config import UDP_IP, UDP_PORT, RECEIVE_PORT, CONFIG_NOTE
 
+# Image helpers shared with the presets
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "presets"))
+from image_pipeline import load_scaled
+
 print(CONFIG_NOTE)
 
 # Folder containing image assets
@@ -85,9 +89,9 @@ def handle_image_data(msg, addr, deck):
 
     if msg == b"END":
         try:
-            # Load the image directly from the buffer
-            img = Image.open(io.BytesIO(image_buffer))
-            img = img.convert("RGB")  # Ensure correct format
+            # Load the image directly from the buffer, checked against the pixel
+            # limit and decoded at reduced scale straight to the key size
+            img = load_scaled(io.BytesIO(image_buffer), deck.key_image_format()["size"], mode="RGB")
             
             if image_label in global_key_labels:
                 data = msgpack.unpackb(msg, strict_map_key=False)
@@ -110,7 +114,7 @@ def handle_image_data(msg, addr, deck):
         except Exception as e:
             print(f"Error processing image data: {e}")
         finally:
-            image_buffer = b""  # Clear buffer for the next image
+            image_buffer = bytearray()  # Clear buffer for the next image
     else:
         image_buffer += msg
 
@@ -140,7 +144,7 @@ def process_udp_message(data, deck):
 
 
 # Initialize image buffer and label
-image_buffer = b""
+image_buffer = bytearray()  # Appending to a bytearray avoids copying the whole image per packet
 image_label = ""
 
 def send_udp_message(data):
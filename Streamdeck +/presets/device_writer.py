@@ -0,0 +1,257 @@
+"""
+Priority-aware USB write scheduler for a Stream Deck.
+
+All image writes to the deck go through one DeviceWriter thread instead of
+being sent from whichever thread produced them. Writes are queued in three
+priority lanes:
+
+    FEEDBACK   - direct response to a key press / dial turn (always first)
+    LAYER      - updates for the layer currently on screen
+    BACKGROUND - prefetch and other work nobody is waiting on
+
+Only the latest image per target (a key or a touchscreen region) is kept, so a
+burst of updates to the same key costs a single USB write. An optional USB
+budget in bytes per second throttles the writer; the next write is only chosen
+once the budget allows it, so a key press arriving during a bulk refresh still
+goes out next.
+
+Usage:
+    writer = DeviceWriter(deck, bytes_per_second=DECK_USB_BYTES_PER_SECOND)
+    writer.start()
+    writer.set_key_image(3, image, priority=DeviceWriter.FEEDBACK)
+    print(writer.format_stats())
+    writer.stop()
+"""
+
+import threading
+import time
+from collections import deque
+
+FEEDBACK = 0
+LAYER = 1
+BACKGROUND = 2
+LANE_NAMES = ("feedback", "layer", "background")
+
+
+class _Write:
+    __slots__ = ("target", "priority", "size", "write", "enqueued_ns")
+
+    def __init__(self, target, priority, size, write, enqueued_ns):
+        self.target = target
+        self.priority = priority
+        self.size = size
+        self.write = write
+        self.enqueued_ns = enqueued_ns
+
+
+class _LaneStats:
+    __slots__ = ("written", "total_ns", "max_ns", "last_ns")
+
+    def __init__(self):
+        self.written = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.last_ns = 0
+
+    def record(self, latency_ns):
+        self.written += 1
+        self.total_ns += latency_ns
+        self.last_ns = latency_ns
+        if latency_ns > self.max_ns:
+            self.max_ns = latency_ns
+
+
+class DeviceWriter:
+    """Single writer thread with priority lanes, per-target dedupe and a USB byte budget."""
+
+    FEEDBACK = FEEDBACK
+    LAYER = LAYER
+    BACKGROUND = BACKGROUND
+
+    def __init__(self, deck, bytes_per_second=0, burst_bytes=None):
+        self._deck = deck
+        # 0 or None disables throttling
+        self._rate = bytes_per_second or 0
+        # Allow roughly 100 ms worth of traffic in one burst by default
+        self._burst = burst_bytes if burst_bytes is not None else max(self._rate // 10, 1)
+        self._tokens = self._burst
+        self._refilled_ns = time.monotonic_ns()
+
+        self._cond = threading.Condition()
+        self._lanes = [deque() for _ in LANE_NAMES]
+        self._depth = [0] * len(LANE_NAMES)
+        self._pending = {}  # target -> _Write
+        self._busy = False
+        self._stopping = False
+        self._thread = None
+
+        self._lane_stats = [_LaneStats() for _ in LANE_NAMES]
+        self._deduped = 0
+        self._bytes_written = 0
+        self._errors = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="deck-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, drain=True, timeout=None):
+        """Stop the writer thread, optionally writing out everything still queued."""
+        with self._cond:
+            if not drain:
+                for lane in self._lanes:
+                    lane.clear()
+                self._pending.clear()
+                self._depth = [0] * len(LANE_NAMES)
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def flush(self, timeout=None):
+        """Block until all queued writes are on the device. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def submit(self, target, size, write, priority=LAYER):
+        """
+        Queue write() for target. A newer submit for the same target replaces
+        the queued payload and can raise (never lower) its priority.
+        """
+        if priority not in (FEEDBACK, LAYER, BACKGROUND):
+            raise ValueError(f"Unknown priority {priority}")
+        now = time.monotonic_ns()
+        with self._cond:
+            item = self._pending.get(target)
+            if item is not None:
+                self._deduped += 1
+                item.size = size
+                item.write = write
+                if priority < item.priority:
+                    # The old lane entry is skipped as stale when popped
+                    self._depth[item.priority] -= 1
+                    item.priority = priority
+                    self._depth[priority] += 1
+                    self._lanes[priority].append(item)
+            else:
+                item = _Write(target, priority, size, write, now)
+                self._pending[target] = item
+                self._depth[priority] += 1
+                self._lanes[priority].append(item)
+            self._cond.notify()
+
+    def set_key_image(self, key, image, priority=LAYER):
+        deck = self._deck
+        self.submit(("key", key), len(image), lambda: deck.set_key_image(key, image), priority)
+
+    def set_touchscreen_image(self, image, x_pos, y_pos, width, height, priority=LAYER):
+        deck = self._deck
+        self.submit(
+            ("touchscreen", x_pos, y_pos, width, height),
+            len(image),
+            lambda: deck.set_touchscreen_image(image, x_pos, y_pos, width, height),
+            priority,
+        )
+
+    def _next_locked(self):
+        for lane_index, lane in enumerate(self._lanes):
+            while lane:
+                item = lane.popleft()
+                if item.priority == lane_index and self._pending.get(item.target) is item:
+                    del self._pending[item.target]
+                    self._depth[lane_index] -= 1
+                    return item
+        return None
+
+    def _budget_wait_s(self):
+        # Seconds until the byte budget is no longer in debt
+        if not self._rate:
+            return 0
+        now = time.monotonic_ns()
+        self._tokens = min(self._burst, self._tokens + (now - self._refilled_ns) * self._rate / 1e9)
+        self._refilled_ns = now
+        if self._tokens >= 0:
+            return 0
+        return -self._tokens / self._rate
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._pending:
+                        if self._stopping:
+                            return
+                        self._cond.wait()
+                        continue
+                    # Wait for the budget before choosing, so a higher priority
+                    # write arriving meanwhile is picked first
+                    wait_s = self._budget_wait_s()
+                    if wait_s > 0:
+                        self._cond.wait(wait_s)
+                        continue
+                    item = self._next_locked()
+                    if item is not None:
+                        break
+                self._busy = True
+
+            try:
+                with self._deck:
+                    item.write()
+            except Exception as e:
+                print(f"Error writing {item.target} to deck: {e}")
+                ok = False
+            else:
+                ok = True
+
+            done_ns = time.monotonic_ns()
+            with self._cond:
+                self._busy = False
+                if ok:
+                    self._lane_stats[item.priority].record(done_ns - item.enqueued_ns)
+                    self._bytes_written += item.size
+                else:
+                    self._errors += 1
+                if self._rate:
+                    self._tokens -= item.size
+                self._cond.notify_all()
+
+    def queue_depth(self):
+        with self._cond:
+            return dict(zip(LANE_NAMES, self._depth))
+
+    def stats(self):
+        """Queue depth and write latency (enqueue to write complete) per lane."""
+        with self._cond:
+            lanes = {}
+            for name, depth, lstats in zip(LANE_NAMES, self._depth, self._lane_stats):
+                lanes[name] = {
+                    "depth": depth,
+                    "written": lstats.written,
+                    "mean_ms": lstats.total_ns / lstats.written / 1e6 if lstats.written else 0.0,
+                    "max_ms": lstats.max_ns / 1e6,
+                    "last_ms": lstats.last_ns / 1e6,
+                }
+            return {
+                "lanes": lanes,
+                "deduped": self._deduped,
+                "bytes_written": self._bytes_written,
+                "errors": self._errors,
+            }
+
+    def format_stats(self):
+        stats = self.stats()
+        parts = [
+            f"{name}: depth={lane['depth']} written={lane['written']} "
+            f"mean={lane['mean_ms']:.1f}ms max={lane['max_ms']:.1f}ms"
+            for name, lane in stats["lanes"].items()
+        ]
+        parts.append(f"deduped={stats['deduped']} bytes={stats['bytes_written']} errors={stats['errors']}")
+        return " | ".join(parts)
@@ -1,18 +1,25 @@
 import io
 import os
 import threading
+import time
 import socket
 import msgpack
-import requests
 import sys
-from PIL import Image, ImageDraw, ImageFont, ImageOps
+from PIL import Image, ImageDraw, ImageFont
 from StreamDeck.DeviceManager import DeviceManager
 from StreamDeck.ImageHelpers import PILHelper
 from StreamDeck.Devices.StreamDeck import DialEventType, TouchscreenEventType
 
 # Add parent directory to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from config import UDP_IP, UDP_PORT, RECEIVE_PORT, CONFIG_NOTE
+from config import (
+    UDP_IP, UDP_PORT, RECEIVE_PORT, DECK_USB_BYTES_PER_SECOND, KEEP_ORIGINAL_IMAGES, DEBUG, CONFIG_NOTE
+)
+from state_store import StateStore
+from device_writer import DeviceWriter
+from image_downloads import DownloadManager
+from http_cache import HttpCache
+from image_pipeline import ScaledImageStore, load_scaled, open_limited
 
 print(CONFIG_NOTE)
 
@@ -21,18 +28,31 @@ FONT_PATH = "/usr/share/fonts/ttf/LiberationSans-Bold.ttf"
 
 exit_event = threading.Event()
 
-# Current layer of the interface. Starts at 1
-current_layer = 1
+# Shared state for keys, dials, touchscreen and the current layer (starts at 1).
+# Written from both the UDP thread and the StreamDeck callback thread, so every
+# change goes through the store and renderers work from a single snapshot.
+# key data:         {"label": str, "image": str}
+# dial data:        {"label": str, "value": ...} - can store relevant info
+# touchscreen data: {"lines": [...], ...} - store whatever textual info is needed
+state = StateStore(layers=(1, 2, 3), initial_layer=1)
 
-# Data structures for keys, dials, touchscreen
-# keys_data[layer][key] = {"label": str, "image": str}
-keys_data = {1: {}, 2: {}, 3: {}}
+# Rendered images keyed by entity versions, so unchanged keys are not redrawn
+# key_render_cache[key] = ((layer, version, is_pressed), native_image)
+key_render_cache = {}
+# touchscreen_render_cache["image"] = ((layer, touchscreen_version, dial_versions), native_image)
+touchscreen_render_cache = {}
 
-# dial_data[layer][dial] = {"label": str, "value": ...} - can store relevant info
-dial_data = {1: {}, 2: {}, 3: {}}
+# Single thread doing all USB writes to the deck, created once the deck is open.
+# Until then images are written directly.
+writer = None
 
-# touchscreen_data[layer] = {"lines": [...], ...} - store whatever textual info is needed
-touchscreen_data = {1: {}, 2: {}, 3: {}}
+# Image downloads run on their own worker pool so a slow URL never blocks the UDP thread
+# Previously fetched URLs are revalidated (ETag / Last-Modified) or served from disk
+http_cache = HttpCache(os.path.join(ASSETS_PATH, ".http_cache.json"))
+downloads = DownloadManager(max_workers=4, per_host_limit=2, cache=http_cache)
+
+# How often queue depth and write latency are printed in debug mode (seconds)
+WRITER_STATS_INTERVAL = 10
 
 # Default fallback image if none provided
 DEFAULT_IMAGE = "image_1.png"
@@ -46,18 +66,45 @@ MODE = "mode.png"
 
 EXIT = "exit1.png"
 
-def download_image(image_url, filename):
-    # Download the image from the provided URL
-    response = requests.get(image_url, stream=True)
-    response.raise_for_status()  # Raise an error if not successful
+# Height of the label bar at the bottom of each key
+LABEL_BAR_HEIGHT = 35
+
+def key_icon_size(deck):
+    key_width, key_height = deck.key_image_format()["size"]
+    return (key_width, key_height - LABEL_BAR_HEIGHT)
 
-    # Save the image to the Assets directory
+def download_image(image_url, filename):
+    # Download the image from the provided URL in the background and
+    # save it to the Assets directory. Returns a Future for the file path.
+    # Only a copy scaled to the key icon size is stored (plus the original
+    # in Assets/originals if KEEP_ORIGINAL_IMAGES is set).
     filepath = os.path.join(ASSETS_PATH, filename)
-    with open(filepath, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+    originals_dir = os.path.join(ASSETS_PATH, "originals") if KEEP_ORIGINAL_IMAGES else None
+    if filename == TOUCHSCREEN_BG:
+        # Touchscreen text is laid out in background pixels, so keep its size
+        store = ScaledImageStore(None, originals_dir=originals_dir)
+    else:
+        store = ScaledImageStore(key_icon_size(deck), originals_dir=originals_dir)
+    return downloads.download(image_url, filepath, callback=image_downloaded, store=store)
+
+def image_downloaded(image_url, filepath, error):
+    if error is not None:
+        print(f"Error downloading image: {error}")
+        return
     print(f"Image saved to {filepath}")
 
+    # The file changed but the key versions did not, so drop cached renders
+    # that use it and redraw whatever is on screen
+    filename = os.path.basename(filepath)
+    snap = state.snapshot()
+    for key in list(key_render_cache):
+        if get_key_image_and_label(snap.layer, key, snap)[1] == filename:
+            key_render_cache.pop(key, None)
+            update_key_image(deck, key, snap=snap)
+    if filename == TOUCHSCREEN_BG:
+        touchscreen_render_cache.clear()
+        update_touchscreen_image(deck, snap=snap)
+
 def udp_listener():
     """Listen for incoming messages to update keys, dials, touchscreen from another code."""
     udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -88,34 +135,34 @@ def process_udp_message(data):
 
         if target == "key":
             # Store the data for that key in the specified layer
-            keys_data[layer][index] = {"label": label, "image": image}
+            state.set_key(layer, index, {"label": label, "image": image})
             # If we are currently on that layer, update the key image
-            if current_layer == layer:
-                update_key_image(deck, index)
+            snap = state.snapshot()
+            if snap.layer == layer:
+                update_key_image(deck, index, snap=snap)
 
         elif target == "dial":
             # Store dial data
-            dial_data[layer][index] = {"label": label}  # Add more fields if needed
+            state.set_dial(layer, index, {"label": label})  # Add more fields if needed
             # If current layer matches, update touchscreen to reflect changes
-            if current_layer == layer:
-                update_touchscreen_image(deck)
+            snap = state.snapshot()
+            if snap.layer == layer:
+                update_touchscreen_image(deck, snap=snap)
 
         elif target == "touchscreen":
             # Could be multiple lines or just a label
             # For simplicity, store a dict of data. Could be {"lines": [...]} or just a "label"
-            touchscreen_data[layer] = data.get("touchscreen_data", {})
-            if current_layer == layer:
-                update_touchscreen_image(deck)
+            state.set_touchscreen(layer, data.get("touchscreen_data", {}))
+            snap = state.snapshot()
+            if snap.layer == layer:
+                update_touchscreen_image(deck, snap=snap)
                 
     elif msg_type == "update_image_link":
         image_url = data.get("image_url")
         filename = data.get("filename", "received_image.png")
         if image_url:
             print(f"Received image link: {image_url}")
-            try:
-                download_image(image_url, filename)
-            except Exception as e:
-                print(f"Error downloading image: {e}")
+            download_image(image_url, filename)
         else:
             print("No image_url provided in the message.")
 
@@ -127,10 +174,12 @@ def send_udp_message(data):
     udp_socket.sendto(encoded_data, (UDP_IP, UDP_PORT))
     udp_socket.close()
 
-def create_touchscreen_image(deck, layer):
-    # Create an image for the touchscreen using data from touchscreen_data[layer]
+def create_touchscreen_image(deck, layer, snap=None):
+    # Create an image for the touchscreen using the touchscreen data of the layer
+    if snap is None:
+        snap = state.snapshot()
     # Start with background image
-    tscreen = Image.open(os.path.join(ASSETS_PATH, TOUCHSCREEN_BG))
+    tscreen = open_limited(os.path.join(ASSETS_PATH, TOUCHSCREEN_BG))
     if tscreen.mode != 'RGB':
         tscreen = tscreen.convert('RGB')
     draw = ImageDraw.Draw(tscreen)
@@ -139,9 +188,9 @@ def create_touchscreen_image(deck, layer):
     except:
         font = ImageFont.load_default()
 
-    # touchscreen_data[layer] might have lines to display or other info
+    # The touchscreen data might have lines to display or other info
     # For example, if we have {"lines": ["Line1", "Line2"]}, we display them.
-    tdata = touchscreen_data.get(layer, {})
+    tdata = snap.touchscreen_entry(layer).data
     lines = tdata.get("lines", [])
     # Print lines centered
     y_offset = 10
@@ -156,11 +205,11 @@ def create_touchscreen_image(deck, layer):
         draw.text((x_pos, y_offset), line, font=font, fill="white")
         y_offset += text_height + 5
 
-    # Also, we might want to display dial info from dial_data[layer]
-    # For example: dial_data[layer][0]["label"] etc.
+    # Also, we might want to display dial info from the layer's dial data
+    # For example: snap.dial(layer, 0).data["label"] etc.
     # This is an example; adjust formatting as needed.
     # We'll just print dial labels in a row if present.
-    dial_labels = [dial_data[layer].get(i, {}).get("label", "") for i in range(4)]
+    dial_labels = [snap.dial(layer, i).data.get("label", "") for i in range(4)]
     y_bottom = tscreen.height - 200  # move text ~50px above the bottom of the original image
     x_coords = [120, 410, 750, 1060] # approximate positions for 4 dials
 
@@ -182,12 +231,50 @@ def create_touchscreen_image(deck, layer):
     native_image = img_byte_arr.getvalue()
     return native_image
 
-def update_touchscreen_image(deck):
-    native_image = create_touchscreen_image(deck, current_layer)
-    deck.set_touchscreen_image(native_image, 0, 0, 800, 100)
+def write_key_image(deck, key, image, priority=DeviceWriter.LAYER):
+    if writer is not None:
+        writer.set_key_image(key, image, priority)
+    else:
+        with deck:
+            deck.set_key_image(key, image)
+
+def write_touchscreen_image(deck, image, priority=DeviceWriter.LAYER):
+    if writer is not None:
+        writer.set_touchscreen_image(image, 0, 0, 800, 100, priority)
+    else:
+        with deck:
+            deck.set_touchscreen_image(image, 0, 0, 800, 100)
+
+def reset_deck(deck):
+    # Drop queued writes so nothing is drawn after the reset
+    if writer is not None:
+        writer.stop(drain=False)
+    with deck:
+        deck.reset()
 
-def get_key_image_and_label(layer, key):
-    kdata = keys_data.get(layer, {}).get(key, {})
+def update_touchscreen_image(deck, snap=None, priority=DeviceWriter.LAYER):
+    if snap is None:
+        snap = state.snapshot()
+    layer = snap.layer
+    cache_key = (
+        layer,
+        snap.touchscreen_entry(layer).version,
+        tuple(snap.dial(layer, i).version for i in range(4)),
+    )
+    cached = touchscreen_render_cache.get("image")
+    if cached and cached[0] == cache_key:
+        native_image = cached[1]
+    else:
+        native_image = create_touchscreen_image(deck, layer, snap)
+        touchscreen_render_cache["image"] = (cache_key, native_image)
+    write_touchscreen_image(deck, native_image, priority)
+
+def get_key_image_and_label(layer, key, snap=None):
+    if snap is None:
+        snap = state.snapshot()
+    return key_image_and_label_from_data(layer, key, snap.key(layer, key).data)
+
+def key_image_and_label_from_data(layer, key, kdata):
     label = kdata.get("label", "")
     image = kdata.get("image", DEFAULT_IMAGE)
 
@@ -218,21 +305,21 @@ def get_key_image_and_label(layer, key):
 
     return label, image
 
-def render_key_image(deck, icon_filename, font_filename, label_text, key, is_pressed=False):
-    global current_layer
+def render_key_image(deck, icon_filename, font_filename, label_text, key, is_pressed=False, layer=None):
+    if layer is None:
+        layer = state.current_layer
     icon_path = os.path.join(ASSETS_PATH, icon_filename)
     if not os.path.exists(icon_path):
         # If image not found, use a blank default image you have
         icon_path = os.path.join(ASSETS_PATH, DEFAULT_IMAGE)
     
-    # 1. Open the source image
-    icon = Image.open(icon_path).convert("RGBA")
-
-    # 2. Determine the final size for each key
+    # 1. Determine the final size for each key
     key_width, key_height = deck.key_image_format()["size"]  # Typically (100, 100)
 
-    # 3. Crop & scale the icon to exactly (key_width, key_height - 35) for the image portion
-    icon = ImageOps.fit(icon, (key_width, key_height - 35), Image.LANCZOS)
+    # 2.-3. Open the source image, cropped & scaled to exactly
+    # (key_width, key_height - 35) for the image portion. Large JPEGs are
+    # decoded at reduced scale and oversized images are refused.
+    icon = load_scaled(icon_path, key_icon_size(deck), mode="RGBA")
 
     # 4. Create a blank key image canvas
     image = PILHelper.create_key_image(deck)
@@ -241,14 +328,14 @@ def render_key_image(deck, icon_filename, font_filename, label_text, key, is_pre
     image.paste(icon, (0, 0))
     
     draw = ImageDraw.Draw(image)
-    green_bar_height = 35
+    green_bar_height = LABEL_BAR_HEIGHT
     
     label = label_text
     
     text_color = "white"
 
     # If we're on layer 2, toggle label from "X On" to "X Off"
-    if current_layer in [2, 3] and key not in [3, 7]:
+    if layer in [2, 3] and key not in [3, 7]:
         if label.endswith("On"):
             draw.rectangle(
                 [(0, key_height - green_bar_height), (key_width, key_height)],
@@ -285,48 +372,74 @@ def render_key_image(deck, icon_filename, font_filename, label_text, key, is_pre
     return PILHelper.to_native_key_format(deck, image)
 
 
-def update_key_image(deck, key, is_pressed=False):
-    label, img = get_key_image_and_label(current_layer, key)
-    image = render_key_image(deck, img, FONT_PATH, label, key, is_pressed)
-    with deck:
-        deck.set_key_image(key, image)
-
-def refresh_all_keys(deck):
+def update_key_image(deck, key, is_pressed=False, snap=None, priority=DeviceWriter.LAYER):
+    if snap is None:
+        snap = state.snapshot()
+    layer = snap.layer
+    cache_key = (layer, snap.key(layer, key).version, is_pressed)
+    cached = key_render_cache.get(key)
+    if cached and cached[0] == cache_key:
+        image = cached[1]
+    else:
+        label, img = get_key_image_and_label(layer, key, snap)
+        image = render_key_image(deck, img, FONT_PATH, label, key, is_pressed, layer=layer)
+        key_render_cache[key] = (cache_key, image)
+    write_key_image(deck, key, image, priority)
+
+def refresh_all_keys(deck, snap=None):
     # Only show relevant keys for the current layer
     # Actually all keys can be updated, but only some keys have meaningful data
     # The instructions don't say to hide keys, just that some keys have functions.
     # We'll update all keys with whatever data is available for the current layer.
+    # All keys are drawn from the same snapshot so a refresh is never torn.
+    if snap is None:
+        snap = state.snapshot()
     for k in range(deck.key_count()):
-        update_key_image(deck, k)
+        update_key_image(deck, k, snap=snap)
+
+def switch_layer(deck, layer):
+    state.set_layer(layer)
+    snap = state.snapshot()
+    refresh_all_keys(deck, snap)
+    update_touchscreen_image(deck, snap)
 
 def send_event_message(event_type, detail):
     # event_type: "key_event", "dial_event", "touchscreen_event"
     # detail: dict with info about the event
     # Add current layer info
-    detail["layer"] = current_layer
+    detail["layer"] = state.current_layer
     send_udp_message(detail)
 
-def key_change_callback(deck, key, state):
-    global current_layer
-    if state:
-        print(f"Key {key} pressed at layer {current_layer}.")
+def toggled_label(label):
+    # Toggle a label from "X On" to "X Off" and back
+    if label.endswith("On"):
+        return label[:-2] + "Off"
+    elif label.endswith("Off"):
+        return label[:-3] + "On"
+    return label + " On"
 
-        label, img = get_key_image_and_label(current_layer, key)
+def key_change_callback(deck, key, state_pressed):
+    if state_pressed:
+        snap = state.snapshot()
+        layer = snap.layer
+        print(f"Key {key} pressed at layer {layer}.")
+
+        label, img = get_key_image_and_label(layer, key, snap)
 
         # Default new_label to existing label so it's always defined
         new_label = label
 
         # If we're on layer 2, toggle label from "X On" to "X Off"
-        if current_layer in [2, 3] and key not in [3, 7]:
-            if label.endswith("On"):
-                new_label = label[:-2] + "Off"
-            elif label.endswith("Off"):
-                new_label = label[:-3] + "On"
-            else:
-                new_label = label + " On"
+        if layer in [2, 3] and key not in [3, 7]:
+            # Read-modify-write under the store lock so a UDP update to the
+            # same key in between is not lost
+            def toggle(kdata):
+                old_label, old_img = key_image_and_label_from_data(layer, key, kdata)
+                return {"label": toggled_label(old_label), "image": old_img}
 
-            keys_data[current_layer][key] = {"label": new_label, "image": img}
-            update_key_image(deck, key)
+            _, new_data = state.update_key(layer, key, toggle)
+            new_label = new_data["label"]
+            update_key_image(deck, key, priority=DeviceWriter.FEEDBACK)
 
         # Now new_label is always defined, we can safely reference it
         send_event = {
@@ -338,29 +451,21 @@ def key_change_callback(deck, key, state):
         send_event_message("key_event", send_event)
 
         # The rest of your layer-switch logic
-        if current_layer == 1:
+        if layer == 1:
             if key == 7:
-                current_layer = 2
-                refresh_all_keys(deck)
-                update_touchscreen_image(deck)
-        elif current_layer == 2:
+                switch_layer(deck, 2)
+        elif layer == 2:
             if key == 7:
-                with deck:
-                    deck.reset()
+                reset_deck(deck)
                 exit_event.set()
             elif key == 3:
-                current_layer = 3
-                refresh_all_keys(deck)
-                update_touchscreen_image(deck)
-        elif current_layer == 3:
+                switch_layer(deck, 3)
+        elif layer == 3:
             if key == 7:
-                with deck:
-                    deck.reset()
+                reset_deck(deck)
                 exit_event.set()
             elif key == 3:
-                current_layer = 2
-                refresh_all_keys(deck)
-                update_touchscreen_image(deck)
+                switch_layer(deck, 2)
 
 def dial_change_callback(deck, dial, event, value):
     # Dials are general, updated via UDP. Just send events with layer info.
@@ -374,7 +479,7 @@ def dial_change_callback(deck, dial, event, value):
             "value": value
         }
         send_event_message("dial_event", send_event)
-        update_touchscreen_image(deck)
+        update_touchscreen_image(deck, priority=DeviceWriter.FEEDBACK)
 
     elif event == DialEventType.PUSH:
         # Toggles on press down if needed. This depends on UDP logic.
@@ -391,7 +496,7 @@ def dial_change_callback(deck, dial, event, value):
             "value": value
         }
         send_event_message("dial_event", send_event)
-        update_touchscreen_image(deck)
+        update_touchscreen_image(deck, priority=DeviceWriter.FEEDBACK)
 
 def touchscreen_event_callback(deck, event, value):
     # If touchscreen is touched, send event with layer info
@@ -417,6 +522,9 @@ if __name__ == "__main__":
 
         deck.set_brightness(50)
 
+        # From here on all image writes go through the writer thread
+        writer = DeviceWriter(deck, bytes_per_second=DECK_USB_BYTES_PER_SECOND).start()
+
         # Initially in layer 1
         refresh_all_keys(deck)
         update_touchscreen_image(deck)
@@ -431,12 +539,19 @@ if __name__ == "__main__":
 
         print("Listening for events. Press Ctrl+C to exit.")
         try:
+            next_stats = time.monotonic() + WRITER_STATS_INTERVAL
             while not exit_event.is_set():
                 exit_event.wait(0.1)
+                if DEBUG and time.monotonic() >= next_stats:
+                    print(f"Deck writer: {writer.format_stats()}")
+                    next_stats += WRITER_STATS_INTERVAL
         except KeyboardInterrupt:
             print("Keyboard interrupt received. Exiting...")
             exit_event.set()
 
+        print(f"Deck writer: {writer.format_stats()}")
+        writer.stop(drain=False)
+        downloads.shutdown(wait=False)
         with deck:
             deck.reset()
             deck.close()
\ No newline at end of file
@@ -0,0 +1,247 @@
+"""
+Persistent HTTP cache for downloaded Stream Deck images.
+
+Every update_image_link message used to download the full image again. With an
+HttpCache attached to the DownloadManager, a URL that was fetched before is
+handled like a browser would:
+
+- Still fresh according to Cache-Control max-age / Expires (or the usual 10%
+  of Last-Modified age heuristic): no network at all.
+- Stale, or marked no-cache: a conditional GET with If-None-Match /
+  If-Modified-Since. A 304 only refreshes the cache metadata.
+- Otherwise the image is downloaded and the validators are stored.
+- no-store responses are never added to the cache.
+
+The index is a JSON file mapping each URL to its local asset, the SHA-256
+digest of that asset as stored, and the validators. Hits are checked against
+the digest, so an asset overwritten by another download is fetched again
+instead of being served wrongly. A URL written by a store with a variant
+(e.g. scaled to key size) has one entry per variant, keyed "<url> <variant>",
+so a key icon is never served as a touchscreen background.
+
+Usage:
+    cache = HttpCache(os.path.join(ASSETS_PATH, ".http_cache.json"))
+    downloads = DownloadManager(cache=cache)
+"""
+
+import email.utils
+import hashlib
+import json
+import os
+import threading
+import time
+
+from image_downloads import CHUNK_SIZE, copy_file, store_variant, temp_path, write_chunks
+
+# Upper bound for heuristic freshness when the server sends no explicit lifetime
+MAX_HEURISTIC_FRESHNESS = 24 * 60 * 60
+
+FRESH = "fresh"
+REVALIDATED = "revalidated"
+DOWNLOADED = "downloaded"
+
+
+def parse_cache_control(value):
+    """Parse a Cache-Control header into {directive: value or True}."""
+    directives = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') if arg else True
+    return directives
+
+
+def _http_date(value):
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers, now=None):
+    """Seconds a response with these headers stays fresh (0 means always revalidate)."""
+    now = time.time() if now is None else now
+    cache_control = parse_cache_control(headers.get("Cache-Control"))
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        return 0
+
+    age = 0
+    try:
+        age = int(headers.get("Age", 0))
+    except ValueError:
+        pass
+
+    max_age = cache_control.get("max-age")
+    if max_age not in (None, True):
+        try:
+            return max(int(max_age) - age, 0)
+        except ValueError:
+            return 0
+
+    date = _http_date(headers.get("Date")) or now
+    expires = headers.get("Expires")
+    if expires is not None:
+        expires_at = _http_date(expires)
+        # An invalid Expires value means "already expired"
+        return max(expires_at - date, 0) if expires_at else 0
+
+    last_modified = _http_date(headers.get("Last-Modified"))
+    if last_modified:
+        return min(max((date - last_modified) / 10, 0), MAX_HEURISTIC_FRESHNESS)
+    return 0
+
+
+def cache_key(url, store=write_chunks):
+    """Index key of url as written by store."""
+    variant = store_variant(store)
+    return url if variant is None else f"{url} {variant}"
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HttpCache:
+    """URL (and store variant) -> local asset index with ETag / Last-Modified revalidation."""
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._index = self._load()
+        self.hits = 0
+        self.revalidated = 0
+        self.downloaded = 0
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable HTTP cache index {self.index_path}: {e}")
+            return {}
+
+    def _save_locked(self):
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = temp_path(self.index_path)
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self._index, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.index_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def entry(self, url, store=write_chunks):
+        with self._lock:
+            entry = self._index.get(cache_key(url, store))
+            return dict(entry) if entry else None
+
+    def stats(self):
+        return {"hits": self.hits, "revalidated": self.revalidated, "downloaded": self.downloaded}
+
+    def _valid_asset(self, entry):
+        # The cached asset must still exist and hold the bytes we downloaded
+        path = entry.get("path")
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            if file_digest(path) != entry.get("digest"):
+                return None
+        except OSError:
+            return None
+        return path
+
+    def _place(self, source, filepath):
+        if os.path.abspath(source) != os.path.abspath(filepath):
+            copy_file(source, filepath)
+
+    def fetch(self, session, url, filepath, timeout=None, store=write_chunks):
+        """
+        Make sure the image at url is stored in filepath, using the network
+        only when needed. Returns FRESH, REVALIDATED or DOWNLOADED.
+        """
+        key = cache_key(url, store)
+        entry = self.entry(url, store)
+        cached_path = self._valid_asset(entry) if entry else None
+
+        headers = {}
+        if cached_path:
+            if time.time() < entry.get("fresh_until", 0):
+                self._place(cached_path, filepath)
+                self._remember(key, dict(entry, path=filepath))
+                self._count("hits")
+                return FRESH
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with session.get(url, stream=True, timeout=timeout, headers=headers) as response:
+            now = time.time()
+            if response.status_code == 304 and cached_path:
+                self._place(cached_path, filepath)
+                updated = dict(entry, path=filepath, fetched_at=now)
+                # A 304 may carry new validators or a new lifetime
+                if response.headers.get("ETag"):
+                    updated["etag"] = response.headers["ETag"]
+                if response.headers.get("Last-Modified"):
+                    updated["last_modified"] = response.headers["Last-Modified"]
+                merged_headers = {
+                    "Cache-Control": response.headers.get("Cache-Control", entry.get("cache_control")),
+                    "Expires": response.headers.get("Expires"),
+                    "Date": response.headers.get("Date"),
+                    "Age": response.headers.get("Age", 0),
+                    "Last-Modified": updated.get("last_modified"),
+                }
+                updated["fresh_until"] = now + freshness_lifetime(
+                    {k: v for k, v in merged_headers.items() if v is not None}, now
+                )
+                self._remember(key, updated)
+                self._count("revalidated")
+                return REVALIDATED
+
+            response.raise_for_status()  # Raise an error if not successful
+
+            store(response.iter_content(chunk_size=CHUNK_SIZE), filepath)
+
+            cache_control = response.headers.get("Cache-Control")
+            if "no-store" in parse_cache_control(cache_control):
+                self._forget(key)
+            else:
+                self._remember(key, {
+                    "path": filepath,
+                    "digest": file_digest(filepath),
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "cache_control": cache_control,
+                    "fetched_at": now,
+                    "fresh_until": now + freshness_lifetime(response.headers, now),
+                })
+            self._count("downloaded")
+            return DOWNLOADED
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._index[key] = entry
+            self._save_locked()
+
+    def _forget(self, key):
+        with self._lock:
+            if self._index.pop(key, None) is not None:
+                self._save_locked()
@@ -0,0 +1,248 @@
+"""
+Asynchronous image downloads for the Stream Deck presets.
+
+download_image used to call requests.get inside the UDP listener thread, so a
+slow URL blocked every other message, and each download opened a new TCP
+connection. DownloadManager moves downloads off that thread:
+
+- One shared requests.Session, so connections to the same host are kept alive
+  and reused.
+- A bounded number of worker threads, plus a limit on concurrent downloads per
+  host so one slow server cannot take every worker.
+- Requests for a URL that is already downloading with the same kind of store
+  are merged into the running download. If they name a different file, the
+  result is copied there, unless another download is writing or queued to
+  write that file; then the request is queued behind it as a new download.
+- Files are written to a unique temporary file next to the target and moved
+  into place, so a renderer never opens a half-written image.
+- Downloads that write the same file (different URLs with the same file name)
+  run one after another, in the order they were requested, so the last
+  request wins.
+- Completion callbacks (called as callback(url, filepath, error)) let the
+  caller re-render keys once the image is on disk.
+- An optional HttpCache (see http_cache.py) skips or revalidates downloads
+  of URLs that were fetched before.
+- A store callable (store(chunks, filepath)) decides how the body is written,
+  e.g. image_pipeline.ScaledImageStore keeps only a scaled copy. A store that
+  changes the body names what it writes in a variant attribute; downloads and
+  cache entries are only shared between stores with the same variant.
+
+Usage:
+    downloads = DownloadManager(max_workers=4, per_host_limit=2)
+    future = downloads.download(url, os.path.join(ASSETS_PATH, "logo.png"), callback=on_done)
+    future.result()   # optional, returns the file path
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CHUNK_SIZE = 8192
+
+
+def temp_path(filepath):
+    """New empty temporary file in the folder of filepath, to be moved over it with os.replace."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or ".",
+                                    prefix=os.path.basename(filepath) + ".", suffix=".part")
+    os.close(fd)
+    return tmp_path
+
+
+def copy_file(source, filepath):
+    """Atomically replace filepath with a copy of source."""
+    tmp_path = temp_path(filepath)
+    try:
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def store_variant(store):
+    """What store writes for a response body, as a string; None for the body unchanged."""
+    return getattr(store, "variant", None)
+
+
+def write_chunks(chunks, filepath):
+    """Default store: write the response body unchanged, atomically."""
+    tmp_path = temp_path(filepath)
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class _Job:
+    __slots__ = ("key", "url", "host", "filepath", "store", "extra_paths", "callbacks", "future", "running")
+
+    def __init__(self, key, url, host, filepath, store):
+        self.key = key
+        self.url = url
+        self.host = host
+        self.filepath = filepath
+        self.store = store
+        self.extra_paths = []
+        self.callbacks = []
+        self.future = Future()
+        self.running = False
+
+    def paths(self):
+        return [self.filepath] + self.extra_paths
+
+
+class DownloadManager:
+    """Bounded worker pool for image downloads with per-host limits and URL + store variant dedupe."""
+
+    def __init__(self, max_workers=4, per_host_limit=2, timeout=10, session=None, cache=None):
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.cache = cache
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-download")
+        self._lock = threading.Lock()
+        self._in_flight = {}  # (url, store variant) -> _Job (queued or running)
+        self._writing = {}  # filepath -> running _Job that writes it
+        self._queued = deque()
+        self._running = 0
+        self._running_per_host = {}
+        self._closed = False
+
+    def download(self, url, filepath, callback=None, store=None):
+        """
+        Queue a download of url into filepath and return a Future for the path.
+        If url is already being downloaded into the same store variant, the
+        existing download is reused.
+        """
+        store = store or write_chunks
+        key = (url, store_variant(store))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("DownloadManager is shut down")
+            job = self._in_flight.get(key)
+            if job is not None and filepath not in job.paths():
+                if self._other_writer_locked(filepath, job):
+                    # Another download is writing or will write that file: queue behind it instead
+                    job = None
+                else:
+                    job.extra_paths.append(filepath)
+                    if job.running:
+                        self._writing[filepath] = job
+            if job is None:
+                job = _Job(key, url, urlsplit(url).netloc, filepath, store)
+                self._in_flight[key] = job
+                self._queued.append(job)
+            if callback is not None:
+                job.callbacks.append((filepath, callback))
+            self._dispatch_locked()
+        return job.future
+
+    def pending(self):
+        """Number of downloads queued or running."""
+        with self._lock:
+            return len(self._in_flight)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=wait)
+        self.session.close()
+
+    def _other_writer_locked(self, filepath, job):
+        """Whether a job other than job is writing filepath or queued to write it."""
+        if self._writing.get(filepath, job) is not job:
+            return True
+        return any(other is not job and filepath in other.paths() for other in self._queued)
+
+    def _dispatch_locked(self):
+        # Start queued jobs while there are free workers and their host is under its limit.
+        # A job waits while its files are being written, and later jobs for those files wait behind it.
+        if self._running >= self.max_workers or not self._queued:
+            return
+        skipped = deque()
+        waiting_paths = set()
+        while self._queued and self._running < self.max_workers:
+            job = self._queued.popleft()
+            paths = job.paths()
+            if (self._running_per_host.get(job.host, 0) >= self.per_host_limit
+                    or any(path in self._writing or path in waiting_paths for path in paths)):
+                skipped.append(job)
+                waiting_paths.update(paths)
+                continue
+            job.running = True
+            for path in paths:
+                self._writing[path] = job
+            self._running += 1
+            self._running_per_host[job.host] = self._running_per_host.get(job.host, 0) + 1
+            self._executor.submit(self._run, job)
+        skipped.extend(self._queued)
+        self._queued = skipped
+
+    def _run(self, job):
+        error = None
+        try:
+            self._fetch(job.url, job.filepath, job.store)
+        except Exception as e:
+            error = e
+
+        with self._lock:
+            # No more paths or callbacks can be attached once the job is removed
+            if self._in_flight.get(job.key) is job:
+                del self._in_flight[job.key]
+            extra_paths = list(job.extra_paths)
+            callbacks = list(job.callbacks)
+
+        if error is None:
+            try:
+                for path in extra_paths:
+                    copy_file(job.filepath, path)
+            except Exception as e:
+                error = e
+
+        with self._lock:
+            for path in [job.filepath] + extra_paths:
+                if self._writing.get(path) is job:
+                    del self._writing[path]
+            self._running -= 1
+            self._running_per_host[job.host] -= 1
+            if not self._running_per_host[job.host]:
+                del self._running_per_host[job.host]
+            self._dispatch_locked()
+
+        if error is None:
+            job.future.set_result(job.filepath)
+        else:
+            job.future.set_exception(error)
+
+        for filepath, callback in callbacks:
+            try:
+                callback(job.url, filepath, error)
+            except Exception as e:
+                print(f"Error in download callback for {job.url}: {e}")
+
+    def _fetch(self, url, filepath, store):
+        if self.cache is not None:
+            self.cache.fetch(self.session, url, filepath, timeout=self.timeout, store=store)
+            return
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()  # Raise an error if not successful
+            store(response.iter_content(chunk_size=CHUNK_SIZE), filepath)
@@ -0,0 +1,172 @@
+"""
+Image loading for the Stream Deck presets that never keeps full-size images.
+
+Images pushed by the graphics team can be many megapixels, but a key only
+shows about 120x85 pixels. This module:
+
+- Refuses images over a hard pixel limit before decoding them (decompression
+  bomb guard). Image.open only reads the header, so the check is cheap.
+- Uses Image.draft so JPEGs are decoded at 1/2, 1/4 or 1/8 scale straight
+  from the file, and a reducing_gap resize for other formats.
+- Crops and scales straight to the target size.
+
+ScaledImageStore plugs into DownloadManager / HttpCache as the store for a
+download. It buffers the response in a spooled temp file and writes only the
+scaled image into ASSETS_PATH. Optionally it keeps the original in a separate
+folder.
+
+Usage:
+    icon = load_scaled(path, (120, 85), mode="RGBA")
+    store = ScaledImageStore((120, 85))
+    downloads.download(url, filepath, store=store)
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+from PIL import Image
+
+from image_downloads import temp_path
+
+# Add repo root to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config import MAX_IMAGE_PIXELS
+
+# Downloads up to this size are buffered in memory, larger ones in a temp file
+SPOOL_BYTES = 4 * 1024 * 1024
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an image has more pixels than allowed."""
+
+
+def open_limited(fp, max_pixels=None):
+    """Open an image lazily and check its pixel count before anything is decoded."""
+    max_pixels = MAX_IMAGE_PIXELS if max_pixels is None else max_pixels
+    image = Image.open(fp)
+    width, height = image.size
+    if max_pixels and width * height > max_pixels:
+        image.close()
+        raise ImageTooLarge(f"Image is {width}x{height} ({width * height} pixels), limit is {max_pixels}")
+    return image
+
+
+def _fit_box(src_size, dst_size):
+    # Centered crop of src with the aspect ratio of dst, like ImageOps.fit
+    src_w, src_h = src_size
+    dst_w, dst_h = dst_size
+    if src_w * dst_h > src_h * dst_w:
+        crop_w = src_h * dst_w / dst_h
+        left = (src_w - crop_w) / 2
+        return (left, 0, left + crop_w, src_h)
+    crop_h = src_w * dst_h / dst_w
+    top = (src_h - crop_h) / 2
+    return (0, top, src_w, top + crop_h)
+
+
+def scale_image(image, size, mode=None):
+    """Crop and scale an opened (possibly not yet decoded) image to exactly size."""
+    if mode is None:
+        mode = "RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB"
+
+    # JPEG: decode at reduced scale, still at least as large as size
+    image.draft("RGB", size)
+    if image.mode not in (mode, "RGB", "RGBA", "L"):
+        image = image.convert("RGBA" if mode == "RGBA" else "RGB")
+
+    box = _fit_box(image.size, size)
+    image = image.resize(size, Image.LANCZOS, box=box, reducing_gap=3.0)
+    if image.mode != mode:
+        image = image.convert(mode)
+    return image
+
+
+def load_scaled(fp, size, mode=None, max_pixels=None):
+    """Open fp (path or file object) and return it cropped and scaled to size."""
+    image = open_limited(fp, max_pixels)
+    try:
+        return scale_image(image, size, mode)
+    finally:
+        image.close()
+
+
+def _save_format(filepath, mode):
+    fmt = Image.registered_extensions().get(os.path.splitext(filepath)[1].lower(), "PNG")
+    if fmt == "JPEG" and mode == "RGBA":
+        return fmt, "RGB"
+    if fmt not in ("PNG", "JPEG", "BMP", "GIF", "WEBP"):
+        return "PNG", mode
+    return fmt, mode
+
+
+def save_image(image, filepath):
+    """Atomically save image, in the format its file extension asks for."""
+    fmt, mode = _save_format(filepath, image.mode)
+    if image.mode != mode:
+        image = image.convert(mode)
+    tmp_path = temp_path(filepath)
+    try:
+        image.save(tmp_path, format=fmt)
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _copy_stream(fp, filepath):
+    tmp_path = temp_path(filepath)
+    try:
+        with open(tmp_path, "wb") as f:
+            shutil.copyfileobj(fp, f)
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ScaledImageStore:
+    """
+    Download store that writes images scaled to size (or, with size=None, only
+    checked against the pixel limit and stored unchanged).
+    """
+
+    def __init__(self, size, mode=None, max_pixels=None, originals_dir=None):
+        self.size = tuple(size) if size else None
+        self.mode = mode
+        self.max_pixels = max_pixels
+        self.originals_dir = originals_dir
+
+    @property
+    def variant(self):
+        """What this store writes, for download and cache keys (see image_downloads.store_variant)."""
+        if self.size is None:
+            return "checked"
+        return f"scaled {self.size[0]}x{self.size[1]} {self.mode or 'auto'}"
+
+    def __call__(self, chunks, filepath):
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+            for chunk in chunks:
+                spool.write(chunk)
+            spool.seek(0)
+            self.store_file(spool, filepath)
+
+    def store_file(self, fp, filepath):
+        """Store the image read from file object fp into filepath."""
+        image = open_limited(fp, self.max_pixels)
+        try:
+            if self.originals_dir:
+                os.makedirs(self.originals_dir, exist_ok=True)
+                fp.seek(0)
+                _copy_stream(fp, os.path.join(self.originals_dir, os.path.basename(filepath)))
+
+            if self.size is None:
+                # Keep the encoded bytes as they are
+                fp.seek(0)
+                _copy_stream(fp, filepath)
+                return
+
+            save_image(scale_image(image, self.size, self.mode), filepath)
+        finally:
+            image.close()
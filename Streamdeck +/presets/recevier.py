@@ -1,12 +1,14 @@
 import os
 import socket
 import msgpack
-import requests
 import sys
 
 # Add parent directory to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from config import RECEIVE_PORT, CONFIG_NOTE
+from config import RECEIVE_PORT, KEEP_ORIGINAL_IMAGES, CONFIG_NOTE
+from image_downloads import DownloadManager
+from image_pipeline import ScaledImageStore
+from http_cache import HttpCache
 
 print(CONFIG_NOTE)
 
@@ -18,17 +20,31 @@ ASSETS_PATH = os.path.join(os.path.dirname(__file__), "Assets")
 if not os.path.exists(ASSETS_PATH):
     os.makedirs(ASSETS_PATH)
 
-def download_image(image_url, filename):
-    # Download the image from the provided URL
-    response = requests.get(image_url, stream=True)
-    response.raise_for_status()  # Raise an error if not successful
+# Downloads run in the background so the listener keeps receiving messages
+# Previously fetched URLs are revalidated (ETag / Last-Modified) or served from disk
+http_cache = HttpCache(os.path.join(ASSETS_PATH, ".http_cache.json"))
+downloads = DownloadManager(max_workers=4, per_host_limit=2, cache=http_cache)
+
+# Stream Deck + key (120x120) minus the 35px label bar drawn by the presets
+KEY_ICON_SIZE = (120, 85)
+
+# Images are stored scaled to the key icon size, originals only if asked for
+image_store = ScaledImageStore(
+    KEY_ICON_SIZE,
+    originals_dir=os.path.join(ASSETS_PATH, "originals") if KEEP_ORIGINAL_IMAGES else None,
+)
 
-    # Save the image to the Assets directory
+def download_image(image_url, filename):
+    # Download the image from the provided URL and save it to the Assets
+    # directory. Returns a Future for the file path.
     filepath = os.path.join(ASSETS_PATH, filename)
-    with open(filepath, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-    print(f"Image saved to {filepath}")
+    return downloads.download(image_url, filepath, callback=image_downloaded, store=image_store)
+
+def image_downloaded(image_url, filepath, error):
+    if error is not None:
+        print(f"Error downloading {image_url}: {error}")
+    else:
+        print(f"Image saved to {filepath}")
 
 def start_server():
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
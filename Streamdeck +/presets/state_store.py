@@ -0,0 +1,159 @@
+"""
+Versioned state store for the Stream Deck presets.
+
+The UDP listener thread and the StreamDeck callback thread both change what is
+shown on the deck. Instead of sharing plain dicts, all key, dial, touchscreen
+and layer state lives in a StateStore:
+
+- Writers take a short lock, copy only the layer they touch and publish a new
+  immutable Snapshot (copy-on-write). Untouched layers are shared.
+- Readers call snapshot() and get a consistent view without any locking, so a
+  render never sees half of an update.
+- Every write bumps a global counter and stamps it on the entity it changed.
+  Per-entity versions therefore increase monotonically and can be used as
+  cache keys instead of comparing dict contents.
+
+Usage:
+    state = StateStore(layers=(1, 2, 3))
+    state.set_key(1, 0, {"label": "Cam 1", "image": "cam.png"})
+    snap = state.snapshot()
+    entry = snap.key(1, 0)   # Entry(version=1, data={...})
+"""
+
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+# A single stored value and the version it was written at
+Entry = namedtuple("Entry", ["version", "data"])
+
+_EMPTY = MappingProxyType({})
+EMPTY_ENTRY = Entry(0, _EMPTY)
+
+
+def freeze(value):
+    """Return a read-only copy of value (dicts become mappingproxies, lists become tuples)."""
+    if isinstance(value, dict) or isinstance(value, MappingProxyType):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class Snapshot:
+    """Immutable view of the whole deck state at one version."""
+
+    __slots__ = ("version", "layer", "layer_version", "keys", "dials", "touchscreen")
+
+    def __init__(self, version, layer, layer_version, keys, dials, touchscreen):
+        self.version = version
+        self.layer = layer
+        self.layer_version = layer_version
+        # keys/dials: {layer: {index: Entry}}, touchscreen: {layer: Entry}
+        self.keys = keys
+        self.dials = dials
+        self.touchscreen = touchscreen
+
+    def key(self, layer, index):
+        return self.keys.get(layer, _EMPTY).get(index, EMPTY_ENTRY)
+
+    def dial(self, layer, index):
+        return self.dials.get(layer, _EMPTY).get(index, EMPTY_ENTRY)
+
+    def touchscreen_entry(self, layer):
+        return self.touchscreen.get(layer, EMPTY_ENTRY)
+
+    def __repr__(self):
+        return f"Snapshot(version={self.version}, layer={self.layer})"
+
+
+class StateStore:
+    """Thread-safe copy-on-write store for keys, dials, touchscreen and the current layer."""
+
+    def __init__(self, layers=(1, 2, 3), initial_layer=1):
+        self._layers = tuple(layers)
+        if initial_layer not in self._layers:
+            raise ValueError(f"Initial layer {initial_layer} is not one of {self._layers}")
+
+        self._lock = threading.Lock()
+        self._version = 0
+
+        empty_layers = MappingProxyType({layer: _EMPTY for layer in self._layers})
+        empty_touch = MappingProxyType({layer: EMPTY_ENTRY for layer in self._layers})
+        self._snapshot = Snapshot(0, initial_layer, 0, empty_layers, empty_layers, empty_touch)
+
+    @property
+    def layers(self):
+        return self._layers
+
+    def snapshot(self):
+        # Reading a single attribute is atomic, so no lock is needed here
+        return self._snapshot
+
+    @property
+    def current_layer(self):
+        return self._snapshot.layer
+
+    def _check_layer(self, layer):
+        if layer not in self._layers:
+            raise ValueError(f"Unknown layer {layer}, expected one of {self._layers}")
+
+    def _publish(self, **changes):
+        # Must be called with self._lock held
+        old = self._snapshot
+        fields = {name: getattr(old, name) for name in Snapshot.__slots__}
+        fields.update(changes)
+        fields["version"] = self._version
+        self._snapshot = Snapshot(**fields)
+        return self._version
+
+    def _with_entry(self, table, layer, index, data):
+        # Copy the outer mapping and the one layer being changed, share the rest
+        layer_map = dict(table[layer])
+        layer_map[index] = Entry(self._version, freeze(data))
+        new_table = dict(table)
+        new_table[layer] = MappingProxyType(layer_map)
+        return MappingProxyType(new_table)
+
+    def set_key(self, layer, index, data):
+        """Store data for a key and return its new version."""
+        self._check_layer(layer)
+        with self._lock:
+            self._version += 1
+            keys = self._with_entry(self._snapshot.keys, layer, index, data)
+            return self._publish(keys=keys)
+
+    def update_key(self, layer, index, func):
+        """Atomically replace a key's data with func(current_data); returns (version, new_data)."""
+        self._check_layer(layer)
+        with self._lock:
+            current = self._snapshot.key(layer, index).data
+            new_data = func(current)
+            self._version += 1
+            keys = self._with_entry(self._snapshot.keys, layer, index, new_data)
+            version = self._publish(keys=keys)
+            return version, self._snapshot.key(layer, index).data
+
+    def set_dial(self, layer, index, data):
+        """Store data for a dial and return its new version."""
+        self._check_layer(layer)
+        with self._lock:
+            self._version += 1
+            dials = self._with_entry(self._snapshot.dials, layer, index, data)
+            return self._publish(dials=dials)
+
+    def set_touchscreen(self, layer, data):
+        """Replace the touchscreen data for a layer and return its new version."""
+        self._check_layer(layer)
+        with self._lock:
+            self._version += 1
+            touchscreen = dict(self._snapshot.touchscreen)
+            touchscreen[layer] = Entry(self._version, freeze(data))
+            return self._publish(touchscreen=MappingProxyType(touchscreen))
+
+    def set_layer(self, layer):
+        """Switch the current layer and return the new version."""
+        self._check_layer(layer)
+        with self._lock:
+            self._version += 1
+            return self._publish(layer=layer, layer_version=self._version)
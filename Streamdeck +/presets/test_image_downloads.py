@@ -0,0 +1,170 @@
+"""Tests for DownloadManager and HttpCache against a local HTTP server."""
+
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from http_cache import HttpCache
+from image_downloads import DownloadManager
+from image_pipeline import ScaledImageStore
+
+# Bodies are sent in pieces this far apart, so concurrent downloads overlap
+CHUNK_DELAY = 0.02
+
+
+def png_bytes(color, size=(64, 48)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+BODIES = {
+    "/a/logo.png": png_bytes("red"),
+    "/b/logo.png": png_bytes("blue"),
+    "/c/logo.png": png_bytes("green"),
+}
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = BODIES.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        step = len(body) // 4 + 1
+        for i in range(0, len(body), step):
+            self.wfile.write(body[i:i + step])
+            self.wfile.flush()
+            time.sleep(CHUNK_DELAY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def leftovers(directory):
+    return [name for name in os.listdir(directory) if name.endswith(".part")]
+
+
+def test_urls_with_the_same_file_name_are_written_in_order(tmp_path, server):
+    filepath = str(tmp_path / "logo.png")
+    downloads = DownloadManager(max_workers=4, per_host_limit=4)
+    try:
+        first = downloads.download(f"http://127.0.0.1:{server}/a/logo.png", filepath)
+        second = downloads.download(f"http://127.0.0.1:{server}/b/logo.png", filepath)
+        assert first.result(5) == filepath
+        assert second.result(5) == filepath
+    finally:
+        downloads.shutdown()
+    with open(filepath, "rb") as f:
+        assert f.read() == BODIES["/b/logo.png"]
+    assert leftovers(tmp_path) == []
+
+
+def test_later_request_does_not_overtake_a_queued_one(tmp_path, server):
+    # 127.0.0.1 and localhost count as different hosts; b waits for the 127.0.0.1 limit, c must wait for b
+    filepath = str(tmp_path / "logo.png")
+    downloads = DownloadManager(max_workers=4, per_host_limit=1)
+    try:
+        futures = [
+            downloads.download(f"http://127.0.0.1:{server}/a/logo.png", str(tmp_path / "other.png")),
+            downloads.download(f"http://127.0.0.1:{server}/b/logo.png", filepath),
+            downloads.download(f"http://localhost:{server}/c/logo.png", filepath),
+        ]
+        for future in futures:
+            future.result(5)
+    finally:
+        downloads.shutdown()
+    with open(filepath, "rb") as f:
+        assert f.read() == BODIES["/c/logo.png"]
+
+
+@pytest.mark.parametrize("running", [True, False])
+def test_url_requested_again_for_a_queued_file_goes_last(tmp_path, server, running):
+    # a/logo.png is first downloaded to other.png, then b/logo.png and a/logo.png are requested for logo.png:
+    # a must not be attached to the earlier a download (running, or queued ahead of b), or b would win
+    filepath = str(tmp_path / "logo.png")
+    downloads = DownloadManager(max_workers=1, per_host_limit=1)
+    try:
+        futures = []
+        if not running:
+            futures.append(downloads.download(f"http://127.0.0.1:{server}/c/logo.png", str(tmp_path / "c.png")))
+        futures += [
+            downloads.download(f"http://127.0.0.1:{server}/a/logo.png", str(tmp_path / "other.png")),
+            downloads.download(f"http://127.0.0.1:{server}/b/logo.png", filepath),
+            downloads.download(f"http://127.0.0.1:{server}/a/logo.png", filepath),
+        ]
+        for future in futures:
+            future.result(5)
+    finally:
+        downloads.shutdown()
+    with open(filepath, "rb") as f:
+        assert f.read() == BODIES["/a/logo.png"]
+    with open(tmp_path / "other.png", "rb") as f:
+        assert f.read() == BODIES["/a/logo.png"]
+
+
+def test_cached_scaled_downloads_to_the_same_file(tmp_path, server):
+    filepath = str(tmp_path / "logo.png")
+    cache = HttpCache(str(tmp_path / ".http_cache.json"))
+    downloads = DownloadManager(max_workers=4, per_host_limit=4, cache=cache)
+    store = ScaledImageStore((32, 24), originals_dir=str(tmp_path / "originals"))
+    try:
+        futures = [downloads.download(f"http://127.0.0.1:{server}{path}", filepath, store=store)
+                   for path in ("/a/logo.png", "/b/logo.png", "/c/logo.png")]
+        for future in futures:
+            future.result(5)
+    finally:
+        downloads.shutdown()
+    with Image.open(filepath) as image:
+        assert image.size == (32, 24)
+        assert image.convert("RGB").getpixel((0, 0)) == (0, 128, 0)
+    with open(tmp_path / "originals" / "logo.png", "rb") as f:
+        assert f.read() == BODIES["/c/logo.png"]
+    assert cache.stats()["downloaded"] == 3
+    assert leftovers(tmp_path) == [] and leftovers(tmp_path / "originals") == []
+
+
+def test_store_variants_of_one_url_are_kept_apart(tmp_path, server):
+    url = f"http://127.0.0.1:{server}/a/logo.png"
+    key_path = str(tmp_path / "key.png")
+    background_path = str(tmp_path / "background.png")
+    cache = HttpCache(str(tmp_path / ".http_cache.json"))
+    downloads = DownloadManager(max_workers=4, per_host_limit=4, cache=cache)
+    key_store = ScaledImageStore((32, 24))
+    background_store = ScaledImageStore(None)
+    try:
+        # At the same time (one download each, not merged), then again from the cache
+        for _ in range(2):
+            futures = [downloads.download(url, key_path, store=key_store),
+                       downloads.download(url, background_path, store=background_store)]
+            for future in futures:
+                future.result(5)
+            with Image.open(key_path) as image:
+                assert image.size == (32, 24)
+            with open(background_path, "rb") as f:
+                assert f.read() == BODIES["/a/logo.png"]
+    finally:
+        downloads.shutdown()
+    assert cache.entry(url, key_store)["path"] == key_path
+    assert cache.entry(url, background_store)["path"] == background_path
+    assert cache.entry(url) is None
@@ -25,6 +25,21 @@ ASSETS_PATH = os.getenv('ASSETS_PATH', 'Assets')
 FONT_PATH = os.getenv('FONT_PATH', '/usr/share/fonts/ttf/LiberationSans-Regular.ttf')
 TOUCHSCREEN_WIDTH = int(os.getenv('TOUCHSCREEN_WIDTH', '800'))
 TOUCHSCREEN_HEIGHT = int(os.getenv('TOUCHSCREEN_HEIGHT', '100'))
+DECK_USB_BYTES_PER_SECOND = int(os.getenv('DECK_USB_BYTES_PER_SECOND', '0'))  # 0 = no USB write budget
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', '40000000'))  # Decompression bomb guard for received images
+KEEP_ORIGINAL_IMAGES = os.getenv('KEEP_ORIGINAL_IMAGES', 'False').lower() == 'true'
+
+# Timecode Configuration
+TC_SHM_PATH = os.getenv('TC_SHM_PATH', '')  # Shared timecode file; empty = /dev/shm (or temp dir)/lockit_timecode
+TC_BROADCAST_IP = os.getenv('TC_BROADCAST_IP', '239.255.41.1')  # Unicast or multicast target(s), comma separated
+TC_BROADCAST_PORT = int(os.getenv('TC_BROADCAST_PORT', '41240'))  # Timecode broadcast port
+TC_BROADCAST_DIVISOR = int(os.getenv('TC_BROADCAST_DIVISOR', '1'))  # Send every Nth frame
+TC_MULTICAST_TTL = int(os.getenv('TC_MULTICAST_TTL', '1'))  # Router hops for multicast packets
+TC_RECORD_DIR = os.getenv('TC_RECORD_DIR', '')  # Directory for binary timecode logs; empty = don't record
+TC_OFFSET_ALARM_US = int(os.getenv('TC_OFFSET_ALARM_US', '1000'))  # Cross-source offset that raises an alarm (µs)
+TC_REPORT_INTERVAL = int(os.getenv('TC_REPORT_INTERVAL', '10'))  # Seconds between analyzer reports
+MIDI_INPUT_PATTERN = os.getenv('MIDI_INPUT_PATTERN', 'Ambient')  # Regex matched against MIDI input port names
+MIDI_OUTPUT_PATTERN = os.getenv('MIDI_OUTPUT_PATTERN', 'Ambient')  # Regex matched against MIDI output port names
 
 # Development/Testing Configuration
 DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'